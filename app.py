@@ -1,11 +1,30 @@
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
+from streamlit.errors import StreamlitAPIException
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
-import pytz
-from fpdf import FPDF
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from repositorio import LoteEscrita, alteracoes_por_linha, criar_repositorio
+from concorrencia import ConflitoEscrita
+from entidades import RepositorioIndexado
+from fila import criar_fila
+from compartilhado import escritas
+from arquivo import ANOS_QUENTES, criar_arquivo
+from cronograma import figura_gantt, filtrar, preparar_tarefas
+from capacidade import HORAS_DIA, carga, figura_carga
+from financas import ALIQUOTA_IMPOSTO
+from graficos import CORES_ANUAIS, CORES_FLUXO, CORES_KPI, aquecer, plotly
+from consolidado import ABAS_CONSOLIDADO, COLUNA_ID, Consolidado
+from indicadores import eficiencia, kpis_financeiros, kpis_operacionais
+import precalculo
+from instrumentacao import admin, atual, etapa, finalizar_rerun, iniciar_rerun, recentes, vincular
+from recorrencias import anos_com_pagas, descricao, encerradas, expandir, ocorrencias_pagas
+from paginacao import escolher_ordem, expander_sob_demanda, ordenar, paginar
+from conciliacao import JANELA_DIAS, PONTUACAO_SUGERIDA, baixas, conciliar, linhas_lidas, pendentes
+from esquema import (CATEGORIAS_DESPESA, EQUIPE, FASES, FREQUENCIAS, PRIORIDADES, STATUS_PAGAMENTO, STATUS_PROJETO,
+                     STATUS_TAREFA, TIPOS_PROJETO, tipar)
 
 # --- CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(
@@ -14,6 +33,12 @@ st.set_page_config(
     layout="wide"
 )
 
+sessao_id = st.session_state.setdefault("_sessao", uuid.uuid4().hex[:8])
+# Instrumentação (PERFIL=1): cada rerun vira um registro com as etapas cronometradas
+rerun_atual = iniciar_rerun(sessao_id)
+# Rerun completo: os dados abaixo já refletem tudo que os fragmentos gravaram
+st.session_state["_gravados"] = {}
+
 # --- FUNÇÕES UTILITÁRIAS ---
 def format_currency_br(value):
     return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
@@ -26,118 +51,550 @@ def format_date_br(date_obj):
         return str(date_obj)
 
 def get_now_br():
+    import pytz
     fuso_br = pytz.timezone('America/Sao_Paulo')
     return datetime.now(fuso_br).strftime("%d/%m/%Y %H:%M")
 
 def get_today_date():
     return datetime.now().date()
 
-# --- CLASSE PARA GERAR PDF ---
-class PDFRelatorio(FPDF):
-    def header(self):
-        self.set_font('Arial', 'B', 15)
-        self.cell(0, 10, 'Relatório de Status do Projeto', 0, 1, 'C')
-        self.ln(5)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
-
-def gerar_pdf_status(projeto_dados, tarefas_proj):
-    pdf = PDFRelatorio()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.set_fill_color(240, 240, 240)
-    pdf.cell(0, 10, f"Cliente: {projeto_dados['Cliente']}", ln=True, fill=True)
-    pdf.set_font("Arial", size=10)
-    pdf.cell(0, 8, f"Local: {projeto_dados['Cidade']} | Tipo: {projeto_dados['Tipo']}", ln=True)
-    pdf.cell(0, 8, f"Status Atual: {projeto_dados['Status_Geral']}", ln=True)
-    pdf.ln(5)
-    pdf.set_font("Arial", 'B', 11)
-    pdf.cell(0, 10, "Status das Atividades Recentes:", ln=True)
-    pdf.set_font("Arial", size=10)
-    
-    if not tarefas_proj.empty:
-        tarefas_proj = tarefas_proj.sort_values(by="Status")
-        for _, row in tarefas_proj.iterrows():
-            status_clean = row['Status']
-            marcador = "[OK]" if status_clean == 'Concluído' else "[..]"
-            pdf.cell(15, 8, marcador, 0, 0)
-            pdf.cell(120, 8, f"{row['Descricao']} ({row['Fase']})", 0, 0)
-            pdf.cell(0, 8, f"{status_clean}", 0, 1)
-    else:
-        pdf.cell(0, 8, "Nenhuma tarefa registrada.", ln=True)
-    
-    pdf.ln(10)
-    pdf.set_font("Arial", 'I', 8)
-    pdf.cell(0, 10, "Documento gerado automaticamente pelo Sistema de Gestão.", ln=True)
-    return pdf.output(dest='S').encode('latin-1')
+# --- MENU LATERAL ---
+# Desenhado antes da conexão: numa partida a frio o menu aparece enquanto o Sheets conecta
+st.sidebar.title("🏗️ Engenharia 360º")
+aba = st.sidebar.radio("Menu Principal", 
+    ["Dash Operacional", "Dash Financeiro", "Cadastro Projetos", "Controle de Tarefas", "Controle Financeiro", "Controle Despesas"],
+    key="menu"
+)
+if rerun_atual is not None:
+    rerun_atual.aba = aba
 
 # --- CONEXÃO ---
-conn = st.connection("gsheets", type=GSheetsConnection)
+def abrir_conexao():
+    from streamlit_gsheets import GSheetsConnection
+    return st.connection("gsheets", type=GSheetsConnection)
+
+@st.cache_resource
+def get_repositorio():
+    base = criar_repositorio(abrir_conexao)
+    return RepositorioIndexado(criar_fila(base))
+
+repo = get_repositorio()
+
+@st.cache_resource
+def get_arquivo():
+    return criar_arquivo(abrir_conexao)
+
+arquivo = get_arquivo()
+
+@st.cache_resource
+def get_consolidado():
+    return Consolidado()
+
+consolidado = get_consolidado()
+# Escritas de todas as sessões (e processos, com CACHE_COMPARTILHADO) para o aviso de dados alterados
+registro_escritas = escritas()
 
 def load_data(worksheet_name):
     try:
-        return conn.read(worksheet=worksheet_name, ttl=0)
+        return repo.ler(worksheet_name)
     except:
         return pd.DataFrame()
 
-def save_data(df, worksheet_name):
-    conn.update(worksheet=worksheet_name, data=df)
-    st.cache_data.clear()
+def append_row(registro, worksheet_name):
+    antes = versoes_consolidado() if worksheet_name in COLUNA_ID else None
+    with etapa(f"gravacao:{worksheet_name}"):
+        LoteEscrita(repo).anexar(worksheet_name, registro).salvar()
+    registro_escritas.registrar_escrita(worksheet_name, sessao_id)
+    if worksheet_name in COLUNA_ID:
+        consolidado.registrar(worksheet_name, registro[COLUNA_ID[worksheet_name]], registro, antes, versoes_consolidado())
+
+def update_row(chave, campos, worksheet_name, base=None):
+    """Grava campos de uma linha; base é a linha como a tela a mostrava.
+
+    Devolve False, sem gravar nada, se outra pessoa mudou algum desses campos
+    desde a leitura (com a fila ligada, o conflito aparece no status das gravações).
+    """
+    antes = versoes_consolidado() if worksheet_name in COLUNA_ID else None
+    try:
+        with etapa(f"gravacao:{worksheet_name}"):
+            LoteEscrita(repo).atualizar(worksheet_name, chave, campos, base).salvar()
+    except ConflitoEscrita as conflito:
+        st.session_state["_conflito"] = str(conflito)
+        return False
+    registro_escritas.registrar_escrita(worksheet_name, sessao_id)
+    if worksheet_name in COLUNA_ID:
+        consolidado.registrar(worksheet_name, chave, campos, antes, versoes_consolidado())
+    return True
+
+# --- ESTADO LOCAL DOS FRAGMENTOS ---
+# Um card (@st.fragment) que grava algo se redesenha sozinho, aplicando por cima
+# da linha original os campos gravados desde o último rerun completo.
+def update_row_local(chave, campos, worksheet_name, base=None):
+    if not update_row(chave, campos, worksheet_name, base):
+        # A linha mudou por outra pessoa: a página inteira volta com os dados atuais
+        st.rerun()
+    st.session_state.setdefault("_gravados", {}).setdefault((worksheet_name, chave), {}).update(campos)
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        # Clique processado num rerun completo (fora de um rerun do fragmento)
+        st.rerun()
+
+def com_local(chave, row, worksheet_name):
+    """Linha com as gravações locais aplicadas e se houve alguma."""
+    campos = st.session_state.get("_gravados", {}).get((worksheet_name, chave))
+    if not campos:
+        return row, False
+    row = row.copy()
+    for campo, valor in campos.items():
+        row[campo] = valor
+    return row, True
+
+def get_id_projeto(cliente):
+    return df_projetos.at[repo.posicoes("Projetos", "Cliente", cliente)[0], "ID_Projeto"]
+
+def get_versoes(*worksheets):
+    # Nas telas de histórico as partições do arquivo também fazem parte dos dados
+    historico = HISTORICO.get(aba, ())
+    return tuple((repo.versao(w), arquivo.versao(w)) if w in historico else repo.versao(w) for w in worksheets)
+
+# --- RESULTADOS DO LOTE NOTURNO (precalculo.py) ---
+# Valem enquanto a assinatura (conteúdo) das abas usadas for a do lote
+@st.cache_data(max_entries=16)
+def get_assinatura(worksheet_name, versoes):
+    return precalculo.assinatura(load_data(worksheet_name), arquivo.anos(worksheet_name))
+
+def load_precalculado(nome, worksheets, hoje=None):
+    with etapa(f"precalculado:{nome}"):
+        assinaturas = {w: get_assinatura(w, (repo.versao(w), arquivo.versao(w))) for w in worksheets}
+        return precalculo.ler(nome, assinaturas, hoje)
+
+# --- AGREGAÇÕES (MEMORIZADAS POR VERSÃO DOS DADOS) ---
+@st.cache_data(max_entries=4)
+def get_tarefas_gantt(_pendentes, _df_projetos, versoes):
+    pronto = load_precalculado("tarefas_gantt", ["Tarefas", "Projetos"])
+    return pronto if pronto is not None else preparar_tarefas(_pendentes, _df_projetos)
+
+@st.cache_data(max_entries=4)
+def get_carga(_df_tarefas, versoes, hoje):
+    pronto = load_precalculado("carga", ["Tarefas"], hoje)
+    return pronto if pronto is not None else carga(_df_tarefas, hoje)
+
+@st.cache_data(max_entries=4)
+def get_eficiencia(_df_projetos, _df_tarefas, versoes):
+    pronto = load_precalculado("eficiencia", ["Projetos", "Tarefas"])
+    return pronto if pronto is not None else eficiencia(_df_projetos, _df_tarefas)
+
+@st.cache_data(max_entries=16)
+def get_figura_gantt(_tarefas, versoes, inicio, fim, clientes, responsaveis, resumido):
+    visiveis = filtrar(_tarefas, inicio, fim, clientes, responsaveis)
+    if visiveis.empty:
+        return None
+    return figura_gantt(visiveis, inicio, fim, resumido)
+
+# --- LISTAS PAGINADAS ---
+# Carteira, extrato e despesas: ordem e grupos calculados uma vez por versão dos dados
+# (widgets e fatias das páginas em paginacao.py)
+ORDENS_CARTEIRA = {
+    "Situação": (("Status_Geral", True), ("Cliente", True)),
+    "Cliente (A–Z)": (("Cliente", True),),
+    "Mais recentes": (),
+}
+ORDENS_EXTRATO = {
+    "Pendências primeiro": (("Pendente", False), ("Cliente", True)),
+    "Cliente (A–Z)": (("Cliente", True),),
+}
+ORDENS_DESPESAS = {
+    "Vencimento (recentes)": (("Vencimento", False),),
+    "Vencimento (antigas)": (("Vencimento", True),),
+    "Pendentes primeiro": (("Pendente", False), ("Vencimento", True)),
+    "Maior valor": (("Valor", False),),
+}
+
+@st.cache_data(max_entries=8)
+def get_ordem(_df, lista, criterios, versoes):
+    return ordenar(_df, criterios)
+
+@st.cache_data(max_entries=4)
+def get_grupos_extrato(_df_financeiro, _df_projetos, versoes):
+    """Lançamentos por cliente ({cliente: rótulos}, um groupby só) e o resumo usado para ordenar os clientes."""
+    nomes = _df_projetos.drop_duplicates("ID_Projeto").set_index("ID_Projeto")["Cliente"]
+    clientes = _df_financeiro["ID_Projeto"].map(nomes)
+    grupos = {cliente: _df_financeiro.index[posicoes]
+              for cliente, posicoes in clientes.groupby(clientes, sort=False).indices.items()}
+    pendente = _df_financeiro["Status"].eq("Pendente").groupby(clientes, sort=False).any()
+    resumo = pd.DataFrame({"Cliente": pendente.index, "Pendente": pendente.to_numpy()}, index=pendente.index.to_numpy())
+    return grupos, resumo
 
 # --- CARREGAMENTO INICIAL E TRATAMENTO ---
-df_projetos = load_data("Projetos")
-df_tarefas = load_data("Tarefas")
-df_financeiro = load_data("Financeiro")
-df_despesas = load_data("Despesas")
-
-# 1. Colunas PROJETOS
-cols_proj = ["ID_Projeto", "Cliente", "Origem", "Tipo", "Area_m2", "Proposta_Aceita_R$", 
-             "Servicos", "Link_Proposta", "Link_Pasta_Executivo", "Link_Pasta_Renders", 
-             "Data_Cadastro", "Status_Geral", "Cidade", "Historico_Log"]
-if df_projetos.empty: df_projetos = pd.DataFrame(columns=cols_proj)
-else:
-    for col in cols_proj:
-        if col not in df_projetos.columns: df_projetos[col] = ""
-    df_projetos["Proposta_Aceita_R$"] = pd.to_numeric(df_projetos["Proposta_Aceita_R$"], errors="coerce").fillna(0.0)
-    df_projetos["Area_m2"] = pd.to_numeric(df_projetos["Area_m2"], errors="coerce").fillna(0.0)
-
-# 2. Colunas TAREFAS
-cols_task = ["ID_Projeto", "Fase", "Disciplina", "Descricao", "Responsavel", 
-             "Data_Inicio", "Data_Deadline", "Prioridade", "Status", 
-             "Historico_Log", "Data_Conclusao", "Horas_Gastas"]
-if df_tarefas.empty: df_tarefas = pd.DataFrame(columns=cols_task)
-else:
-    for col in cols_task:
-        if col not in df_tarefas.columns: df_tarefas[col] = ""
-    df_tarefas["Data_Deadline"] = pd.to_datetime(df_tarefas["Data_Deadline"], errors="coerce")
-    df_tarefas["Data_Inicio"] = pd.to_datetime(df_tarefas["Data_Inicio"], errors="coerce")
-    df_tarefas["Horas_Gastas"] = pd.to_numeric(df_tarefas["Horas_Gastas"], errors="coerce").fillna(0.0)
-
-# 3. Colunas FINANCEIRO
-cols_fin = ["ID_Lancamento", "ID_Projeto", "Descricao", "Valor", "Vencimento", "Status", "Data_Pagamento", "Valor_Imposto"]
-if df_financeiro.empty: df_financeiro = pd.DataFrame(columns=cols_fin)
-else:
-    if "Valor_Imposto" not in df_financeiro.columns: df_financeiro["Valor_Imposto"] = 0.0
-    df_financeiro["Valor"] = pd.to_numeric(df_financeiro["Valor"], errors="coerce").fillna(0.0)
-    df_financeiro["Valor_Imposto"] = pd.to_numeric(df_financeiro["Valor_Imposto"], errors="coerce").fillna(0.0)
-    df_financeiro["Vencimento"] = pd.to_datetime(df_financeiro["Vencimento"], errors="coerce")
-
-# 4. Colunas DESPESAS
-cols_desp = ["ID_Despesa", "Descricao", "Categoria", "Valor", "Vencimento", "Status", "Data_Pagamento"]
-if df_despesas.empty: df_despesas = pd.DataFrame(columns=cols_desp)
-else:
-    df_despesas["Valor"] = pd.to_numeric(df_despesas["Valor"], errors="coerce").fillna(0.0)
-    df_despesas["Vencimento"] = pd.to_datetime(df_despesas["Vencimento"], errors="coerce")
+# Colunas e tipos de cada aba ficam em esquema.py; a conversão roda uma vez por versão
+@st.cache_data(max_entries=16)
+def get_tipado(_df, worksheet_name, versao):
+    return tipar(worksheet_name, _df)
 
+def load_typed(worksheet_name):
+    with etapa(f"leitura:{worksheet_name}"):
+        df = load_data(worksheet_name)
+    with etapa(f"tipagem:{worksheet_name}"):
+        return get_tipado(df, worksheet_name, repo.versao(worksheet_name))
 
-# --- MENU LATERAL ---
-st.sidebar.title("🏗️ Engenharia 360º")
-aba = st.sidebar.radio("Menu Principal", 
-    ["Dash Operacional", "Dash Financeiro", "Cadastro Projetos", "Controle de Tarefas", "Controle Financeiro", "Controle Despesas"]
-)
+# Telas de histórico juntam as partições arquivadas à aba de trabalho
+@st.cache_data(max_entries=8)
+def get_historico(_df, worksheet_name, versoes, anos=None):
+    return tipar(worksheet_name, arquivo.com_historico(worksheet_name, _df, anos))
+
+@st.cache_data(max_entries=8)
+def get_arquivados(worksheet_name, versao):
+    return tipar(worksheet_name, arquivo.ler(worksheet_name))
+
+def load_historico(worksheet_name, anos=None):
+    """Aba de trabalho com as partições arquivadas dos anos pedidos (todas, se None)."""
+    with etapa(f"leitura:{worksheet_name}"):
+        df = load_data(worksheet_name)
+    with etapa(f"historico:{worksheet_name}"):
+        return get_historico(df, worksheet_name, (repo.versao(worksheet_name), arquivo.versao(worksheet_name)), anos)
+
+# Consolidado financeiro: montado com o histórico completo só quando as versões mudam;
+# lançamentos criados ou baixados pelo app entram como delta (append_row/update_row)
+def versoes_consolidado():
+    return {w: (repo.versao(w), arquivo.versao(w)) for w in ABAS_CONSOLIDADO}
+
+def load_consolidado():
+    if consolidado.versoes != versoes_consolidado():
+        # Montado pelo lote noturno para estes mesmos dados: nem o arquivo precisa ser lido
+        pronto = load_precalculado("consolidado", ABAS_CONSOLIDADO)
+        if pronto is not None:
+            consolidado.adotar(pronto, versoes_consolidado())
+            return consolidado
+        historico = load_many(ABAS_CONSOLIDADO, historico=ABAS_CONSOLIDADO)
+        with etapa("financeiro:consolidado"):
+            # Versões depois da leitura, como em load_typed (a primeira leitura já muda a versão)
+            consolidado.montar(historico["Financeiro"], historico["Despesas"], historico["Projetos"],
+                               versoes_consolidado())
+    return consolidado
+
+# --- RECORRÊNCIAS ---
+# Despesas fixas e planos de parcelas geram ocorrências só para a janela pedida;
+# pagar uma ocorrência grava a linha concreta em Despesas/Financeiro
+@st.cache_data(max_entries=4)
+def get_pagas(versoes, anos):
+    # anos: partições arquivadas de Financeiro e Despesas que podem ter pagas da janela
+    return ocorrencias_pagas(load_historico("Financeiro", anos[0]), load_historico("Despesas", anos[1]))
+
+def load_ocorrencias(regras, inicio, fim):
+    if regras is None or regras.empty:
+        return expandir(None, inicio, fim)
+    abas = ("Financeiro", "Despesas")
+    pagas = get_pagas(tuple((repo.versao(w), arquivo.versao(w)) for w in abas),
+                      tuple(anos_com_pagas(arquivo.anos(w), inicio) for w in abas))
+    with etapa("recorrencias:expandir"):
+        return expandir(regras, inicio, fim, df_projetos, pagas)
+
+def pagar_ocorrencia(ocorrencia):
+    comum = {
+        "Descricao": descricao(ocorrencia), "Valor": ocorrencia["Valor"], "Vencimento": ocorrencia["Vencimento"],
+        "Status": "Pago", "Data_Pagamento": str(get_today_date()), "Recorrencia": ocorrencia["Recorrencia"],
+    }
+    if ocorrencia["Fluxo"] == "Entrada":
+        append_row({"ID_Lancamento": repo.proximo_id("Financeiro"), "ID_Projeto": ocorrencia["ID_Projeto"], **comum,
+                    "Valor_Imposto": ocorrencia["Valor"] * ALIQUOTA_IMPOSTO}, "Financeiro")
+    else:
+        append_row({"ID_Despesa": repo.proximo_id("Despesas"), "Categoria": ocorrencia["Categoria"], **comum}, "Despesas")
+
+def bloco_recorrencias(regras, rotulo_pagar, nomes=None):
+    """Regras ativas (com Encerrar) e as ocorrências em aberto da janela escolhida."""
+    hoje = get_today_date()
+    ativas = regras[~encerradas(regras, hoje)] if not regras.empty else regras
+    for _, regra in ativas.iterrows():
+        c1, c2 = st.columns([4, 1])
+        nome = nomes.get(regra["ID_Projeto"], "") if nomes else regra["Categoria"]
+        quantas = f"{int(regra['Ocorrencias'])}x" if regra["Ocorrencias"] > 0 else "sem fim"
+        c1.markdown(f"**{regra['Descricao']}** ({nome}) · {format_currency_br(regra['Valor']) if regra['Valor'] else 'proposta'}"
+                    f" · {regra['Frequencia']}, {quantas}, desde {format_date_br(regra['Inicio'])}")
+        if c2.button("Encerrar", key=f"enc_{regra['ID_Recorrencia']}"):
+            update_row(regra["ID_Recorrencia"], {"Fim": str(hoje)}, "Recorrencias")
+            st.rerun()
+
+    janela = st.date_input("Ocorrências em aberto no período", value=(hoje - timedelta(days=30), hoje + timedelta(days=60)),
+                           format="DD/MM/YYYY", key=f"janela_{rotulo_pagar}")
+    inicio, fim = (janela[0], janela[-1]) if janela else (hoje, hoje)
+    ocorrencias = load_ocorrencias(regras, inicio, fim)
+    if ocorrencias.empty:
+        st.caption("Nenhuma ocorrência em aberto no período.")
+    for _, ocorrencia in ocorrencias.iterrows():
+        with st.container(border=True):
+            c1, c2, c3 = st.columns([3, 2, 2])
+            c1.markdown(f"**{descricao(ocorrencia)}**")
+            c1.caption(f"Vence: {format_date_br(ocorrencia['Vencimento'])}")
+            c2.markdown(f"**{format_currency_br(ocorrencia['Valor'])}**")
+            if c3.button(rotulo_pagar, key=f"ocor_{ocorrencia['Recorrencia']}"):
+                pagar_ocorrencia(ocorrencia)
+                st.rerun()
+
+# --- CONCILIAÇÃO BANCÁRIA ---
+# O extrato é lido em blocos e casado com os pendentes de Financeiro e Despesas;
+# as baixas aprovadas vão numa escrita só
+@st.cache_data(max_entries=2)
+def get_propostas(_extrato, extrato_id, versoes):
+    abertos = pendentes(load_typed("Financeiro"), load_typed("Despesas"), load_typed("Projetos"))
+    _extrato.seek(0)
+    with etapa("conciliacao:extrato"):
+        return conciliar(_extrato, _extrato.name, abertos)
+
+def gravar_baixas(propostas):
+    registros = baixas(propostas)
+    # Linhas como a conciliação as leu: baixa feita por outra pessoa no meio tempo não é sobrescrita
+    bases = linhas_lidas(propostas)
+    lote = LoteEscrita(repo)
+    for worksheet_name, por_chave in registros.items():
+        for chave, campos in por_chave.items():
+            lote.atualizar(worksheet_name, chave, campos, bases[worksheet_name][chave])
+    antes = versoes_consolidado()
+    try:
+        with etapa("gravacao:conciliacao"):
+            lote.salvar()
+    except ConflitoEscrita as conflito:
+        st.session_state["_conflito"] = str(conflito)
+        return False
+    for worksheet_name in registros:
+        registro_escritas.registrar_escrita(worksheet_name, sessao_id)
+    consolidado.registrar_lote(registros, antes, versoes_consolidado())
+    return True
+
+@st.fragment
+def bloco_conciliacao():
+    """Extrato enviado, propostas de baixa para revisão e a confirmação em lote."""
+    feitas = st.session_state.pop("_conciliadas", None)
+    if feitas:
+        st.success(f"{feitas} baixa(s) gravada(s).")
+    extrato = st.file_uploader("Extrato do banco (CSV ou OFX)", type=["csv", "ofx"], key="extrato")
+    if extrato is None:
+        return
+    versoes = get_versoes("Financeiro", "Despesas", "Projetos")
+    try:
+        propostas, lidas = get_propostas(extrato, extrato.file_id, versoes)
+    except (ValueError, pd.errors.ParserError) as e:
+        st.error(f"Não foi possível ler o extrato: {e}")
+        return
+    st.caption(f"{lidas} transações lidas; {len(propostas)} com pendente de mesmo valor a até {JANELA_DIAS} dias.")
+    if propostas.empty:
+        return
+
+    revisao = propostas.assign(Baixar=propostas["Pontuacao"] >= PONTUACAO_SUGERIDA)
+    colunas = ["Baixar", "Data", "Descricao_Banco", "Valor_Banco", "Aba", "Nome", "Descricao", "Vencimento", "Pontuacao"]
+    editado = st.data_editor(
+        revisao[colunas], key=f"revisao_{extrato.file_id}_{versoes}", hide_index=True, use_container_width=True,
+        disabled=colunas[1:],
+        column_config={
+            "Baixar": st.column_config.CheckboxColumn("Baixar"),
+            "Data": st.column_config.DateColumn("Data no Banco", format="DD/MM/YYYY"),
+            "Descricao_Banco": st.column_config.TextColumn("Histórico"),
+            "Valor_Banco": st.column_config.NumberColumn("Valor", format="R$ %.2f"),
+            "Nome": st.column_config.TextColumn("Cliente/Categoria"),
+            "Vencimento": st.column_config.DateColumn("Vencimento", format="DD/MM/YYYY"),
+            "Pontuacao": st.column_config.ProgressColumn("Confiança", min_value=0.0, max_value=1.0, format="%.2f"),
+        },
+    )
+    escolhidas = propostas[editado["Baixar"].to_numpy(dtype=bool)]
+    if st.button(f"✅ Confirmar {len(escolhidas)} baixa(s)", disabled=escolhidas.empty):
+        if gravar_baixas(escolhidas):
+            st.session_state["_conciliadas"] = len(escolhidas)
+        # Baixas mudam o extrato e os totais: a página inteira é redesenhada
+        st.rerun()
+
+@st.cache_resource
+def get_pool_carga():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="carga")
+
+def load_many(worksheets, historico=()):
+    """Carrega e tipa as abas pedidas em paralelo; devolve {nome: df}.
+
+    As abas em historico vêm com os registros arquivados.
+    """
+    def load(worksheet_name):
+        return load_historico(worksheet_name) if worksheet_name in historico else load_typed(worksheet_name)
+
+    if len(worksheets) == 1:
+        return {worksheets[0]: load(worksheets[0])}
+    ctx, rerun = get_script_run_ctx(), atual()
+
+    def carregar(worksheet_name):
+        # A thread da pool herda o contexto do script (cache do Streamlit) e o registro do rerun
+        thread = threading.current_thread()
+        add_script_run_ctx(thread, ctx)
+        vincular(rerun)
+        try:
+            return load(worksheet_name)
+        finally:
+            vincular(None)
+            add_script_run_ctx(thread, None)
+
+    futuros = {w: get_pool_carga().submit(carregar, w) for w in worksheets}
+    return {w: f.result() for w, f in futuros.items()}
+
+
+# --- BUSCA ---
+# Índice invertido por palavra (busca.py), montado na primeira busca e atualizado a cada escrita do app;
+# um resultado abre a tela da entidade mostrando só aquele registro
+TELAS_BUSCA = {"Projetos": "Cadastro Projetos", "Tarefas": "Controle de Tarefas",
+               "Financeiro": "Controle Financeiro", "Despesas": "Controle Despesas"}
+ICONES_BUSCA = {"Projetos": "🏗️", "Tarefas": "✅", "Financeiro": "💰", "Despesas": "📉"}
+RESULTADOS_BUSCA = 8
+
+if "_foco" in st.session_state and TELAS_BUSCA[st.session_state["_foco"][0]] != aba:
+    # Saiu da tela pelo menu: a lista volta a ser completa
+    del st.session_state["_foco"]
+
+def rotulo_busca(worksheet_name, row):
+    if worksheet_name == "Projetos":
+        return f"{row['Cliente']} · {row['Cidade']}"
+    if worksheet_name == "Despesas":
+        return f"{row['Descricao']} · {row['Categoria']} · {row['Vencimento']}"
+    pos = repo.posicao("Projetos", row["ID_Projeto"])
+    cliente = load_data("Projetos").at[pos, "Cliente"] if pos is not None else "?"
+    if worksheet_name == "Tarefas":
+        return f"{cliente} · {row['Descricao']} ({row['Status']})"
+    return f"{cliente} · {row['Descricao']} · {row['Vencimento']}"
+
+def abrir_registro(worksheet_name, pos):
+    # Callback: o menu só pode mudar antes de o rádio ser desenhado
+    st.session_state["menu"] = TELAS_BUSCA[worksheet_name]
+    st.session_state["_foco"] = (worksheet_name, pos)
+    st.session_state["_abrir_foco"] = True
+
+@st.fragment
+def busca_global():
+    if st.session_state.pop("_abrir_foco", False):
+        # Clique num resultado: a troca de tela pede o app inteiro, não só o fragmento
+        st.rerun()
+    consulta = st.text_input("🔎 Buscar", key="busca", placeholder="Cliente, cidade, tarefa, lançamento...")
+    if not consulta.strip():
+        return
+    with etapa("busca"):
+        achados = repo.buscar(consulta)
+    if not any(achados.values()):
+        st.caption("Nada encontrado.")
+    for worksheet_name, posicoes in achados.items():
+        if not posicoes:
+            continue
+        df = load_data(worksheet_name)
+        mais = f", {RESULTADOS_BUSCA} mais recentes" if len(posicoes) > RESULTADOS_BUSCA else ""
+        st.caption(f"{ICONES_BUSCA[worksheet_name]} {worksheet_name}: {len(posicoes)}{mais}")
+        for pos in posicoes[:RESULTADOS_BUSCA]:
+            st.button(rotulo_busca(worksheet_name, df.loc[pos]), key=f"busca_{worksheet_name}_{pos}",
+                      use_container_width=True, on_click=abrir_registro, args=(worksheet_name, pos))
+
+def registro_em_foco(worksheet_name):
+    """Posição do registro aberto pela busca nesta aba, ou None (lista completa)."""
+    foco = st.session_state.get("_foco")
+    if not foco or foco[0] != worksheet_name:
+        return None
+    c1, c2 = st.columns([4, 1])
+    c1.info("🔎 Mostrando só o registro aberto pela busca.")
+    c2.button("Mostrar todos", key="foco_limpar", on_click=st.session_state.pop, args=("_foco", None))
+    return foco[1]
+
+with st.sidebar:
+    busca_global()
+
+# --- CARREGAMENTO SOB DEMANDA ---
+# Cada tela declara as abas da planilha que usa; só essas são lidas (as demais ficam None)
+DEPENDENCIAS = {
+    "Dash Operacional": ["Projetos", "Tarefas"],
+    "Dash Financeiro": ["Projetos", "Tarefas", "Recorrencias"],
+    "Cadastro Projetos": ["Projetos"],
+    "Controle de Tarefas": ["Tarefas", "Projetos"],
+    "Controle Financeiro": ["Financeiro", "Projetos", "Recorrencias"],
+    "Controle Despesas": ["Despesas", "Recorrencias"],
+}
+# Telas que mostram todos os anos: incluem as partições do arquivo
+# (Financeiro e Despesas chegam ao Dash Financeiro pelo consolidado, ver load_consolidado)
+HISTORICO = {
+    "Dash Financeiro": ["Projetos", "Tarefas"],
+}
+# Escritas registradas a partir daqui podem não estar nos dados desta tela
+st.session_state["_marca_escritas"] = registro_escritas.ultima_escrita()
+dados = load_many(DEPENDENCIAS[aba], HISTORICO.get(aba, ()))
+df_projetos = dados.get("Projetos")
+df_tarefas = dados.get("Tarefas")
+df_financeiro = dados.get("Financeiro")
+df_despesas = dados.get("Despesas")
+df_recorrencias = dados.get("Recorrencias")
+
+avisos_dados = [a for df in dados.values() for a in df.attrs.get("avisos", [])]
+if avisos_dados:
+    with st.sidebar.expander(f"⚠️ {len(avisos_dados)} aviso(s) nos dados"):
+        for aviso in avisos_dados:
+            st.caption(aviso)
+
+# --- STATUS DAS GRAVAÇÕES (atualiza sozinho a cada 5s) ---
+@st.fragment(run_every=5)
+def status_gravacoes():
+    if hasattr(repo, "status_fila"):
+        status = repo.status_fila()
+    elif hasattr(repo, "pendentes"):
+        # Backend SQLite: mutações aguardando o espelho no Google Sheets
+        status = {"pendentes": repo.pendentes(), "falhas": [], "tentando": 0, "ultimo_envio": None,
+                  "ultimo_erro": (None, repo.ultimo_erro) if repo.ultimo_erro else None, "conflitos": []}
+    else:
+        return
+    if status["pendentes"]:
+        st.caption(f"⏳ {status['pendentes']} alteração(ões) aguardando envio")
+    elif not status["falhas"]:
+        ultimo = status["ultimo_envio"]
+        st.caption("☁️ Tudo gravado" + (f" · último envio {ultimo:%H:%M:%S}" if ultimo else ""))
+    if status["ultimo_erro"] and (status["tentando"] or status["falhas"] or status["pendentes"]):
+        st.caption(f"⚠️ Última falha: {status['ultimo_erro'][1]}. Nova tentativa automática.")
+    if status["falhas"]:
+        st.error(f"{len(status['falhas'])} alteração(ões) não gravada(s) após várias tentativas.")
+        st.button("Tentar de novo", key="fila_tentar", on_click=repo.tentar_novamente)
+    if status["conflitos"]:
+        # Outra pessoa mudou os mesmos campos antes do envio: a alteração não foi gravada
+        with st.expander(f"⚠️ {len(status['conflitos'])} alteração(ões) descartada(s) por conflito"):
+            for quando, _, mensagem in status["conflitos"]:
+                st.caption(f"{quando:%H:%M} · {mensagem}")
+            st.button("Ok", key="fila_conflitos", on_click=repo.dispensar_conflitos)
+
+# --- DADOS ALTERADOS POR OUTRA SESSÃO (checado a cada 5s) ---
+@st.fragment(run_every=5)
+def aviso_alteracoes(abas_usadas):
+    alteradas = sorted({a for _, a, sessao in registro_escritas.escritas_desde(st.session_state["_marca_escritas"])
+                        if sessao != sessao_id and a in abas_usadas})
+    if alteradas:
+        st.info(f"🔄 {', '.join(alteradas)}: alterado por outro usuário.")
+        if st.button("Atualizar", key="atualizar_dados"):
+            st.rerun()
+
+with st.sidebar:
+    status_gravacoes()
+    aviso_alteracoes(DEPENDENCIAS[aba] + (ABAS_CONSOLIDADO if aba == "Dash Financeiro" else []))
+
+# Gravação recusada (update_row): a tela já voltou com os dados atuais
+if "_conflito" in st.session_state:
+    st.warning(f"⚠️ Não gravado: {st.session_state.pop('_conflito')}. "
+               "Confira os dados atuais e refaça a alteração.")
+
+# --- ARQUIVO MORTO ---
+with st.sidebar.expander("🗄️ Arquivo"):
+    st.caption(f"Projetos encerrados, tarefas concluídas e pagamentos até {datetime.now().year - ANOS_QUENTES} "
+               "saem das abas de trabalho e ficam em partições por ano.")
+    if "msg_arquivo" in st.session_state:
+        st.success(st.session_state.pop("msg_arquivo"))
+    if st.button("Arquivar encerrados", key="arquivar"):
+        try:
+            with st.spinner("Arquivando..."), etapa("arquivamento"):
+                movidos = arquivo.arquivar(repo)
+        except RuntimeError as e:
+            # Fila com alterações pendentes (ex.: planilha fora do ar): o restante fica para a próxima vez
+            st.error(f"Arquivamento adiado: {e}")
+        else:
+            for worksheet_name in movidos:
+                registro_escritas.registrar_escrita(worksheet_name, sessao_id)
+            st.session_state["msg_arquivo"] = (
+                ", ".join(f"{n} de {w}" for w, n in movidos.items()) + " arquivado(s)." if movidos
+                else "Nada a arquivar.")
+            # Posições das tarefas mudaram: a tela inteira é redesenhada
+            st.rerun()
 
 # ==============================================================================
 # ABA 1: DASHBOARD OPERACIONAL
@@ -146,15 +603,81 @@ if aba == "Dash Operacional":
     st.header("⚙️ Dashboard Operacional")
     st.markdown("---")
 
+    # Filtros do Gantt e relatórios redesenham só o próprio bloco
+    @st.fragment
+    def bloco_gantt(tasks_gantt, hoje):
+        with st.expander("Filtros do cronograma"):
+            f1, f2 = st.columns(2)
+            janela = f1.date_input("Janela", value=(hoje - timedelta(days=14), hoje + timedelta(days=60)),
+                                   format="DD/MM/YYYY")
+            resumido = f2.toggle("Resumo por projeto")
+            gantt_clientes = f1.multiselect("Projetos", sorted(tasks_gantt["Cliente"].dropna().unique()))
+            gantt_resp = f2.multiselect("Responsáveis", EQUIPE)
+        ini_janela, fim_janela = (janela[0], janela[-1]) if janela else (hoje, hoje)
+
+        with etapa("grafico:gantt"):
+            fig_gantt = get_figura_gantt(tasks_gantt, get_versoes("Tarefas", "Projetos"), ini_janela, fim_janela,
+                                         tuple(gantt_clientes), tuple(gantt_resp), resumido)
+        if fig_gantt is not None:
+            st.plotly_chart(fig_gantt, use_container_width=True)
+        else:
+            st.info("Nenhuma tarefa no período.")
+
+    @st.fragment
+    def bloco_carga(hoje):
+        with etapa("operacional:carga"):
+            diaria, (semanal, capacidade_semana), excessos = get_carga(df_tarefas, get_versoes("Tarefas"), hoje)
+        if diaria.empty:
+            st.info("Sem tarefas com prazo.")
+            return
+        por_dia = st.toggle("Por dia", help=f"Capacidade de {HORAS_DIA:g} h por dia útil")
+        with etapa("grafico:carga"):
+            if por_dia:
+                fig_carga = figura_carga(diaria.head(20), HORAS_DIA)
+            else:
+                fig_carga = figura_carga(semanal.head(12), capacidade_semana.head(12))
+        st.plotly_chart(fig_carga, use_container_width=True)
+        if not excessos.empty:
+            with st.expander(f"⚠️ {len(excessos)} dia(s) acima da capacidade"):
+                st.dataframe(excessos, hide_index=True, column_config={
+                    "Dia": st.column_config.DateColumn(format="DD/MM/YYYY"),
+                    "Horas": st.column_config.NumberColumn(format="%.1f"),
+                    "Excesso": st.column_config.NumberColumn(format="%.1f"),
+                })
+
+    @st.fragment
+    def bloco_relatorios(proj_ativos):
+        c_pdf1, c_pdf2 = st.columns([3, 1])
+        c_pdf1.subheader("📄 Relatório de Status")
+        if proj_ativos.empty:
+            return
+        proj_sel_pdf = c_pdf1.selectbox("Selecione o Projeto:", proj_ativos["Cliente"].unique())
+        if c_pdf2.button("Gerar PDF"):
+            dados_p = df_projetos.loc[repo.posicoes("Projetos", "Cliente", proj_sel_pdf)[0]]
+            tasks_p = df_tarefas.loc[repo.posicoes("Tarefas", "ID_Projeto", dados_p["ID_Projeto"])]
+            from relatorios import gerar_pdf_status
+            with etapa("pdf:status"):
+                pdf_bytes = gerar_pdf_status(dados_p, tasks_p)
+            c_pdf2.download_button("📥 Baixar PDF", data=pdf_bytes, file_name=f"Status_{proj_sel_pdf}.pdf", mime='application/pdf')
+
+        with st.expander("📦 Relatórios em lote (ZIP)"):
+            clientes_ativos = proj_ativos["Cliente"].unique().tolist()
+            sel_lote = st.multiselect("Projetos do lote", clientes_ativos, default=clientes_ativos)
+            if st.button("Gerar ZIP", disabled=not sel_lote):
+                from relatorios import compactar_zip, gerar_pdfs_lote
+                with etapa("pdf:lote"):
+                    pdfs = gerar_pdfs_lote(df_projetos[df_projetos["Cliente"].isin(sel_lote)], df_tarefas)
+                st.download_button("📥 Baixar ZIP", data=compactar_zip(pdfs),
+                                   file_name=f"Status_Projetos_{get_today_date()}.zip", mime="application/zip")
+
     if df_projetos.empty:
         st.warning("Cadastre projetos para iniciar.")
     else:
-        hoje = pd.to_datetime(get_today_date())
-        pendentes = df_tarefas[df_tarefas["Status"] != "Concluído"].copy()
-        
-        atrasadas = pendentes[pendentes["Data_Deadline"] < hoje]
-        urgentes = pendentes[(pendentes["Data_Deadline"] >= hoje) & (pendentes["Data_Deadline"] <= hoje + timedelta(days=1))]
-        proj_ativos = df_projetos[df_projetos["Status_Geral"] == "Ativo"]
+        with etapa("operacional:kpis"):
+            hoje = pd.to_datetime(get_today_date())
+            kpis = kpis_operacionais(df_projetos, df_tarefas, hoje)
+            pendentes, atrasadas, urgentes = kpis["pendentes"], kpis["atrasadas"], kpis["urgentes"]
+            proj_ativos = kpis["proj_ativos"]
 
         k1, k2, k3, k4 = st.columns(4)
         k1.metric("Projetos em Andamento", len(proj_ativos))
@@ -166,90 +689,48 @@ if aba == "Dash Operacional":
         with g1:
             st.subheader("📅 Cronograma (Gantt)")
             if not pendentes.empty:
-                tasks_gantt = pendentes.copy()
-                mask_sem_ini = pd.isna(tasks_gantt["Data_Inicio"])
-                tasks_gantt.loc[mask_sem_ini, "Data_Inicio"] = tasks_gantt.loc[mask_sem_ini, "Data_Deadline"] - timedelta(days=5)
-                tasks_gantt = pd.merge(tasks_gantt, df_projetos[["ID_Projeto", "Cliente"]], on="ID_Projeto", how="left")
-                tasks_gantt = tasks_gantt.dropna(subset=["Data_Inicio", "Data_Deadline"])
+                with etapa("operacional:gantt_dados"):
+                    tasks_gantt = get_tarefas_gantt(pendentes, df_projetos, get_versoes("Tarefas", "Projetos"))
                 
-                if not tasks_gantt.empty:
-                    fig_gantt = px.timeline(tasks_gantt, x_start="Data_Inicio", x_end="Data_Deadline", 
-                                            y="Cliente", color="Responsavel", hover_data=["Descricao", "Status"],
-                                            color_discrete_map={"GABRIEL": "#3366CC", "MILENNA": "#DC3912"})
-                    fig_gantt.update_yaxes(autorange="reversed")
-                    st.plotly_chart(fig_gantt, use_container_width=True)
-                else:
-                    st.info("Datas insuficientes.")
+                bloco_gantt(tasks_gantt, hoje)
             else:
                 st.info("Sem tarefas pendentes.")
 
         with g2:
             st.subheader("👥 Carga de Trabalho")
             if not pendentes.empty:
-                contagem_resp = pendentes["Responsavel"].value_counts().reset_index()
-                contagem_resp.columns = ["Responsavel", "Tarefas"]
-                fig_carga = px.bar(contagem_resp, x="Responsavel", y="Tarefas", text_auto=True, color="Responsavel")
-                st.plotly_chart(fig_carga, use_container_width=True)
+                bloco_carga(hoje)
 
         st.markdown("---")
-        c_pdf1, c_pdf2 = st.columns([3, 1])
-        c_pdf1.subheader("📄 Relatório de Status")
-        if not proj_ativos.empty:
-            proj_sel_pdf = c_pdf1.selectbox("Selecione o Projeto:", proj_ativos["Cliente"].unique())
-            if c_pdf2.button("Gerar PDF"):
-                dados_p = df_projetos[df_projetos["Cliente"] == proj_sel_pdf].iloc[0]
-                tasks_p = df_tarefas[df_tarefas["ID_Projeto"] == dados_p["ID_Projeto"]]
-                pdf_bytes = gerar_pdf_status(dados_p, tasks_p)
-                c_pdf2.download_button("📥 Baixar PDF", data=pdf_bytes, file_name=f"Status_{proj_sel_pdf}.pdf", mime='application/pdf')
+        bloco_relatorios(proj_ativos)
 
 # ==============================================================================
 # ABA 2: DASHBOARD FINANCEIRO (COMPLETO V6)
 # ==============================================================================
 elif aba == "Dash Financeiro":
-    ano_atual = datetime.now().year
-    st.header(f"💰 Dashboard Financeiro ({ano_atual})")
-    st.markdown("---")
-    
-    if df_financeiro.empty:
+    cons = load_consolidado()
+    if cons.tabela.empty:
+        st.header("💰 Dashboard Financeiro")
+        st.markdown("---")
         st.warning("Sem dados financeiros.")
     else:
-        # --- PREPARAÇÃO DOS DADOS ---
-        df_fin_calc = df_financeiro.dropna(subset=["Vencimento"]).copy()
-        df_fin_calc["Vencimento"] = pd.to_datetime(df_fin_calc["Vencimento"], errors="coerce")
-        df_fin_calc["Data_Pagamento"] = pd.to_datetime(df_fin_calc["Data_Pagamento"], errors="coerce")
-        
-        # Data Híbrida (Caixa vs Competência)
-        df_fin_calc["Data_Considerada"] = df_fin_calc.apply(
-            lambda x: x["Data_Pagamento"] if (x["Status"] == "Pago" and pd.notnull(x["Data_Pagamento"])) else x["Vencimento"], 
-            axis=1
-        )
-        df_fin_calc["Data_Considerada"] = pd.to_datetime(df_fin_calc["Data_Considerada"], errors="coerce")
-        df_fin_calc["Ano_Ref"] = df_fin_calc["Data_Considerada"].dt.year
-        
-        # Despesas (Saídas)
-        df_desp_calc = df_despesas.dropna(subset=["Vencimento"]).copy()
-        df_desp_calc["Vencimento"] = pd.to_datetime(df_desp_calc["Vencimento"], errors="coerce")
-        df_desp_calc["Data_Pagamento"] = pd.to_datetime(df_desp_calc["Data_Pagamento"], errors="coerce")
-        
-        df_desp_calc["Data_Considerada"] = df_desp_calc.apply(
-            lambda x: x["Data_Pagamento"] if (x["Status"] == "Pago" and pd.notnull(x["Data_Pagamento"])) else x["Vencimento"], 
-            axis=1
-        )
-        df_desp_calc["Data_Considerada"] = pd.to_datetime(df_desp_calc["Data_Considerada"], errors="coerce")
-        df_desp_calc["Ano_Ref"] = df_desp_calc["Data_Considerada"].dt.year
-
-        # --- FILTRO ANO ATUAL ---
-        entradas_ano = df_fin_calc[df_fin_calc["Ano_Ref"] == ano_atual]
-        saidas_ano = df_desp_calc[df_desp_calc["Ano_Ref"] == ano_atual]
-        
-        # Totais
-        receita_bruta = entradas_ano[entradas_ano["Status"] == "Pago"]["Valor"].sum()
-        impostos_pagos = entradas_ano[entradas_ano["Status"] == "Pago"]["Valor_Imposto"].sum()
-        custos_fixos_pagos = saidas_ano[saidas_ano["Status"] == "Pago"]["Valor"].sum()
-        lucro_liquido = receita_bruta - impostos_pagos - custos_fixos_pagos
-        margem_lucro = (lucro_liquido / receita_bruta * 100) if receita_bruta > 0 else 0
-        a_receber = entradas_ano[entradas_ano["Status"] == "Pendente"]["Valor"].sum()
-        a_pagar = saidas_ano[saidas_ano["Status"] == "Pendente"]["Valor"].sum()
+        px, _ = plotly()
+        # --- PREPARAÇÃO DOS DADOS (consolidado mensal, todos os anos) ---
+        anos = sorted(set(cons.anos()) | {datetime.now().year}, reverse=True)
+        ano_atual = st.sidebar.selectbox("Ano", anos, index=anos.index(datetime.now().year))
+        st.header(f"💰 Dashboard Financeiro ({ano_atual})")
+        st.markdown("---")
+
+        with etapa("financeiro:resumos"):
+            resumo = cons.resumo(ano_atual)
+        # Pendências do ano: lançamentos gravados + ocorrências de recorrências ainda não pagas
+        previstas = load_ocorrencias(df_recorrencias, f"{ano_atual}-01-01", f"{ano_atual}-12-31")
+        kpis = kpis_financeiros(resumo, previstas)
+        receita_bruta = kpis["receita_bruta"]
+        impostos_pagos = kpis["impostos_pagos"]
+        custos_fixos_pagos = kpis["custos_fixos_pagos"]
+        lucro_liquido = kpis["lucro_liquido"]
+        margem_lucro = kpis["margem_lucro"]
 
         # --- KPIs ---
         c1, c2, c3, c4, c5 = st.columns(5)
@@ -257,7 +738,8 @@ elif aba == "Dash Financeiro":
         c2.metric("Impostos (15.5%)", format_currency_br(impostos_pagos), delta="- Gov", delta_color="inverse")
         c3.metric("Custos Fixos", format_currency_br(custos_fixos_pagos), delta="- Desp", delta_color="inverse")
         c4.metric("Lucro Líquido Real", format_currency_br(lucro_liquido), delta=f"{margem_lucro:.1f}%")
-        c5.metric("Previsão Futura", format_currency_br(a_receber - a_pagar), help="A Receber - A Pagar (Deste ano)")
+        c5.metric("Previsão Futura", format_currency_br(kpis["previsao"]),
+                  help="A Receber - A Pagar (Deste ano, com parcelas e despesas recorrentes previstas)")
 
         st.markdown("---")
         
@@ -269,79 +751,95 @@ elif aba == "Dash Financeiro":
                 "Categoria": ["Receita Bruta", "Impostos", "Custos Fixos", "Lucro Líquido"],
                 "Valor": [receita_bruta, -impostos_pagos, -custos_fixos_pagos, lucro_liquido]
             })
-            fig_fin = px.bar(dados_fin, x="Categoria", y="Valor", text_auto=True, color="Categoria",
-                             color_discrete_sequence=["#2E86C1", "#E74C3C", "#E67E22", "#27AE60"])
+            with etapa("grafico:composicao"):
+                fig_fin = px.bar(dados_fin, x="Categoria", y="Valor", text_auto=True, color="Categoria",
+                                 color_discrete_sequence=CORES_KPI)
             st.plotly_chart(fig_fin, use_container_width=True)
             
         with g2:
             st.subheader(f"📈 Fluxo Mensal Real")
-            if not entradas_ano.empty:
-                entradas_ano["Mes"] = entradas_ano["Data_Considerada"].dt.strftime("%Y-%m")
-                fluxo_ent = entradas_ano.groupby("Mes")["Valor"].sum().reset_index()
-                fluxo_ent["Tipo"] = "Entrada"
-            else:
-                fluxo_ent = pd.DataFrame()
-            
-            if not saidas_ano.empty:
-                saidas_ano["Mes"] = saidas_ano["Data_Considerada"].dt.strftime("%Y-%m")
-                fluxo_sai = saidas_ano.groupby("Mes")["Valor"].sum().reset_index()
-                fluxo_sai["Tipo"] = "Saída"
-            else:
-                fluxo_sai = pd.DataFrame()
-            
-            df_fluxo = pd.concat([fluxo_ent, fluxo_sai])
+            df_fluxo = resumo["fluxo_mensal"]
             if not df_fluxo.empty:
-                df_fluxo = df_fluxo.sort_values("Mes")
-                fig_fluxo = px.bar(df_fluxo, x="Mes", y="Valor", color="Tipo", barmode="group",
-                                   color_discrete_map={"Entrada": "#27AE60", "Saída": "#E74C3C"})
+                with etapa("grafico:fluxo_mensal"):
+                    fig_fluxo = px.bar(df_fluxo, x="Mes", y="Valor", color="Tipo", barmode="group",
+                                       color_discrete_map=CORES_FLUXO)
                 st.plotly_chart(fig_fluxo, use_container_width=True)
             else:
                 st.info("Sem movimentações.")
 
         st.markdown("---")
 
+        # --- COMPARATIVO ENTRE ANOS E ÚLTIMOS 12 MESES (PAGOS) ---
+        h1, h2 = st.columns(2)
+        with h1:
+            st.subheader("📅 Comparativo Anual")
+            with etapa("financeiro:comparativo"):
+                df_anos = cons.comparativo_anual()
+                fig_anos = px.bar(df_anos.melt(id_vars="Ano", value_vars=["Receita", "Custos", "Lucro"],
+                                               var_name="Indicador", value_name="Valor"),
+                                  x="Ano", y="Valor", color="Indicador", barmode="group",
+                                  color_discrete_map=CORES_ANUAIS)
+            fig_anos.update_xaxes(type="category")
+            st.plotly_chart(fig_anos, use_container_width=True)
+            st.dataframe(df_anos.sort_values("Ano", ascending=False), hide_index=True, column_config={
+                col: st.column_config.NumberColumn(format="R$ %.2f") for col in ["Receita", "Impostos", "Custos", "Lucro"]
+            })
+
+        with h2:
+            st.subheader("🔁 Últimos 12 Meses")
+            with etapa("financeiro:12meses"):
+                df_12m, totais_12m = cons.ultimos_12_meses(get_today_date())
+            m1, m2 = st.columns(2)
+            m1.metric("Entradas", format_currency_br(totais_12m["entradas"]),
+                      delta=format_currency_br(totais_12m["entradas"] - totais_12m["entradas_anterior"]),
+                      help="Comparado aos 12 meses anteriores")
+            m2.metric("Saídas", format_currency_br(totais_12m["saidas"]),
+                      delta=format_currency_br(totais_12m["saidas"] - totais_12m["saidas_anterior"]),
+                      delta_color="inverse", help="Comparado aos 12 meses anteriores")
+            fig_12m = px.line(df_12m, x="Mes", y=["Entrada", "Saída"], markers=True,
+                              color_discrete_map=CORES_FLUXO)
+            fig_12m.update_layout(yaxis_title="Valor", legend_title="")
+            st.plotly_chart(fig_12m, use_container_width=True)
+
+        st.markdown("---")
+
         # =========================================================
         # SEÇÃO 1: INTELIGÊNCIA COMERCIAL (CORRIGIDA)
         # =========================================================
         st.subheader(f"🧠 Inteligência Comercial ({ano_atual})")
         
-        # IMPORTANTE: Usamos 'entradas_ano' que já contém apenas o que é de 2026
-        # seja por Data de Pagamento (Caixa) ou Vencimento (Previsão)
-        
-        if entradas_ano.empty:
-            st.info("Não há movimentações (pagas ou pendentes) para 2026.")
+        # Entradas do ano selecionado, pagas (pela Data de Pagamento) ou pendentes (pelo Vencimento)
+        df_origem = cons.por_dimensao(ano_atual, "Origem")
+        df_tipo = cons.por_dimensao(ano_atual, "Tipo")
+        df_categoria = cons.por_dimensao(ano_atual, "Categoria", fluxo="Saída")
+
+        if df_origem.empty and df_tipo.empty and df_categoria.empty:
+            st.info(f"Não há movimentações (pagas ou pendentes) para {ano_atual}.")
         else:
-            # Cruzamento rigoroso: apenas os IDs que passaram no filtro de 2026
-            df_analise = pd.merge(
-                entradas_ano, 
-                df_projetos[["ID_Projeto", "Cliente", "Origem", "Tipo", "Cidade", "Area_m2"]], 
-                on="ID_Projeto", 
-                how="left"
-            )
-            
-            col_i1, col_i2 = st.columns(2)
+            col_i1, col_i2, col_i3 = st.columns(3)
             
             with col_i1:
                 st.markdown("**💰 Receita Prevista/Realizada por Origem**")
-                if "Origem" in df_analise.columns:
-                    # Agrupa o valor das parcelas de 2026 por Origem
-                    df_origem = df_analise.groupby("Origem")["Valor"].sum().reset_index()
-                    if not df_origem.empty:
-                        fig_origem = px.pie(df_origem, values="Valor", names="Origem", hole=0.4,
-                                            color_discrete_sequence=px.colors.qualitative.Pastel)
-                        st.plotly_chart(fig_origem, use_container_width=True)
+                if not df_origem.empty:
+                    fig_origem = px.pie(df_origem, values="Valor", names="Origem", hole=0.4,
+                                        color_discrete_sequence=px.colors.qualitative.Pastel)
+                    st.plotly_chart(fig_origem, use_container_width=True)
 
             with col_i2:
                 st.markdown("**🏗️ Receita Prevista/Realizada por Tipo**")
-                if "Tipo" in df_analise.columns:
-                    # Agrupa o valor das parcelas de 2026 por Tipo
-                    df_tipo = df_analise.groupby("Tipo")["Valor"].sum().reset_index()
-                    if not df_tipo.empty:
-                        # Ordenar para o gráfico ficar mais organizado
-                        df_tipo = df_tipo.sort_values(by="Valor", ascending=True)
-                        fig_tipo = px.bar(df_tipo, x="Valor", y="Tipo", orientation='h', text_auto=True,
-                                          title=f"Distribuição de Receita {ano_atual}")
-                        st.plotly_chart(fig_tipo, use_container_width=True)
+                if not df_tipo.empty:
+                    # Ordenar para o gráfico ficar mais organizado
+                    df_tipo = df_tipo.sort_values(by="Valor", ascending=True)
+                    fig_tipo = px.bar(df_tipo, x="Valor", y="Tipo", orientation='h', text_auto=True,
+                                      title=f"Distribuição de Receita {ano_atual}")
+                    st.plotly_chart(fig_tipo, use_container_width=True)
+
+            with col_i3:
+                st.markdown("**🧾 Despesas por Categoria**")
+                if not df_categoria.empty:
+                    fig_cat = px.pie(df_categoria, values="Valor", names="Categoria", hole=0.4,
+                                     color_discrete_sequence=px.colors.qualitative.Set2)
+                    st.plotly_chart(fig_cat, use_container_width=True)
 
             # =========================================================
             # SEÇÃO 2: EFICIÊNCIA E HORAS
@@ -349,21 +847,16 @@ elif aba == "Dash Financeiro":
             st.markdown("---")
             st.subheader("⏱️ Eficiência e Lucratividade Real (Horas Gastas)")
             
-            horas_por_proj = df_tarefas.groupby("ID_Projeto")["Horas_Gastas"].sum().reset_index()
-            proj_financeiro = df_projetos[["ID_Projeto", "Cliente", "Proposta_Aceita_R$"]].copy()
-            df_eficiencia = pd.merge(proj_financeiro, horas_por_proj, on="ID_Projeto", how="inner")
-            
-            df_eficiencia = df_eficiencia[df_eficiencia["Horas_Gastas"] > 0] 
-            df_eficiencia["Valor_Hora_Real"] = df_eficiencia["Proposta_Aceita_R$"] / df_eficiencia["Horas_Gastas"]
+            with etapa("financeiro:eficiencia"):
+                df_eficiencia = get_eficiencia(df_projetos, df_tarefas, get_versoes("Projetos", "Tarefas"))
             
             if not df_eficiencia.empty:
-                df_eficiencia = df_eficiencia.sort_values(by="Valor_Hora_Real", ascending=True)
-                
                 c_efic1, c_efic2 = st.columns([2, 1])
                 with c_efic1:
                     st.markdown("**🏆 Ranking: Valor Real da Hora (R$/h)**")
-                    fig_hour = px.bar(df_eficiencia, x="Valor_Hora_Real", y="Cliente", orientation='h', text_auto=".2f",
-                                      color="Valor_Hora_Real", color_continuous_scale="RdYlGn")
+                    with etapa("grafico:valor_hora"):
+                        fig_hour = px.bar(df_eficiencia, x="Valor_Hora_Real", y="Cliente", orientation='h', text_auto=".2f",
+                                          color="Valor_Hora_Real", color_continuous_scale="RdYlGn")
                     fig_hour.update_layout(xaxis_title="Valor por Hora (R$)", yaxis_title="")
                     st.plotly_chart(fig_hour, use_container_width=True)
                     
@@ -391,7 +884,7 @@ elif aba == "Cadastro Projetos":
                 cliente = st.text_input("Nome do Cliente")
                 cidade = st.text_input("Cidade da Obra")
                 origem = st.text_input("Origem")
-                tipo = st.selectbox("Tipo", ["Residencial Unifamiliar", "Residencial Multifamiliar", "Comercial", "Reforma", "Industrial"])
+                tipo = st.selectbox("Tipo", TIPOS_PROJETO)
                 area = st.number_input("Área (m²)", min_value=0.0)
             with c2:
                 valor = st.number_input("Valor Proposta (R$)", min_value=0.0, step=100.0)
@@ -402,51 +895,73 @@ elif aba == "Cadastro Projetos":
                 link_render = st.text_input("Link Pasta Renders")
             if st.form_submit_button("Salvar Projeto"):
                 if cliente:
-                    novo = pd.DataFrame([{
-                        "ID_Projeto": len(df_projetos) + 1, "Cliente": cliente, "Origem": origem, 
+                    novo = {
+                        "ID_Projeto": repo.proximo_id("Projetos"), "Cliente": cliente, "Origem": origem, 
                         "Tipo": tipo, "Area_m2": area, "Proposta_Aceita_R$": valor, 
                         "Servicos": ", ".join(servicos), "Link_Proposta": link_prop, 
                         "Link_Pasta_Executivo": link_exec, "Link_Pasta_Renders": link_render, 
                         "Data_Cadastro": datetime.now().strftime("%Y-%m-%d"),
                         "Status_Geral": "Ativo", "Cidade": cidade, "Historico_Log": f"Criado em {get_now_br()}"
-                    }])
-                    save_data(pd.concat([df_projetos, novo], ignore_index=True), "Projetos")
+                    }
+                    append_row(novo, "Projetos")
                     st.success("Salvo!")
                     st.rerun()
 
     st.divider()
     st.subheader("Gerenciar Carteira")
+
+    def criar_botao(label, url):
+        s_url = str(url).strip()
+        if s_url and s_url.lower() != "nan": st.link_button(label, s_url)
+
+    @st.fragment
+    def card_projeto(idx, row, aberto=False):
+        row, atualizado = com_local(row["ID_Projeto"], row, "Projetos")
+        aberto = aberto or atualizado
+        icon_status = "🟢" if row['Status_Geral'] == 'Ativo' else "🏁"
+        exp = expander_sob_demanda(f"{icon_status} {row['Cliente']} | {row['Cidade']}", f"exp_proj_{idx}", aberto)
+        if not exp.open:
+            return
+        with exp:
+            c_dados, c_links, c_edit = st.columns([2, 2, 2])
+            with c_dados:
+                st.caption("Detalhes:")
+                st.write(f"**Tipo:** {row['Tipo']}")
+                st.write(f"**Área:** {row['Area_m2']} m²")
+            with c_links:
+                st.caption("Acesso Rápido:")
+                criar_botao("💰 Financeiro", row["Link_Proposta"])
+                criar_botao("📂 Projetos", row["Link_Pasta_Executivo"])
+                criar_botao("🖼️ Renders", row["Link_Pasta_Renders"])
+            with c_edit:
+                st.caption("Controle:")
+                opcoes_status = STATUS_PROJETO
+                idx_st = opcoes_status.index(row['Status_Geral']) if row['Status_Geral'] in opcoes_status else 0
+                novo_status = st.selectbox("Situação", opcoes_status, index=idx_st, key=f"st_proj_{idx}")
+                if st.button("Atualizar", key=f"btn_up_{idx}"):
+                    if novo_status != row['Status_Geral']:
+                        update_row_local(row["ID_Projeto"], {"Status_Geral": novo_status}, "Projetos", row)
+                if atualizado:
+                    st.success("Atualizado!")
+
+    @st.fragment
+    def lista_carteira(versoes):
+        c_ordem, c_pagina = st.columns([3, 1])
+        with c_ordem:
+            ordem = escolher_ordem(ORDENS_CARTEIRA, "carteira")
+        with c_pagina:
+            pagina = paginar(get_ordem(df_projetos, "carteira", ORDENS_CARTEIRA[ordem], versoes), "carteira")
+        for idx in pagina:
+            card_projeto(idx, df_projetos.loc[idx])
+
     if df_projetos.empty:
         st.info("Nenhum projeto.")
     else:
-        df_view = df_projetos.sort_values(by="Status_Geral", ascending=True)
-        for idx, row in df_view.iterrows():
-            icon_status = "🟢" if row['Status_Geral'] == 'Ativo' else "🏁"
-            with st.expander(f"{icon_status} {row['Cliente']} | {row['Cidade']}"):
-                c_dados, c_links, c_edit = st.columns([2, 2, 2])
-                with c_dados:
-                    st.caption("Detalhes:")
-                    st.write(f"**Tipo:** {row['Tipo']}")
-                    st.write(f"**Área:** {row['Area_m2']} m²")
-                with c_links:
-                    st.caption("Acesso Rápido:")
-                    def criar_botao(label, url):
-                        s_url = str(url).strip()
-                        if s_url and s_url.lower() != "nan": st.link_button(label, s_url)
-                    criar_botao("💰 Financeiro", row["Link_Proposta"])
-                    criar_botao("📂 Projetos", row["Link_Pasta_Executivo"])
-                    criar_botao("🖼️ Renders", row["Link_Pasta_Renders"])
-                with c_edit:
-                    st.caption("Controle:")
-                    opcoes_status = ["Ativo", "Concluído", "Suspenso", "Cancelado"]
-                    idx_st = opcoes_status.index(row['Status_Geral']) if row['Status_Geral'] in opcoes_status else 0
-                    novo_status = st.selectbox("Situação", opcoes_status, index=idx_st, key=f"st_proj_{idx}")
-                    if st.button("Atualizar", key=f"btn_up_{idx}"):
-                        if novo_status != row['Status_Geral']:
-                            df_projetos.at[idx, "Status_Geral"] = novo_status
-                            save_data(df_projetos, "Projetos")
-                            st.success("Atualizado!")
-                            st.rerun()
+        foco = registro_em_foco("Projetos")
+        if foco is not None:
+            card_projeto(foco, df_projetos.loc[foco], aberto=True)
+        else:
+            lista_carteira(get_versoes("Projetos"))
 
 # ==============================================================================
 # ABA 4: CONTROLE DE TAREFAS (COM FILTRO DE PROJETOS ATIVOS)
@@ -461,81 +976,132 @@ elif aba == "Controle de Tarefas":
         with st.form("task_form", clear_on_submit=True):
             proj = st.selectbox("Projeto", lista_projetos)
             c1, c2, c3 = st.columns(3)
-            fase = c1.selectbox("Fase", ["Modelagem", "Compatibilização", "Pranchas"])
-            resp = c2.selectbox("Responsável", ["GABRIEL", "MILENNA"])
-            prio = c3.selectbox("Prioridade", ["Alta", "Média", "Baixa"])
+            fase = c1.selectbox("Fase", FASES)
+            resp = c2.selectbox("Responsável", EQUIPE)
+            prio = c3.selectbox("Prioridade", PRIORIDADES)
             desc = st.text_input("Descrição")
             d_ini = st.date_input("Início")
             d_fim = st.date_input("Prazo")
             
             if st.form_submit_button("Criar Tarefa"):
                 if proj:
-                    id_p = df_projetos[df_projetos["Cliente"] == proj]["ID_Projeto"].values[0]
+                    id_p = get_id_projeto(proj)
                     
-                    nova = pd.DataFrame([{
+                    nova = {
                         "ID_Projeto": id_p, "Fase": fase, "Descricao": desc, "Responsavel": resp,
                         "Data_Inicio": str(d_ini), "Data_Deadline": str(d_fim), "Prioridade": prio,
                         "Status": "A Fazer", 
                         "Historico_Log": f"Criado em {get_now_br()}", "Data_Conclusao": "", "Horas_Gastas": 0.0
-                    }])
-                    
-                    df_final = pd.concat([df_tarefas, nova], ignore_index=True)
-                    df_final["Data_Inicio"] = pd.to_datetime(df_final["Data_Inicio"], errors='coerce').dt.strftime("%Y-%m-%d")
-                    df_final["Data_Deadline"] = pd.to_datetime(df_final["Data_Deadline"], errors='coerce').dt.strftime("%Y-%m-%d")
-                    
-                    save_data(df_final, "Tarefas")
+                    }
+                    append_row(nova, "Tarefas")
                     st.success("Criado!")
                     st.rerun()
     
     st.divider()
     if not df_tarefas.empty:
         df_full = pd.merge(df_tarefas, df_projetos[["ID_Projeto", "Cliente"]], on="ID_Projeto", how="left")
-        resp_f = st.multiselect("Filtrar Responsável", ["GABRIEL", "MILENNA"], default=["GABRIEL", "MILENNA"])
+        resp_f = st.multiselect("Filtrar Responsável", EQUIPE, default=EQUIPE)
         df_full = df_full[df_full["Responsavel"].isin(resp_f)]
+        foco = registro_em_foco("Tarefas")
+        if foco is not None:
+            df_full = df_full[df_full.index == foco]
 
-        for prio in ["Alta", "Média", "Baixa"]:
-            subset = df_full[(df_full["Prioridade"] == prio) & (df_full["Status"] != "Concluído")]
-            if not subset.empty:
-                st.markdown(f"### {prio}")
-                for idx, row in subset.iterrows():
-                    with st.container(border=True):
-                        c1, c2, c3, c4 = st.columns([3, 2, 2, 2])
-                        c1.markdown(f"**{row['Cliente']}**")
-                        c1.text(f"{row['Descricao']}")
-                        c2.text(f"De: {format_date_br(row['Data_Inicio'])}")
-                        c2.text(f"Até: {format_date_br(row['Data_Deadline'])}")
-                        
-                        novo_status = c3.selectbox("Status", ["A Fazer", "Em Andamento", "Revisão", "Concluído"], 
-                                                   index=["A Fazer", "Em Andamento", "Revisão", "Concluído"].index(row['Status']), 
-                                                   key=f"s_{idx}")
-                        horas = c4.number_input("Horas Gastas", value=float(row.get("Horas_Gastas", 0.0)), step=0.5, key=f"h_{idx}")
-                        
-                        if c4.button("💾 Salvar", key=f"b_{idx}"):
-                            df_tarefas.at[idx, "Status"] = novo_status
-                            df_tarefas.at[idx, "Horas_Gastas"] = horas
-                            if novo_status == "Concluído" and row['Status'] != "Concluído":
-                                df_tarefas.at[idx, "Data_Conclusao"] = get_now_br()
-                            
-                            df_tarefas["Data_Inicio"] = pd.to_datetime(df_tarefas["Data_Inicio"], errors='coerce').dt.strftime("%Y-%m-%d")
-                            df_tarefas["Data_Deadline"] = pd.to_datetime(df_tarefas["Data_Deadline"], errors='coerce').dt.strftime("%Y-%m-%d")
-                            
-                            save_data(df_tarefas, "Tarefas")
-                            st.rerun()
+        @st.fragment
+        def grade_tarefas(df_full):
+            # Grade editável: só as linhas alteradas são gravadas, numa única escrita
+            colunas_grade = ["Responsavel", "Status", "Horas_Gastas", "Data_Deadline"]
+            grade = df_full[df_full["Status"] != "Concluído"][["Cliente", "Descricao", "Prioridade"] + colunas_grade]
+            versao_grade = st.session_state.get("versao_grade_tarefas", 0)
+            editado = st.data_editor(
+                grade, key=f"grade_tarefas_{versao_grade}", hide_index=True, use_container_width=True,
+                disabled=["Cliente", "Descricao", "Prioridade"],
+                column_config={
+                    "Responsavel": st.column_config.SelectboxColumn("Responsável", options=EQUIPE, required=True),
+                    "Status": st.column_config.SelectboxColumn("Status", options=STATUS_TAREFA, required=True),
+                    "Horas_Gastas": st.column_config.NumberColumn("Horas Gastas", min_value=0.0, step=0.5),
+                    "Data_Deadline": st.column_config.DateColumn("Prazo", format="DD/MM/YYYY"),
+                },
+            )
+            alteracoes = alteracoes_por_linha(grade, editado, colunas_grade)
+            if st.button(f"💾 Salvar {len(alteracoes)} tarefa(s)", disabled=not alteracoes):
+                lote = LoteEscrita(repo)
+                for idx, campos in alteracoes.items():
+                    if campos.get("Status") == "Concluído":
+                        campos["Data_Conclusao"] = get_now_br()
+                    lote.atualizar("Tarefas", idx, campos, df_full.loc[idx])
+                try:
+                    with etapa("gravacao:Tarefas"):
+                        lote.salvar()
+                except ConflitoEscrita as conflito:
+                    st.session_state["_conflito"] = str(conflito)
+                    st.rerun()
+                registro_escritas.registrar_escrita("Tarefas", sessao_id)
+                st.session_state["versao_grade_tarefas"] = versao_grade + 1
+                st.success("Salvo!")
+                # Várias linhas mudaram de lista: a página inteira é redesenhada
+                st.rerun()
+
+        @st.fragment
+        def card_tarefa(idx, row):
+            row, _ = com_local(idx, row, "Tarefas")
+            with st.container(border=True):
+                if row["Status"] == "Concluído":
+                    st.success(f"**{row['Cliente']}** - {row['Descricao']}: concluída (vai para o histórico).")
+                    return
+                c1, c2, c3, c4 = st.columns([3, 2, 2, 2])
+                c1.markdown(f"**{row['Cliente']}**")
+                c1.text(f"{row['Descricao']}")
+                c2.text(f"De: {format_date_br(row['Data_Inicio'])}")
+                c2.text(f"Até: {format_date_br(row['Data_Deadline'])}")
+
+                novo_status = c3.selectbox("Status", STATUS_TAREFA, 
+                                           index=STATUS_TAREFA.index(row['Status']), 
+                                           key=f"s_{idx}")
+                horas = c4.number_input("Horas Gastas", value=float(row.get("Horas_Gastas", 0.0)), step=0.5, key=f"h_{idx}")
+
+                if c4.button("💾 Salvar", key=f"b_{idx}"):
+                    campos = {"Status": novo_status, "Horas_Gastas": horas}
+                    if novo_status == "Concluído" and row['Status'] != "Concluído":
+                        campos["Data_Conclusao"] = get_now_br()
+                    update_row_local(idx, campos, "Tarefas", row)
+
+        @st.fragment
+        def card_entrega(idx, row):
+            row, _ = com_local(idx, row, "Tarefas")
+            with st.container(border=True):
+                if row["Status"] != "Concluído":
+                    st.info(f"**{row['Cliente']}** - {row['Descricao']}: reaberta.")
+                    return
+                c_a, c_b = st.columns([5, 1])
+                c_a.markdown(f"~~**{row['Cliente']}** - {row['Descricao']}~~ (Entregue: {row.get('Data_Conclusao', '-')})")
+                if c_b.button("Reabrir", key=f"re_{idx}"):
+                    update_row_local(idx, {"Status": "Em Andamento", "Data_Conclusao": ""}, "Tarefas", row)
+
+        edicao_lote = st.toggle("✏️ Edição em lote", help="Edite várias tarefas na grade e salve tudo de uma vez.")
+        if edicao_lote:
+            grade_tarefas(df_full)
+        else:
+            for prio in PRIORIDADES:
+                subset = df_full[(df_full["Prioridade"] == prio) & (df_full["Status"] != "Concluído")]
+                if not subset.empty:
+                    st.markdown(f"### {prio}")
+                    for idx, row in subset.iterrows():
+                        card_tarefa(idx, row)
         st.markdown("---")
-        with st.expander("✅ Histórico de Entregas"):
+        with st.expander("✅ Histórico de Entregas", expanded=foco is not None):
             concluidas = df_full[df_full["Status"] == "Concluído"]
             if not concluidas.empty:
                 for idx, row in concluidas.iterrows():
-                    with st.container(border=True):
-                        c_a, c_b = st.columns([5, 1])
-                        c_a.markdown(f"~~**{row['Cliente']}** - {row['Descricao']}~~ (Entregue: {row.get('Data_Conclusao', '-')})")
-                        if c_b.button("Reabrir", key=f"re_{idx}"):
-                            df_tarefas.at[idx, "Status"] = "Em Andamento"
-                            df_tarefas.at[idx, "Data_Conclusao"] = ""
-                            df_tarefas["Data_Inicio"] = pd.to_datetime(df_tarefas["Data_Inicio"], errors='coerce').dt.strftime("%Y-%m-%d")
-                            df_tarefas["Data_Deadline"] = pd.to_datetime(df_tarefas["Data_Deadline"], errors='coerce').dt.strftime("%Y-%m-%d")
-                            save_data(df_tarefas, "Tarefas")
-                            st.rerun()
+                    card_entrega(idx, row)
+            if arquivo.anos("Tarefas") and st.toggle("Incluir anos anteriores (arquivo)", key="entregas_arquivo"):
+                with etapa("historico:entregas"):
+                    arquivadas = get_arquivados("Tarefas", arquivo.versao("Tarefas"))
+                    clientes = pd.concat([df_projetos, get_arquivados("Projetos", arquivo.versao("Projetos"))])
+                    arquivadas = pd.merge(arquivadas, clientes[["ID_Projeto", "Cliente"]].drop_duplicates("ID_Projeto"),
+                                          on="ID_Projeto", how="left")
+                    arquivadas = arquivadas[arquivadas["Responsavel"].isin(resp_f)]
+                st.dataframe(arquivadas[["Cliente", "Descricao", "Responsavel", "Data_Conclusao"]],
+                             hide_index=True, use_container_width=True)
 
 # ==============================================================================
 # ABA 5: CONTROLE FINANCEIRO (COM FILTRO DE PROJETOS ATIVOS)
@@ -555,42 +1121,76 @@ elif aba == "Controle Financeiro":
             
             c4, c5 = st.columns(2)
             venc_fin = c4.date_input("Vencimento")
-            status_fin = c5.selectbox("Status Inicial", ["Pendente", "Pago"])
+            status_fin = c5.selectbox("Status Inicial", STATUS_PAGAMENTO)
             
             if st.form_submit_button("Registrar"):
                 if proj_fin:
-                    id_p = df_projetos[df_projetos["Cliente"] == proj_fin]["ID_Projeto"].values[0]
+                    id_p = get_id_projeto(proj_fin)
                     data_pg = str(venc_fin) if status_fin == "Pago" else ""
-                    val_imposto = (valor_fin * 0.155) if status_fin == "Pago" else 0.0
+                    val_imposto = (valor_fin * ALIQUOTA_IMPOSTO) if status_fin == "Pago" else 0.0
                     
-                    novo_fin = pd.DataFrame([{
-                        "ID_Lancamento": len(df_financeiro) + 1, "ID_Projeto": id_p,
+                    novo_fin = {
+                        "ID_Lancamento": repo.proximo_id("Financeiro"), "ID_Projeto": id_p,
                         "Descricao": desc_fin, "Valor": valor_fin,
                         "Vencimento": str(venc_fin), "Status": status_fin, 
                         "Data_Pagamento": data_pg, "Valor_Imposto": val_imposto
-                    }])
-                    df_final = pd.concat([df_financeiro, novo_fin], ignore_index=True)
-                    df_final["Vencimento"] = pd.to_datetime(df_final["Vencimento"]).dt.strftime("%Y-%m-%d")
-                    df_final["Valor_Imposto"] = df_final["Valor_Imposto"].fillna(0.0) 
-                    save_data(df_final, "Financeiro")
+                    }
+                    append_row(novo_fin, "Financeiro")
                     st.success("Registrado!")
                     st.rerun()
+
+    with st.expander("📆 Planos de Parcelas"):
+        with st.form("plano_form", clear_on_submit=True):
+            c1, c2, c3 = st.columns([2, 2, 1])
+            proj_plano = c1.selectbox("Projeto", lista_projetos)
+            desc_plano = c2.text_input("Descrição", value="Honorários")
+            total_plano = c3.number_input("Valor total (0 = proposta)", min_value=0.0, step=100.0,
+                                          help="Com 0, as parcelas acompanham a Proposta Aceita do projeto")
+
+            c4, c5, c6, c7 = st.columns(4)
+            entrada_plano = c4.number_input("Entrada (%)", min_value=0.0, max_value=100.0, value=30.0, step=5.0)
+            parcelas_plano = c5.number_input("Parcelas (com a entrada)", min_value=1, value=4, step=1)
+            freq_plano = c6.selectbox("Frequência", FREQUENCIAS)
+            inicio_plano = c7.date_input("1º Vencimento")
+
+            if st.form_submit_button("Criar Plano"):
+                if proj_plano:
+                    novo_plano = {
+                        "ID_Recorrencia": repo.proximo_id("Recorrencias"), "Tipo": "Parcelamento",
+                        "Descricao": desc_plano, "Categoria": "", "ID_Projeto": get_id_projeto(proj_plano),
+                        "Valor": total_plano, "Entrada_Pct": entrada_plano, "Frequencia": freq_plano,
+                        "Ocorrencias": int(parcelas_plano), "Inicio": str(inicio_plano), "Fim": ""
+                    }
+                    append_row(novo_plano, "Recorrencias")
+                    st.success("Plano criado!")
+                    st.rerun()
+
+        planos = df_recorrencias[df_recorrencias["Tipo"] == "Parcelamento"]
+        bloco_recorrencias(planos, "Receber (15.5% Imposto)", dict(zip(df_projetos["ID_Projeto"], df_projetos["Cliente"])))
+
+    with st.expander("🏦 Conciliação Bancária (extrato CSV/OFX)"):
+        st.caption("Recebimentos e despesas pendentes com o mesmo valor do extrato são propostos para baixa; "
+                   "a data do banco vira a data de pagamento.")
+        bloco_conciliacao()
     
     st.divider()
     if not df_financeiro.empty:
         st.subheader("Extrato por Projeto")
-        df_view = pd.merge(df_financeiro, df_projetos[["ID_Projeto", "Cliente"]], on="ID_Projeto", how="left")
-        
-        # AQUI MANTEMOS TODOS PARA VER O HISTÓRICO (Mesmo de concluídos)
-        projetos_com_fin = df_view["Cliente"].unique()
+        foco = registro_em_foco("Financeiro")
         
-        for cliente in projetos_com_fin:
-            subset = df_view[df_view["Cliente"] == cliente]
-            tem_pendencia = subset[subset["Status"] == "Pendente"].shape[0] > 0
+        @st.fragment
+        def extrato_cliente(cliente, subset, aberto=False):
+            # O ícone do expander também se atualiza quando uma parcela é recebida
+            linhas = [com_local(row["ID_Lancamento"], row, "Financeiro") for _, row in subset.iterrows()]
+            tem_pendencia = any(row["Status"] == "Pendente" for row, _ in linhas)
             icone = "🔴" if tem_pendencia else "✅"
-            
-            with st.expander(f"{icone} {cliente}"):
-                for idx, row in subset.iterrows():
+
+            exp = expander_sob_demanda(f"{icone} {cliente}", f"exp_cli_{cliente}",
+                                       aberto or any(alterada for _, alterada in linhas))
+            if not exp.open:
+                return
+            with exp:
+                for row, _ in linhas:
                     with st.container(border=True):
                         c_desc, c_val, c_btn = st.columns([3, 2, 2])
                         c_desc.markdown(f"**{row['Descricao']}**")
@@ -600,23 +1200,36 @@ elif aba == "Controle Financeiro":
                             c_val.markdown(f"**{format_currency_br(row['Valor'])}**")
                             
                             if c_btn.button("Receber (15.5% Imposto)", key=f"rec_{row['ID_Lancamento']}"):
-                                real_idx = df_financeiro[df_financeiro["ID_Lancamento"] == row["ID_Lancamento"]].index[0]
-                                valor_recebido = df_financeiro.at[real_idx, "Valor"]
-                                imposto_calculado = valor_recebido * 0.155
-                                df_financeiro.at[real_idx, "Status"] = "Pago"
-                                df_financeiro.at[real_idx, "Data_Pagamento"] = str(get_today_date())
-                                df_financeiro.at[real_idx, "Valor_Imposto"] = imposto_calculado
-                                df_financeiro["Vencimento"] = pd.to_datetime(df_financeiro["Vencimento"]).dt.strftime("%Y-%m-%d")
-                                df_financeiro["Valor_Imposto"] = df_financeiro["Valor_Imposto"].fillna(0.0)
-                                df_financeiro["Valor"] = df_financeiro["Valor"].fillna(0.0)
-                                save_data(df_financeiro, "Financeiro")
+                                imposto_calculado = row["Valor"] * ALIQUOTA_IMPOSTO
                                 st.balloons()
-                                st.rerun()
+                                update_row_local(row["ID_Lancamento"], {
+                                    "Status": "Pago", "Data_Pagamento": str(get_today_date()),
+                                    "Valor_Imposto": imposto_calculado
+                                }, "Financeiro", row)
                         else:
                             c_desc.caption(f"Pago: {format_date_br(row['Data_Pagamento'])}")
                             c_val.markdown(f"**{format_currency_br(row['Valor'])}**")
                             c_desc.caption(f"Imposto retido: {format_currency_br(row.get('Valor_Imposto', 0.0))}")
                             c_btn.success("Pago")
+
+        @st.fragment
+        def lista_extrato(versoes):
+            # AQUI MANTEMOS TODOS PARA VER O HISTÓRICO (Mesmo de concluídos)
+            grupos, resumo = get_grupos_extrato(df_financeiro, df_projetos, versoes)
+            c_ordem, c_pagina = st.columns([3, 1])
+            with c_ordem:
+                ordem = escolher_ordem(ORDENS_EXTRATO, "extrato")
+            with c_pagina:
+                pagina = paginar(get_ordem(resumo, "extrato", ORDENS_EXTRATO[ordem], versoes), "extrato")
+            for cliente in pagina:
+                extrato_cliente(cliente, df_financeiro.loc[grupos[cliente]])
+
+        if foco is not None:
+            pos = repo.posicao("Projetos", df_financeiro.at[foco, "ID_Projeto"])
+            cliente = df_projetos.at[pos, "Cliente"] if pos is not None else "?"
+            extrato_cliente(cliente, df_financeiro.loc[[foco]], aberto=True)
+        else:
+            lista_extrato(get_versoes("Financeiro", "Projetos"))
     else:
         st.info("Nenhum lançamento.")
 
@@ -630,30 +1243,55 @@ elif aba == "Controle Despesas":
         with st.form("desp_form", clear_on_submit=True):
             c1, c2, c3 = st.columns([2, 2, 1])
             desc_dsp = c1.text_input("Descrição (Ex: Contador Mensal)")
-            cat_dsp = c2.selectbox("Categoria", ["Contabilidade", "Software/Licenças", "Pro-labore", "Marketing", "Taxas", "Outros"])
+            cat_dsp = c2.selectbox("Categoria", CATEGORIAS_DESPESA)
             val_dsp = c3.number_input("Valor (R$)", min_value=0.0, step=100.0)
             
             c4, c5 = st.columns(2)
             venc_dsp = c4.date_input("Vencimento")
-            status_dsp = c5.selectbox("Status", ["Pendente", "Pago"])
+            status_dsp = c5.selectbox("Status", STATUS_PAGAMENTO)
             
             if st.form_submit_button("Registrar Despesa"):
                 data_pg = str(venc_dsp) if status_dsp == "Pago" else ""
-                nova_dsp = pd.DataFrame([{
-                    "ID_Despesa": len(df_despesas) + 1, "Descricao": desc_dsp, "Categoria": cat_dsp,
+                nova_dsp = {
+                    "ID_Despesa": repo.proximo_id("Despesas"), "Descricao": desc_dsp, "Categoria": cat_dsp,
                     "Valor": val_dsp, "Vencimento": str(venc_dsp), "Status": status_dsp, "Data_Pagamento": data_pg
-                }])
-                df_final = pd.concat([df_despesas, nova_dsp], ignore_index=True)
-                df_final["Vencimento"] = pd.to_datetime(df_final["Vencimento"]).dt.strftime("%Y-%m-%d")
-                save_data(df_final, "Despesas")
+                }
+                append_row(nova_dsp, "Despesas")
                 st.success("Despesa salva!")
                 st.rerun()
 
+    with st.expander("🔁 Despesas Recorrentes (mensais, anuais...)"):
+        with st.form("recorrente_form", clear_on_submit=True):
+            c1, c2, c3 = st.columns([2, 2, 1])
+            desc_rec = c1.text_input("Descrição (Ex: Contador Mensal)")
+            cat_rec = c2.selectbox("Categoria", CATEGORIAS_DESPESA)
+            val_rec = c3.number_input("Valor (R$)", min_value=0.0, step=100.0)
+
+            c4, c5, c6 = st.columns(3)
+            freq_rec = c4.selectbox("Frequência", FREQUENCIAS)
+            inicio_rec = c5.date_input("1º Vencimento")
+            qtd_rec = c6.number_input("Ocorrências (0 = sem fim)", min_value=0, value=0, step=1)
+
+            if st.form_submit_button("Criar Recorrência"):
+                nova_rec = {
+                    "ID_Recorrencia": repo.proximo_id("Recorrencias"), "Tipo": "Despesa", "Descricao": desc_rec,
+                    "Categoria": cat_rec, "ID_Projeto": "", "Valor": val_rec, "Entrada_Pct": 0.0,
+                    "Frequencia": freq_rec, "Ocorrencias": int(qtd_rec), "Inicio": str(inicio_rec), "Fim": ""
+                }
+                append_row(nova_rec, "Recorrencias")
+                st.success("Recorrência criada!")
+                st.rerun()
+
+        bloco_recorrencias(df_recorrencias[df_recorrencias["Tipo"] == "Despesa"], "Pagar")
+
     st.divider()
     if not df_despesas.empty:
         st.subheader("Histórico de Despesas")
-        df_view = df_despesas.sort_values(by="Vencimento", ascending=False)
-        for idx, row in df_view.iterrows():
+        foco = registro_em_foco("Despesas")
+
+        @st.fragment
+        def card_despesa(row):
+            row, _ = com_local(row["ID_Despesa"], row, "Despesas")
             with st.container(border=True):
                 c1, c2, c3 = st.columns([3, 2, 2])
                 c1.markdown(f"**{row['Descricao']}** ({row['Categoria']})")
@@ -661,15 +1299,77 @@ elif aba == "Controle Despesas":
                     c1.caption(f"Vence: {format_date_br(row['Vencimento'])}")
                     c2.markdown(f"**{format_currency_br(row['Valor'])}**")
                     if c3.button("Pagar", key=f"pag_{row['ID_Despesa']}"):
-                        real_idx = df_despesas[df_despesas["ID_Despesa"] == row["ID_Despesa"]].index[0]
-                        df_despesas.at[real_idx, "Status"] = "Pago"
-                        df_despesas.at[real_idx, "Data_Pagamento"] = str(get_today_date())
-                        df_despesas["Vencimento"] = pd.to_datetime(df_despesas["Vencimento"]).dt.strftime("%Y-%m-%d")
-                        save_data(df_despesas, "Despesas")
-                        st.rerun()
+                        update_row_local(row["ID_Despesa"], {"Status": "Pago", "Data_Pagamento": str(get_today_date())},
+                                         "Despesas", row)
                 else:
                     c1.caption(f"Pago: {format_date_br(row['Data_Pagamento'])}")
                     c2.markdown(f"**{format_currency_br(row['Valor'])}**")
                     c3.success("Pago")
+
+        @st.fragment
+        def lista_despesas(versoes):
+            c_ordem, c_pagina = st.columns([3, 1])
+            with c_ordem:
+                ordem = escolher_ordem(ORDENS_DESPESAS, "despesas")
+            with c_pagina:
+                pagina = paginar(get_ordem(df_despesas, "despesas", ORDENS_DESPESAS[ordem], versoes), "despesas")
+            for idx in pagina:
+                card_despesa(df_despesas.loc[idx])
+
+        if foco is not None:
+            card_despesa(df_despesas.loc[foco])
+        else:
+            lista_despesas(get_versoes("Despesas"))
     else:
         st.info("Nenhuma despesa registrada.")
+
+# ==============================================================================
+# PAINEL DE DESEMPENHO (ADMIN, COM PERFIL=1 E ?admin=...)
+# ==============================================================================
+if admin(st.query_params):
+    reruns = recentes()
+    with st.sidebar.expander(f"⏱️ Desempenho ({len(reruns)} reruns)"):
+        if not reruns:
+            st.caption("Nenhum rerun concluído ainda.")
+        else:
+            lista = pd.DataFrame([{
+                "Início": r["inicio"][11:], "Sessão": r["sessao"], "Aba": r["aba"], "Total (ms)": r["total_ms"],
+                "Leituras": sum(1 for i in r["io"] if i["operacao"] == "leitura"),
+                "Escritas": sum(1 for i in r["io"] if i["operacao"] != "leitura"),
+                "Interrompido": r["interrompido"],
+            } for r in reversed(reruns)])
+            st.dataframe(lista, hide_index=True)
+
+            sel = st.selectbox("Detalhar rerun", range(len(reruns)),
+                               format_func=lambda i: f"{lista.at[i, 'Início']} · {lista.at[i, 'Aba']} · {lista.at[i, 'Total (ms)']:.0f} ms")
+            escolhido = reruns[-1 - sel]
+            etapas = pd.DataFrame(escolhido["etapas"], columns=["etapa", "nivel", "inicio_ms", "ms"])
+            medido = etapas.loc[etapas["nivel"] == 0, "ms"].sum()
+            etapas = etapas.sort_values("inicio_ms")
+            etapas["etapa"] = ["  " * n + e for e, n in zip(etapas["etapa"], etapas["nivel"])]
+            etapas = pd.concat([etapas, pd.DataFrame([{"etapa": "(widgets e demais)", "nivel": 0, "inicio_ms": None,
+                                                      "ms": round(escolhido["total_ms"] - medido, 2)}])])
+            st.dataframe(etapas[["etapa", "ms"]], hide_index=True)
+            if escolhido["io"]:
+                st.caption("Planilha (linhas e bytes por operação)")
+                st.dataframe(pd.DataFrame(escolhido["io"]), hide_index=True)
+
+            todas = pd.DataFrame([e for r in reruns for e in r["etapas"]], columns=["etapa", "nivel", "inicio_ms", "ms"])
+            if not todas.empty:
+                st.caption("Média por etapa nos reruns recentes")
+                media = todas.groupby("etapa")["ms"].agg(["count", "mean", "max"]).round(1)
+                st.dataframe(media.sort_values("mean", ascending=False))
+
+finalizar_rerun()
+
+# --- INÍCIO RÁPIDO ---
+# plotly, fpdf e o conector do Sheets são importados só por quem usa. Depois da
+# primeira página servida pelo processo (para não disputar CPU com ela), o
+# aquecimento deixa gráficos e PDFs prontos em segundo plano.
+@st.cache_resource
+def iniciar_aquecimento():
+    thread = threading.Thread(target=aquecer, name="aquecimento", daemon=True)
+    thread.start()
+    return thread
+
+iniciar_aquecimento()
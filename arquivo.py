@@ -0,0 +1,309 @@
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+import pandas as pd
+
+from concorrencia import COLUNA_VERSAO, IDENTIDADE, versao_linha
+from esquema import tipar
+from financas import data_considerada
+from planilhas import CHAVES, normalizar_chave, valor_celula
+from recorrencias import encerradas
+
+# --- CONFIGURAÇÃO ---
+# Registros encerrados saem das abas de trabalho e vão para partições por ano.
+# ARQUIVO=sheets (padrão) cria abas "Arquivo_<Aba>_<ano>" na própria planilha;
+# ARQUIVO=parquet grava <ARQUIVO_PASTA>/<Aba>_<ano>.parquet no servidor.
+PREFIXO_ABA = "Arquivo_"
+PASTA_PARQUET = "arquivo"
+# Anos que ficam nas abas de trabalho: 1 = só o ano corrente
+ANOS_QUENTES = 1
+# Partições mudam só quando alguém arquiva; outros processos releem a lista depois disso
+TTL_PARTICOES = 600
+# Ordem importa: Projetos por último, para manter os que ainda têm tarefas ou lançamentos ativos
+ORDEM = ["Tarefas", "Financeiro", "Despesas", "Projetos"]
+FORMATO_CONCLUSAO = "%d/%m/%Y %H:%M"
+
+
+# --- REGRAS DE ENCERRAMENTO ---
+def _datas(serie, formato=None):
+    if formato is None:
+        return pd.to_datetime(serie, errors="coerce")
+    datas = pd.to_datetime(serie, format=formato, errors="coerce")
+    return datas.fillna(pd.to_datetime(serie.where(datas.isna()), errors="coerce"))
+
+def _para_gravar(df):
+    # Vazios como "" (a API do Sheets rejeita NaN)
+    return df.astype(object).where(df.notna(), "")
+
+def ano_encerramento(aba, df):
+    """Ano em que cada registro foi encerrado (NaN se ainda está aberto).
+
+    Tarefas: concluídas, pelo Data_Conclusao (ou prazo). Financeiro e Despesas:
+    pagos, pela data de pagamento (ou vencimento). Projetos: concluídos ou
+    cancelados, pelo ano de cadastro.
+    """
+    if df.empty:
+        return pd.Series(dtype="float64", index=df.index)
+    if aba == "Tarefas":
+        fechado = df["Status"] == "Concluído"
+        data = _datas(df["Data_Conclusao"], FORMATO_CONCLUSAO).fillna(_datas(df["Data_Deadline"]))
+    elif aba in ("Financeiro", "Despesas"):
+        fechado = df["Status"] == "Pago"
+        data = data_considerada(df)
+    else:
+        fechado = df["Status_Geral"].isin(["Concluído", "Cancelado"])
+        data = _datas(df["Data_Cadastro"])
+    return data.dt.year.where(fechado & data.notna())
+
+def _referenciados(*dfs):
+    return {normalizar_chave(v) for df in dfs if df is not None and "ID_Projeto" in df.columns
+            for v in df["ID_Projeto"].dropna()}
+
+def _identidade(aba, df):
+    # Chave primária; Tarefas, sem ID, casa pelas colunas de identidade
+    colunas = [CHAVES[aba]] if CHAVES.get(aba) else IDENTIDADE.get(aba, [])
+    if not colunas or any(c not in df.columns for c in colunas):
+        return None
+    valores = [df[c].map(lambda v: normalizar_chave(valor_celula(v))) for c in colunas]
+    return pd.Series(list(zip(*valores)), index=df.index, dtype=object)
+
+def _sem_duplicados(aba, df):
+    """Uma cópia de cada registro: a de versão mais alta (no empate, a acrescentada por último)."""
+    chaves = _identidade(aba, df)
+    if chaves is None or df.empty:
+        return df
+    versoes = df[COLUNA_VERSAO].map(versao_linha) if COLUNA_VERSAO in df.columns else pd.Series(0, index=df.index)
+    ordem = versoes.sort_values(kind="stable").index
+    manter = ordem[~chaves.loc[ordem].duplicated(keep="last").to_numpy()]
+    return df.loc[sorted(manter)].reset_index(drop=True)
+
+def _nao_removidos(aba, linhas, antes, depois):
+    """Identidades das linhas que remover() deixou na aba (contadas: Tarefas pode repetir identidade)."""
+    chaves, antes, depois = (_identidade(aba, df) for df in (linhas, antes, depois))
+    if chaves is None or antes is None:
+        return set()
+    saiu = Counter(antes) - Counter(depois if depois is not None else [])
+    return {c for c, n in Counter(chaves).items() if n > saiu[c]}
+
+def _regras_abertas(repo, hoje):
+    # Recorrencias não é arquivada; regras em vigor precisam do projeto (ex.: parcelas pela proposta)
+    regras = tipar("Recorrencias", repo.ler("Recorrencias"))
+    return regras[~encerradas(regras, hoje).to_numpy(dtype=bool)] if not regras.empty else regras
+
+
+# --- DESTINOS DAS PARTIÇÕES ---
+class ParticoesSheets:
+    """Uma aba por (entidade, ano) na mesma planilha."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _nome(self, aba, ano):
+        return f"{PREFIXO_ABA}{aba}_{ano}"
+
+    def listar(self):
+        """{(aba, ano): marca}; a marca (linhas da aba) muda quando a partição cresce."""
+        padrao = re.compile(rf"^{PREFIXO_ABA}(\w+)_(\d{{4}})$")
+        try:
+            planilhas = self.conn.client._open_spreadsheet().worksheets()
+        except Exception:
+            # Planilha pública (sem conta de serviço): não há como listar nem arquivar
+            return {}
+        particoes = {}
+        for planilha in planilhas:
+            m = padrao.match(planilha.title)
+            if m:
+                particoes[(m.group(1), int(m.group(2)))] = planilha.row_count
+        return particoes
+
+    def ler(self, aba, ano):
+        return self.conn.read(worksheet=self._nome(aba, ano), ttl=0)
+
+    def gravar(self, aba, ano, df, existe):
+        if existe:
+            self.conn.update(worksheet=self._nome(aba, ano), data=_para_gravar(df))
+        else:
+            self.conn.create(worksheet=self._nome(aba, ano), data=_para_gravar(df))
+
+
+class ParticoesParquet:
+    """Um arquivo Parquet por (entidade, ano) numa pasta local."""
+
+    def __init__(self, pasta=PASTA_PARQUET):
+        self.pasta = pasta
+
+    def _caminho(self, aba, ano):
+        return os.path.join(self.pasta, f"{aba}_{ano}.parquet")
+
+    def listar(self):
+        """{(aba, ano): marca}; a marca (mtime do arquivo) muda quando a partição cresce."""
+        if not os.path.isdir(self.pasta):
+            return {}
+        padrao = re.compile(r"^(\w+)_(\d{4})\.parquet$")
+        particoes = {}
+        for nome in os.listdir(self.pasta):
+            m = padrao.match(nome)
+            if m:
+                particoes[(m.group(1), int(m.group(2)))] = os.path.getmtime(os.path.join(self.pasta, nome))
+        return particoes
+
+    def ler(self, aba, ano):
+        return pd.read_parquet(self._caminho(aba, ano))
+
+    def gravar(self, aba, ano, df, existe):
+        os.makedirs(self.pasta, exist_ok=True)
+        # Partição gravada num temporário e renomeada: quem lê nunca vê um arquivo pela metade
+        temporario = self._caminho(aba, ano) + ".tmp"
+        _para_gravar(df).astype(str).to_parquet(temporario, index=False)
+        os.replace(temporario, self._caminho(aba, ano))
+
+
+# --- ARQUIVO ---
+class Arquivo:
+    """Partições anuais dos registros encerrados, lidas só por quem pede histórico.
+
+    As partições ficam em memória depois da primeira leitura (são frias: só
+    mudam quando arquivar() acrescenta registros), e versao(aba) sobe a cada
+    mudança para servir de chave aos caches do app.
+    """
+
+    def __init__(self, destino, ttl_particoes=TTL_PARTICOES):
+        self.destino = destino
+        self.ttl_particoes = ttl_particoes
+        self._particoes = None
+        self._listado_em = 0.0
+        self._cache = {}
+        self._versoes = {}
+        self._lock = threading.RLock()
+
+    def _listar(self):
+        if self._particoes is None or time.monotonic() - self._listado_em > self.ttl_particoes:
+            particoes = self.destino.listar()
+            if self._particoes is not None:
+                # Outro processo arquivou: descarta as partições em memória que mudaram
+                for chave in set(particoes) | set(self._particoes):
+                    if particoes.get(chave) != self._particoes.get(chave):
+                        self._cache.pop(chave, None)
+                        self._versoes[chave[0]] = self._versoes.get(chave[0], 0) + 1
+            self._particoes = particoes
+            self._listado_em = time.monotonic()
+        return self._particoes
+
+    def anos(self, aba):
+        with self._lock:
+            return sorted(ano for a, ano in self._listar() if a == aba)
+
+    def versao(self, aba):
+        with self._lock:
+            self._listar()
+            return self._versoes.get(aba, 0)
+
+    def ler(self, aba, anos=None):
+        """Registros arquivados da aba nos anos pedidos (todos, se None)."""
+        with self._lock:
+            partes = []
+            for ano in self.anos(aba):
+                if anos is not None and ano not in anos:
+                    continue
+                if (aba, ano) not in self._cache:
+                    self._cache[(aba, ano)] = self.destino.ler(aba, ano)
+                partes.append(self._cache[(aba, ano)])
+        if not partes:
+            return pd.DataFrame()
+        return pd.concat(partes, ignore_index=True)
+
+    def com_historico(self, aba, quente, anos=None):
+        """Aba de trabalho seguida dos registros arquivados.
+
+        O índice das linhas de trabalho não muda (Tarefas é endereçada pela
+        posição); um registro que aparece nos dois lados (arquivamento
+        interrompido no meio) vale pela versão de trabalho.
+        """
+        frio = self.ler(aba, anos)
+        if frio.empty:
+            return quente
+        chaves_frio, chaves_quente = _identidade(aba, frio), _identidade(aba, quente)
+        if chaves_frio is not None and chaves_quente is not None:
+            chaves = set(chaves_quente)
+            frio = frio[~chaves_frio.map(lambda c: c in chaves).to_numpy(dtype=bool)]
+        frio = frio.reindex(columns=quente.columns if not quente.empty else frio.columns)
+        frio.index = range(len(quente), len(quente) + len(frio))
+        return pd.concat([quente, frio])
+
+    def _acrescentar(self, aba, ano, linhas):
+        existe = (aba, ano) in self._listar()
+        atual = self.destino.ler(aba, ano) if existe else pd.DataFrame(columns=linhas.columns)
+        # Registro já copiado por uma passada interrompida ou que não saiu da aba: fica uma cópia só
+        self._gravar_particao(aba, ano, _sem_duplicados(aba, pd.concat([atual, linhas], ignore_index=True)), existe)
+
+    def _retirar(self, aba, ano, chaves):
+        # Registros que remover() deixou na aba de trabalho (alterados depois da leitura) saem da partição
+        df = self._cache[(aba, ano)]
+        if not chaves:
+            return
+        ficam = ~_identidade(aba, df).map(lambda c: c in chaves).to_numpy(dtype=bool)
+        if not ficam.all():
+            self._gravar_particao(aba, ano, df[ficam].reset_index(drop=True), True)
+
+    def _gravar_particao(self, aba, ano, df, existe):
+        self.destino.gravar(aba, ano, df, existe)
+        self._cache[(aba, ano)] = df
+        # Relê a lista para guardar a marca nova e não descartar a partição à toa
+        self._particoes = self.destino.listar()
+        self._listado_em = time.monotonic()
+        self._versoes[aba] = self._versoes.get(aba, 0) + 1
+
+    def pendentes(self, repo, hoje=None):
+        """{aba: n} registros que arquivar() moveria agora."""
+        return {aba: int(mover.sum()) for aba, _, mover in self._selecionar(repo, hoje) if mover.any()}
+
+    def _selecionar(self, repo, hoje):
+        corte = (hoje or date.today()).year - ANOS_QUENTES + 1
+        restantes = {}
+        for aba in ORDEM:
+            df = repo.ler(aba)
+            mover = ano_encerramento(aba, df) < corte
+            if aba == "Projetos" and not df.empty:
+                # Projeto com tarefa, lançamento ou recorrência que continua nas abas de trabalho não sai
+                ativos = _referenciados(restantes.get("Tarefas"), restantes.get("Financeiro"),
+                                        _regras_abertas(repo, hoje or date.today()))
+                mover &= ~df["ID_Projeto"].map(normalizar_chave).isin(ativos)
+            restantes[aba] = df[~mover]
+            yield aba, df, mover
+
+    def arquivar(self, repo, hoje=None):
+        """Move os registros encerrados antes do(s) ano(s) quente(s) para as partições.
+
+        Ano a ano, os registros são primeiro acrescentados à partição e só
+        depois saem da aba (repo.remover), conferidos linha a linha com a aba
+        relida na hora: o que outra pessoa incluiu ou alterou nesse meio tempo
+        fica na aba e sai da partição. Uma falha no meio deixa no máximo um ano
+        copiado sem ter saído; a próxima passada acrescenta de novo sem
+        duplicar. Devolve {aba: registros removidos das abas de trabalho}.
+        """
+        movidos = {}
+        with self._lock:
+            for aba, df, mover in self._selecionar(repo, hoje):
+                if not mover.any():
+                    continue
+                anos = ano_encerramento(aba, df)[mover].astype(int)
+                for ano, linhas in df[mover].groupby(anos):
+                    self._acrescentar(aba, int(ano), linhas)
+                    antes = repo.ler(aba)
+                    removidos = repo.remover(aba, linhas.to_dict("records"))
+                    if removidos < len(linhas):
+                        self._retirar(aba, int(ano), _nao_removidos(aba, linhas, antes, repo.ler(aba)))
+                    if removidos:
+                        movidos[aba] = movidos.get(aba, 0) + removidos
+        return movidos
+
+
+# --- FÁBRICA ---
+def criar_arquivo(abrir_conexao):
+    if os.environ.get("ARQUIVO", "sheets").lower() == "parquet":
+        return Arquivo(ParticoesParquet(os.environ.get("ARQUIVO_PASTA", PASTA_PARQUET)))
+    return Arquivo(ParticoesSheets(abrir_conexao()))
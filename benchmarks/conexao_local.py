@@ -0,0 +1,103 @@
+import pandas as pd
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import a1_to_rowcol
+
+
+# --- CONEXÃO LOCAL (substitui a GSheetsConnection) ---
+class ConexaoLocal:
+    """Planilha em memória com a mesma interface usada pelo app.
+
+    Atende conn.read/update/create e, via conn.client._open_spreadsheet(),
+    as chamadas de gspread que o CachePlanilhas faz (fingerprint, leitura das
+    linhas alteradas, escrita de células em lote, append e remoção de linhas).
+    Conta leituras e escritas para o relatório.
+    """
+
+    def __init__(self, abas):
+        self.abas = {aba: df.copy() for aba, df in abas.items()}
+        self.modificacao = 0
+        self.leituras = 0
+        self.escritas = 0
+
+    # conn.read / conn.update / conn.create
+    def read(self, worksheet=None, ttl=None, **kwargs):
+        self.leituras += 1
+        if worksheet not in self.abas:
+            raise WorksheetNotFound(worksheet)
+        return self.abas[worksheet].copy()
+
+    def update(self, worksheet=None, data=None, **kwargs):
+        if worksheet not in self.abas:
+            raise WorksheetNotFound(worksheet)
+        self.escritas += 1
+        self.abas[worksheet] = data.copy()
+        self.modificacao += 1
+        return data
+
+    def create(self, worksheet=None, data=None, **kwargs):
+        self.escritas += 1
+        self.abas[worksheet] = data.copy()
+        self.modificacao += 1
+        return data
+
+    # conn.client._open_spreadsheet()
+    @property
+    def client(self):
+        return self
+
+    def _open_spreadsheet(self, **kwargs):
+        return self
+
+    def get_lastUpdateTime(self):
+        return str(self.modificacao)
+
+    def values_batch_get(self, ranges, params=None):
+        faixas = []
+        for faixa in ranges:
+            aba, linhas = faixa.split("!")
+            df = self.abas[aba.strip("'")]
+            linha = int(linhas.split(":")[0])
+            valores = list(df.columns) if linha == 1 else (df.iloc[linha - 2].tolist() if linha - 2 < len(df) else [])
+            faixas.append({"range": faixa, "values": [["" if pd.isna(v) else v for v in valores]]})
+        return {"valueRanges": faixas}
+
+    def worksheet(self, titulo):
+        if titulo not in self.abas:
+            raise WorksheetNotFound(titulo)
+        return _Aba(list(self.abas).index(titulo), titulo)
+
+    def batch_update(self, body):
+        # Só deleteDimension (remoção de linhas), de baixo para cima como o CachePlanilhas envia
+        self.escritas += 1
+        nomes = list(self.abas)
+        for pedido in body["requests"]:
+            faixa = pedido["deleteDimension"]["range"]
+            aba = nomes[faixa["sheetId"]]
+            df = self.abas[aba]
+            self.abas[aba] = df.drop(df.index[faixa["startIndex"] - 1:faixa["endIndex"] - 1]).reset_index(drop=True)
+        self.modificacao += 1
+
+    def values_batch_update(self, body=None, params=None):
+        self.escritas += 1
+        for faixa in body["data"]:
+            aba, celula = faixa["range"].split("!")
+            df = self.abas[aba.strip("'")]
+            linha, coluna = a1_to_rowcol(celula)
+            col = df.columns[coluna - 1]
+            df[col] = df[col].astype(object)
+            df.loc[linha - 2, col] = faixa["values"][0][0]
+        self.modificacao += 1
+
+    def values_append(self, faixa, params=None, body=None):
+        self.escritas += 1
+        aba = faixa.split("!")[0].strip("'")
+        df = self.abas[aba]
+        novas = pd.DataFrame(body["values"], columns=df.columns[:len(body["values"][0])])
+        self.abas[aba] = pd.concat([df, novas], ignore_index=True)
+        self.modificacao += 1
+
+
+class _Aba:
+    def __init__(self, id, title):
+        self.id = id
+        self.title = title
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from esquema import (CATEGORIAS_DESPESA, EQUIPE, FASES, PRIORIDADES, STATUS_PAGAMENTO, STATUS_PROJETO,
+                     STATUS_TAREFA, TIPOS_PROJETO)
+
+# --- PROPORÇÕES ---
+# Para N linhas: N tarefas, N lançamentos, N/4 despesas e N/50 projetos
+PROJETOS_POR_LINHA = 1 / 50
+DESPESAS_POR_LINHA = 1 / 4
+ORIGENS = ["Indicação", "Instagram", "Site", "Parceiro", "Google"]
+CIDADES = ["São Paulo", "Campinas", "Santos", "Sorocaba", "Jundiaí"]
+INICIO = np.datetime64("2022-01-01")
+DIAS = 365 * 5
+
+
+def _datas(rng, n, deslocamento=0):
+    return (INICIO + rng.integers(0, DIAS, n) + deslocamento).astype("datetime64[D]")
+
+def _texto(datas):
+    return pd.Series(np.datetime_as_string(datas, unit="D"))
+
+
+def gerar(linhas, semente=42):
+    """Gera as quatro abas no formato lido da planilha (datas como texto ISO).
+
+    Tudo é vetorizado com numpy, então 1M de linhas sai em poucos segundos.
+    """
+    rng = np.random.default_rng(semente)
+    n_proj = max(1, int(linhas * PROJETOS_POR_LINHA))
+    n_desp = max(1, int(linhas * DESPESAS_POR_LINHA))
+    ids_proj = np.arange(1, n_proj + 1)
+
+    projetos = pd.DataFrame({
+        "ID_Projeto": ids_proj,
+        "Cliente": [f"Cliente {i:06d}" for i in ids_proj],
+        "Origem": rng.choice(ORIGENS, n_proj),
+        "Tipo": rng.choice(TIPOS_PROJETO, n_proj),
+        "Area_m2": rng.integers(50, 2000, n_proj).astype(float),
+        "Proposta_Aceita_R$": rng.integers(2_000, 150_000, n_proj).astype(float),
+        "Servicos": "Modelagem BIM, Pranchas",
+        "Link_Proposta": "", "Link_Pasta_Executivo": "", "Link_Pasta_Renders": "",
+        "Data_Cadastro": _texto(_datas(rng, n_proj)),
+        "Status_Geral": rng.choice(STATUS_PROJETO, n_proj, p=[0.5, 0.35, 0.1, 0.05]),
+        "Cidade": rng.choice(CIDADES, n_proj),
+        "Historico_Log": "Criado automaticamente",
+        "Versao": 1,
+    })
+
+    inicio = _datas(rng, linhas)
+    status_tarefa = rng.choice(STATUS_TAREFA, linhas, p=[0.2, 0.15, 0.05, 0.6])
+    tarefas = pd.DataFrame({
+        "ID_Projeto": rng.choice(ids_proj, linhas),
+        "Fase": rng.choice(FASES, linhas),
+        "Disciplina": "",
+        "Descricao": [f"Tarefa {i}" for i in range(linhas)],
+        "Responsavel": rng.choice(EQUIPE, linhas),
+        "Data_Inicio": _texto(inicio),
+        "Data_Deadline": _texto(inicio + rng.integers(1, 45, linhas)),
+        "Prioridade": rng.choice(PRIORIDADES, linhas),
+        "Status": status_tarefa,
+        "Historico_Log": "",
+        "Data_Conclusao": "",
+        "Horas_Gastas": rng.integers(0, 40, linhas).astype(float),
+        "Versao": 1,
+    })
+
+    def pagamentos(n, com_projeto):
+        vencimento = _datas(rng, n)
+        status = rng.choice(STATUS_PAGAMENTO, n, p=[0.3, 0.7])
+        pagamento = _texto(vencimento + rng.integers(-5, 20, n)).where(status == "Pago", "")
+        valor = rng.integers(100, 20_000, n).astype(float)
+        df = pd.DataFrame({
+            "Descricao": [f"Parcela {i}" for i in range(n)],
+            "Valor": valor,
+            "Vencimento": _texto(vencimento),
+            "Status": status,
+            "Data_Pagamento": pagamento,
+        })
+        if com_projeto:
+            df.insert(0, "ID_Projeto", rng.choice(ids_proj, n))
+            df.insert(0, "ID_Lancamento", np.arange(1, n + 1))
+            df["Valor_Imposto"] = np.where(status == "Pago", valor * 0.155, 0.0)
+        else:
+            df.insert(0, "ID_Despesa", np.arange(1, n + 1))
+            df.insert(2, "Categoria", rng.choice(CATEGORIAS_DESPESA, n))
+        df["Versao"] = 1
+        return df
+
+    return {
+        "Projetos": projetos,
+        "Tarefas": tarefas,
+        "Financeiro": pagamentos(linhas, True),
+        "Despesas": pagamentos(n_desp, False),
+    }
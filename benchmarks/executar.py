@@ -0,0 +1,299 @@
+"""Benchmark do sistema com dados sintéticos.
+
+Mede tempo de parede e pico de memória de cada etapa (leitura e tipagem,
+consolidado financeiro, cronograma, PDFs em lote, escrita em lote e cada aba do app
+renderizada sem navegador via AppTest) e compara com a linha de base
+gravada em benchmarks/baseline.json. O tempo de cada etapa é a mediana de
+várias execuções depois de uma de aquecimento.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.executar --linhas 1000 10000
+    python -m benchmarks.executar --linhas 100000 1000000 --sem-app
+    python -m benchmarks.executar --linhas 1000 10000 --salvar-baseline
+
+As abas de controle desenham um card por registro; acima de ~50k linhas
+use --sem-app ou --abas para escolher quais renderizar.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+
+import pandas as pd
+
+import cronograma
+import relatorios
+from benchmarks.conexao_local import ConexaoLocal
+from benchmarks.dados_sinteticos import gerar
+from consolidado import Consolidado
+from esquema import tipar
+from repositorio import LoteEscrita, RepositorioSheets
+
+# --- PARÂMETROS ---
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAMINHO_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+ABAS_APP = ["Dash Operacional", "Dash Financeiro", "Cadastro Projetos",
+            "Controle de Tarefas", "Controle Financeiro", "Controle Despesas"]
+# Regressão = mais lento que baseline * TOLERANCIA e por mais que PISO_SEGUNDOS (ruído)
+TOLERANCIA = 1.5
+PISO_SEGUNDOS = 0.1
+# Execuções medidas por etapa (vale a mediana), depois de uma de aquecimento
+REPETICOES = 5
+REPETICOES_APP = 3
+MAX_PDFS = 100
+ESCRITAS_LOTE = 200
+
+
+# --- MEDIÇÃO ---
+def medir(funcao, memoria=True, repeticoes=REPETICOES):
+    """Tempo (mediana de repeticoes execuções) e pico de memória de funcao().
+
+    A primeira execução fica de fora: paga imports, caches de módulo e a
+    memória que o processo ainda não tinha; a mediana não se deixa levar
+    por uma execução atrasada pelo sistema. O pico vem de mais uma execução,
+    com tracemalloc, que deixa código Python várias vezes mais lento e por
+    isso não participa da medição de tempo.
+    """
+    funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        gc.collect()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    segundos = statistics.median(tempos)
+    pico_mb = None
+    if memoria:
+        gc.collect()
+        tracemalloc.start()
+        funcao()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        pico_mb = pico / 1024 ** 2
+    return {"segundos": round(segundos, 4), "pico_mb": None if pico_mb is None else round(pico_mb, 2)}
+
+
+# --- ETAPAS SEM INTERFACE ---
+def etapas_nucleo(dados, max_pdfs):
+    """Etapas do núcleo (sem Streamlit), na ordem em que o app as executa."""
+    tipados = {}
+
+    def leitura_tipagem():
+        repo = RepositorioSheets(ConexaoLocal(dados))
+        for aba in dados:
+            tipados[aba] = tipar(aba, repo.ler(aba))
+
+    consolidado = Consolidado()
+
+    def montar_consolidado():
+        consolidado.montar(tipados["Financeiro"], tipados["Despesas"], tipados["Projetos"], versoes=None)
+
+    def consultas_consolidado():
+        # Consultas memorizadas: limpa a memória para medir o cálculo, como depois de uma montagem
+        consolidado._consultas.clear()
+        for ano in consolidado.anos():
+            consolidado.resumo(ano)
+        consolidado.ultimos_12_meses(pd.Timestamp.today())
+
+    def gantt():
+        hoje = pd.Timestamp.today().normalize()
+        pendentes = tipados["Tarefas"][tipados["Tarefas"]["Status"] != "Concluído"]
+        tarefas = cronograma.preparar_tarefas(pendentes, tipados["Projetos"])
+        inicio, fim = hoje - timedelta(days=14), hoje + timedelta(days=60)
+        cronograma.figura_gantt(cronograma.filtrar(tarefas, inicio, fim), inicio, fim)
+
+    def pdfs_lote():
+        relatorios._cache_pdfs.clear()
+        projetos = tipados["Projetos"].head(max_pdfs)
+        relatorios.compactar_zip(relatorios.gerar_pdfs_lote(projetos, tipados["Tarefas"]))
+
+    def escrita_lote():
+        conn = ConexaoLocal(dados)
+        repo = RepositorioSheets(conn)
+        n = len(repo.ler("Tarefas"))
+        lote = LoteEscrita(repo)
+        for pos in range(0, n, max(1, n // ESCRITAS_LOTE)):
+            lote.atualizar("Tarefas", pos, {"Status": "Concluído"})
+        for i in range(10):
+            lote.anexar("Despesas", {"ID_Despesa": 10 ** 9 + i, "Descricao": "Benchmark", "Valor": 1.0})
+        lote.salvar()
+
+    return [
+        ("leitura_tipagem", leitura_tipagem),
+        ("consolidado.montar", montar_consolidado),
+        ("consolidado.consultas", consultas_consolidado),
+        ("cronograma.gantt", gantt),
+        ("relatorios.pdfs_lote", pdfs_lote),
+        ("escrita_lote", escrita_lote),
+    ]
+
+
+# --- ABAS DO APP (AppTest) ---
+def medir_app(dados, abas, memoria=True, timeout=3600, repeticoes=REPETICOES_APP):
+    """Renderiza o app sem navegador contra a ConexaoLocal.
+
+    A primeira etapa é a carga inicial (caches vazios, abre no Dash
+    Operacional); as seguintes medem a troca para cada aba, como o usuário faz.
+    Cada sessão começa com os caches do Streamlit vazios, mas os módulos já
+    importados por uma sessão de aquecimento e a thread de aquecimento do app
+    concluída; vale a mediana de repeticoes.
+    """
+    import streamlit as st
+    from streamlit import logger
+    from streamlit.testing.v1 import AppTest
+
+    # Avisos de depreciação e de "bare mode" poluiriam a tabela
+    logger.set_log_level("error")
+
+    conexao_original = st.connection
+    os.environ.pop("ARMAZENAMENTO", None)
+    resultados = {}
+
+    def sessao():
+        st.cache_data.clear()
+        st.cache_resource.clear()
+        st.connection = lambda *args, **kwargs: ConexaoLocal(dados)
+        app = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=timeout)
+        return app
+
+    def esperar_aquecimento():
+        # Cada sessão limpa o cache_resource e dispara outra thread de aquecimento;
+        # em produção ela roda uma vez por processo, aqui disputaria a CPU com a medida
+        for thread in threading.enumerate():
+            if thread.name == "aquecimento":
+                thread.join()
+
+    def verificar(app, etapa):
+        if app.exception:
+            raise RuntimeError(f"{etapa}: {app.exception[0].message}")
+
+    try:
+        aquecimento = sessao()
+        aquecimento.run()
+        verificar(aquecimento, "app:aquecimento")
+        for etapa in ["app:carga_inicial"] + [f"app:{aba}" for aba in abas]:
+            medicoes = []
+            for com_memoria in [False] * repeticoes + ([True] if memoria else []):
+                app = sessao()
+                if etapa != "app:carga_inicial":
+                    app.run()
+                    verificar(app, "app:carga_inicial")
+                esperar_aquecimento()
+                gc.collect()
+                if com_memoria:
+                    tracemalloc.start()
+                inicio = time.perf_counter()
+                if etapa == "app:carga_inicial":
+                    app.run()
+                else:
+                    app.sidebar.radio[0].set_value(etapa[4:]).run()
+                segundos = time.perf_counter() - inicio
+                pico = None
+                if com_memoria:
+                    pico = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+                    tracemalloc.stop()
+                verificar(app, etapa)
+                medicoes.append((segundos, pico))
+            resultados[etapa] = {"segundos": round(statistics.median(m[0] for m in medicoes[:repeticoes]), 4),
+                                 "pico_mb": round(medicoes[-1][1], 2) if memoria else None}
+    finally:
+        st.connection = conexao_original
+    return resultados
+
+
+# --- BASELINE ---
+def ambiente(repeticoes=REPETICOES, repeticoes_app=REPETICOES_APP):
+    return {"python": platform.python_version(), "pandas": pd.__version__,
+            "cpus": os.cpu_count(), "plataforma": platform.platform(),
+            "medida": f"mediana de {repeticoes} (núcleo) / {repeticoes_app} (app) execuções após aquecimento"}
+
+def carregar_baseline(caminho):
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho) as f:
+        return json.load(f)
+
+def comparar(resultados, baseline, tolerancia):
+    """Imprime a tabela de resultados e devolve a lista de regressões."""
+    regressoes = []
+    print(f"\n{'linhas':>9}  {'etapa':<28} {'tempo (s)':>10} {'base (s)':>10} {'razão':>7} {'pico (MB)':>10} {'base (MB)':>10}")
+    for linhas, etapas in resultados.items():
+        base_linhas = baseline.get("resultados", {}).get(linhas, {})
+        for etapa, medida in etapas.items():
+            base = base_linhas.get(etapa)
+            razao = medida["segundos"] / base["segundos"] if base and base["segundos"] else None
+            marca = ""
+            if razao is not None and razao > tolerancia and medida["segundos"] - base["segundos"] > PISO_SEGUNDOS:
+                regressoes.append((linhas, etapa, razao))
+                marca = "  << regressão"
+            print(f"{linhas:>9}  {etapa:<28} {medida['segundos']:>10.3f} "
+                  f"{base['segundos'] if base else float('nan'):>10.3f} "
+                  f"{razao if razao is not None else float('nan'):>7.2f} "
+                  f"{medida['pico_mb'] if medida['pico_mb'] is not None else float('nan'):>10.1f} "
+                  f"{base['pico_mb'] if base and base['pico_mb'] is not None else float('nan'):>10.1f}{marca}")
+    return regressoes
+
+
+# --- EXECUÇÃO ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark com dados sintéticos")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1000, 10000],
+                        help="tamanhos a medir (tarefas e lançamentos por cenário)")
+    parser.add_argument("--abas", nargs="*", default=ABAS_APP, help="abas do app a renderizar")
+    parser.add_argument("--sem-app", action="store_true", help="não renderiza o app (só o núcleo)")
+    parser.add_argument("--sem-memoria", action="store_true", help="não mede o pico de memória")
+    parser.add_argument("--max-pdfs", type=int, default=MAX_PDFS, help="projetos no lote de PDFs")
+    parser.add_argument("--repeticoes", type=int, help="execuções medidas por etapa "
+                        f"(padrão: {REPETICOES} no núcleo, {REPETICOES_APP} no app)")
+    parser.add_argument("--baseline", default=CAMINHO_BASELINE)
+    parser.add_argument("--salvar-baseline", action="store_true", help="grava os resultados como nova linha de base")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    parser.add_argument("--saida", help="grava os resultados desta execução em JSON")
+    args = parser.parse_args(argv)
+
+    repeticoes = args.repeticoes or REPETICOES
+    repeticoes_app = args.repeticoes or REPETICOES_APP
+    resultados = {}
+    for linhas in args.linhas:
+        print(f"Gerando {linhas} linhas...", flush=True)
+        dados = gerar(linhas)
+        etapas = {}
+        for nome, funcao in etapas_nucleo(dados, args.max_pdfs):
+            etapas[nome] = medir(funcao, memoria=not args.sem_memoria, repeticoes=repeticoes)
+            print(f"  {nome}: {etapas[nome]['segundos']:.3f}s", flush=True)
+        if not args.sem_app:
+            etapas.update(medir_app(dados, args.abas, memoria=not args.sem_memoria, repeticoes=repeticoes_app))
+        resultados[str(linhas)] = etapas
+
+    baseline = carregar_baseline(args.baseline)
+    regressoes = comparar(resultados, baseline, args.tolerancia)
+    execucao = {"ambiente": ambiente(repeticoes, repeticoes_app), "resultados": resultados}
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(execucao, f, indent=2, ensure_ascii=False)
+    if args.salvar_baseline:
+        # Mantém os tamanhos e as etapas que não foram medidos desta vez
+        for linhas, etapas in resultados.items():
+            baseline.setdefault("resultados", {}).setdefault(linhas, {}).update(etapas)
+        baseline["ambiente"] = execucao["ambiente"]
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+        print(f"\nLinha de base gravada em {args.baseline}")
+        return 0
+
+    if regressoes:
+        print(f"\n{len(regressoes)} regressão(ões) acima de {args.tolerancia:.2f}x da linha de base")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import bisect
+import re
+import unicodedata
+
+import pandas as pd
+
+from planilhas import CHAVES, normalizar_chave
+
+# --- NORMALIZAÇÃO ---
+# Palavras que não ajudam a achar nada
+VAZIAS = {"a", "o", "as", "os", "e", "de", "da", "do", "das", "dos", "em", "na", "no", "nas", "nos", "um", "uma",
+          "para", "por", "com", "sem", "que", "ao", "aos", "se"}
+# Plurais mais comuns: "instalações" e "instalação" viram a mesma palavra
+PLURAIS = [("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"), ("ns", "m")]
+
+
+def sem_acento(texto):
+    texto = str(texto)
+    if texto.isascii():
+        return texto.lower()
+    return unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode().lower()
+
+def _singular(palavra):
+    if len(palavra) <= 3:
+        return palavra
+    for fim, troca in PLURAIS:
+        if palavra.endswith(fim):
+            return palavra[:-len(fim)] + troca
+    return palavra[:-1] if palavra.endswith("s") else palavra
+
+def palavras(texto):
+    """Palavras normalizadas (sem acento, minúsculas, no singular) de um texto."""
+    if texto is None or (not isinstance(texto, str) and pd.isna(texto)):
+        return []
+    return [_singular(p) for p in re.findall(r"[a-z0-9]+", sem_acento(texto)) if p not in VAZIAS]
+
+# --- ÍNDICE INVERTIDO ---
+class IndiceTexto:
+    """Palavra -> posições das linhas (df.loc[pos]) que a têm em alguma das colunas.
+
+    Segue as regras de _IndiceAba (entidades.py): montado uma vez por versão e
+    atualizado no lugar pelas escritas feitas pelo repositório.
+    """
+
+    def __init__(self, aba, colunas, df, versao):
+        self.aba = aba
+        self.colunas = [c for c in colunas if c in df.columns] if not df.empty else list(colunas)
+        self.versao = versao
+        self.n = 0
+        self.chave = {}
+        self.posicoes = {}
+        # Texto de cada coluna por linha: numa alteração, as palavras antigas saem do índice
+        self._textos = {col: [] for col in self.colunas}
+        self._vocabulario = None
+        self._montar(df)
+
+    def _montar(self, df):
+        coluna_chave = CHAVES.get(self.aba)
+        if coluna_chave is not None and coluna_chave in df.columns:
+            self.chave = {normalizar_chave(v): pos for pos, v in enumerate(df[coluna_chave])}
+        presentes = [col for col in self.colunas if col in df.columns]
+        for col in self.colunas:
+            self._textos[col] = df[col].tolist() if col in presentes else [None] * len(df)
+        # Laço direto (sem palavras() por célula): cada forma é normalizada uma vez só
+        formas = {}
+        for col in presentes:
+            for pos, texto in enumerate(self._textos[col]):
+                if not isinstance(texto, str):
+                    continue
+                for bruta in re.findall(r"[a-z0-9]+", sem_acento(texto)):
+                    if bruta not in formas:
+                        formas[bruta] = None if bruta in VAZIAS else _singular(bruta)
+                    palavra = formas[bruta]
+                    if palavra is not None:
+                        self.posicoes.setdefault(palavra, set()).add(pos)
+        self.n = len(df)
+
+    def _palavras_linha(self, pos):
+        return set().union(*(palavras(textos[pos]) for textos in self._textos.values()))
+
+    def _indexar(self, pos, campos):
+        antes = self._palavras_linha(pos) if pos < self.n else set()
+        for col in self.colunas:
+            if col in campos:
+                self._textos[col][pos] = campos[col]
+        depois = self._palavras_linha(pos)
+        for palavra in antes - depois:
+            self.posicoes[palavra].discard(pos)
+        for palavra in depois - antes:
+            if palavra not in self.posicoes:
+                self.posicoes[palavra] = set()
+                self._vocabulario = None
+            self.posicoes[palavra].add(pos)
+
+    def incluir(self, registros):
+        coluna_chave = CHAVES.get(self.aba)
+        for registro in registros:
+            if coluna_chave is not None and coluna_chave in registro:
+                self.chave[normalizar_chave(registro[coluna_chave])] = self.n
+            for textos in self._textos.values():
+                textos.append(None)
+            self._indexar(self.n, registro)
+            self.n += 1
+
+    def alterar(self, chave, campos):
+        pos = int(chave) if CHAVES.get(self.aba) is None else self.chave.get(normalizar_chave(chave))
+        if pos is not None and any(col in campos for col in self.colunas):
+            self._indexar(pos, campos)
+
+    def _prefixadas(self, prefixo):
+        if self._vocabulario is None:
+            self._vocabulario = sorted(self.posicoes)
+        i = bisect.bisect_left(self._vocabulario, prefixo)
+        encontradas = set()
+        while i < len(self._vocabulario) and self._vocabulario[i].startswith(prefixo):
+            encontradas |= self.posicoes[self._vocabulario[i]]
+            i += 1
+        return encontradas
+
+    def termos(self, consulta):
+        """Posições de cada palavra da consulta, na ordem da consulta.
+
+        A última palavra vale também como prefixo enquanto está sendo digitada
+        ("joa" acha "João"); consulta sem palavras úteis não tem termos.
+        """
+        termos = palavras(consulta)
+        if not termos:
+            return []
+        bruto = re.findall(r"[a-z0-9]+", sem_acento(consulta))[-1]
+        digitando = consulta == consulta.rstrip() and bruto not in VAZIAS and len(bruto) >= 2
+        conjuntos = [set(self.posicoes.get(termo, ())) for termo in termos]
+        if digitando:
+            # Prefixo também sem o singular: "pais" (de "paisagismo") não pode virar só "pal"
+            conjuntos[-1] |= self._prefixadas(termos[-1]) | self._prefixadas(bruto)
+        return conjuntos
+
+    def buscar(self, consulta):
+        return cruzar(self.termos(consulta))
+
+
+def cruzar(conjuntos):
+    """Posições presentes em todos os conjuntos, das mais novas para as mais antigas."""
+    if not conjuntos:
+        return []
+    return sorted(set.intersection(*conjuntos), reverse=True)
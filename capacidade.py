@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+from cronograma import DURACAO_PADRAO
+from graficos import plotly
+
+# --- PARÂMETROS ---
+# Horas disponíveis por pessoa num dia útil
+HORAS_DIA = 8.0
+# Esforço de uma tarefa quando não há concluídas com horas lançadas para comparar
+ESFORCO_PADRAO = 8.0
+# O que resta de uma tarefa aberta, mesmo que as horas lançadas já passem da estimativa
+ESFORCO_MINIMO = 1.0
+# Dias sem expediente além dos fins de semana (datas ISO, ex.: "2026-12-25")
+FERIADOS = []
+SEM_RESPONSAVEL = "(sem responsável)"
+# Ocupação (% da capacidade) no topo da escala de cores do mapa
+OCUPACAO_MAXIMA = 150
+
+
+# --- ESFORÇO ---
+def estimar_esforco(tarefas):
+    """Horas esperadas de cada tarefa: mediana das concluídas da mesma Fase,
+    senão a mediana de todas as concluídas, senão ESFORCO_PADRAO."""
+    concluidas = tarefas[(tarefas["Status"] == "Concluído") & (tarefas["Horas_Gastas"] > 0)]
+    geral = float(concluidas["Horas_Gastas"].median()) if not concluidas.empty else ESFORCO_PADRAO
+    por_fase = concluidas.groupby("Fase", observed=True)["Horas_Gastas"].median()
+    return tarefas["Fase"].astype(object).map(por_fase).astype("float64").fillna(geral)
+
+def esforco_restante(tarefas):
+    lancadas = pd.to_numeric(tarefas["Horas_Gastas"], errors="coerce").fillna(0.0)
+    return (estimar_esforco(tarefas) - lancadas).clip(lower=ESFORCO_MINIMO)
+
+
+# --- CARGA (VARREDURA DOS INTERVALOS) ---
+def carga_diaria(tarefas, hoje):
+    """Horas por dia útil (linhas) e responsável (colunas), de hoje ao último prazo.
+
+    O restante de cada tarefa pendente é dividido por igual entre os dias úteis
+    de Data_Inicio (ou hoje, se já começou) a Data_Deadline; as atrasadas caem
+    inteiras no primeiro dia útil. Cada tarefa soma +taxa no primeiro dia e
+    -taxa depois do último; a soma acumulada ao longo dos dias dá a carga, sem
+    laço por dia.
+    """
+    pendentes = tarefas[(tarefas["Status"] != "Concluído") & tarefas["Data_Deadline"].notna()]
+    if pendentes.empty:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name="Dia"))
+    restante = esforco_restante(tarefas).loc[pendentes.index].to_numpy()
+    # Posições em dias úteis a partir do primeiro dia útil >= hoje; intervalo que só
+    # tem fim de semana/feriado vai para o dia útil seguinte
+    origem = np.busday_offset(np.datetime64(pd.Timestamp(hoje).date(), "D"), 0, roll="forward", holidays=FERIADOS)
+    fim = pendentes["Data_Deadline"].to_numpy().astype("datetime64[D]")
+    inicio = pendentes["Data_Inicio"].fillna(pendentes["Data_Deadline"] - DURACAO_PADRAO).to_numpy().astype("datetime64[D]")
+    fim = np.maximum(fim, origem)
+    inicio = np.minimum(np.maximum(inicio, origem), fim)
+    p_inicio = np.busday_count(origem, inicio, holidays=FERIADOS)
+    p_fim = np.maximum(np.busday_count(origem, fim + 1, holidays=FERIADOS) - 1, p_inicio)
+    taxa = restante / (p_fim - p_inicio + 1)
+
+    pessoas, nomes = pd.factorize(pendentes["Responsavel"].astype(object).fillna(SEM_RESPONSAVEL), sort=True)
+    dias = int(p_fim.max()) + 1
+    variacao = np.zeros((len(nomes), dias + 1))
+    np.add.at(variacao, (pessoas, p_inicio), taxa)
+    np.add.at(variacao, (pessoas, p_fim + 1), -taxa)
+    carga = variacao.cumsum(axis=1)[:, :dias].round(6).clip(min=0.0)
+    indice = pd.DatetimeIndex(np.busday_offset(origem, np.arange(dias), holidays=FERIADOS), name="Dia")
+    return pd.DataFrame(carga.T, index=indice, columns=pd.Index(nomes, name="Responsavel"))
+
+def carga_semanal(diaria):
+    """Horas por semana (segunda a domingo) e a capacidade de cada semana no período."""
+    semanal = diaria.resample("W-MON", label="left", closed="left").sum()
+    dias_uteis = diaria.index.to_series().resample("W-MON", label="left", closed="left").count()
+    return semanal, dias_uteis * HORAS_DIA
+
+def sobrecargas(diaria, capacidade=HORAS_DIA):
+    """Dias em que alguém passa da capacidade: Responsavel, Dia, Horas e Excesso."""
+    longo = diaria.stack().rename("Horas").reset_index()
+    longo = longo[longo["Horas"] > capacidade + 1e-6]
+    longo["Excesso"] = longo["Horas"] - capacidade
+    return longo[["Responsavel", "Dia", "Horas", "Excesso"]].sort_values(["Dia", "Responsavel"], ignore_index=True)
+
+def carga(tarefas, hoje):
+    """O que o bloco de carga mostra: (diária, (semanal, capacidade da semana), sobrecargas)."""
+    diaria = carga_diaria(tarefas, hoje)
+    return diaria, carga_semanal(diaria), sobrecargas(diaria)
+
+
+# --- FIGURA ---
+def figura_carga(carga, capacidade, formato="%d/%m"):
+    """Mapa de calor responsável x período pela ocupação (% da capacidade).
+
+    capacidade é um número (por dia) ou uma Series com a capacidade de cada período.
+    """
+    _, go = plotly()
+    ocupacao = carga.div(capacidade, axis=0) * 100
+    # Até 100% vai de claro a verde, daí amarelo e vermelho
+    limite = 100 / OCUPACAO_MAXIMA
+    escala = [[0, "#F4F6F7"], [limite * 0.9, "#27AE60"], [limite, "#F4D03F"],
+              [limite + 0.001, "#E74C3C"], [1, "#922B21"]]
+    fig = go.Figure(go.Heatmap(
+        z=ocupacao.T.to_numpy(), x=carga.index.strftime(formato), y=list(carga.columns),
+        customdata=carga.T.to_numpy(), zmin=0, zmax=OCUPACAO_MAXIMA, colorscale=escala,
+        colorbar=dict(title="%", ticksuffix="%"),
+        hovertemplate="%{y} · %{x}<br>%{customdata:.1f} h (%{z:.0f}%)<extra></extra>",
+    ))
+    fig.update_layout(margin=dict(l=0, r=0, t=10, b=0), height=120 + 40 * len(carga.columns))
+    fig.update_xaxes(type="category")
+    return fig
@@ -0,0 +1,268 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# --- CONFIGURAÇÃO ---
+# Num só processo, as sessões já dividem o mesmo CachePlanilhas (st.cache_resource).
+# CACHE_COMPARTILHADO=<arquivo> estende isso a vários processos do servidor:
+# os snapshots das abas ficam num SQLite que todos leem.
+CAMINHO_COMPARTILHADO = os.environ.get("CACHE_COMPARTILHADO", "")
+# Intervalo mínimo (segundos) entre consultas da versão de uma aba no arquivo
+INTERVALO_CONSULTA = 1.0
+# Trava de download abandonada (processo que morreu) expira depois disso
+PRAZO_TRAVA = 30.0
+ESPERA_TRAVA = 0.05
+# Escritas mais antigas que isso saem do registro de avisos
+RETENCAO_ESCRITAS = 24 * 3600
+# Contadores de ID sem CACHE_COMPARTILHADO: SQLite no diretório do servidor
+CAMINHO_SEQUENCIAS = os.environ.get("SEQUENCIAS", "sequencias.db")
+
+
+# --- SNAPSHOTS ENTRE PROCESSOS ---
+class SnapshotsCompartilhados:
+    """Snapshots das abas num SQLite acessível a todos os processos do servidor.
+
+    Cada aba tem uma versão que sobe a cada publicação; quem tem um snapshot
+    de versão diferente descarta o seu. O download de uma aba passa por uma
+    trava no próprio arquivo, então vários processos pedindo a mesma aba
+    geram uma só leitura na planilha.
+    """
+
+    def __init__(self, caminho=CAMINHO_COMPARTILHADO):
+        self.dono = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._db = sqlite3.connect(caminho, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS snapshots (aba TEXT PRIMARY KEY, versao INTEGER, "
+                         "lido_em REAL, dados BLOB)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS travas (nome TEXT PRIMARY KEY, dono TEXT, expira REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS escritas (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                         "aba TEXT, sessao TEXT, em REAL)")
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _transacao(self):
+        # BEGIN IMMEDIATE: leitura e escrita da transação ficam atômicas entre processos
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    # Snapshots
+    def versao(self, aba):
+        with self._lock:
+            linha = self._db.execute("SELECT versao FROM snapshots WHERE aba = ?", (aba,)).fetchone()
+        return linha[0] if linha else 0
+
+    def obter(self, aba):
+        """(versao, df, idade em segundos); df é None se a aba foi descartada."""
+        with self._lock:
+            linha = self._db.execute("SELECT versao, lido_em, dados FROM snapshots WHERE aba = ?",
+                                     (aba,)).fetchone()
+        if linha is None:
+            return 0, None, None
+        versao, lido_em, dados = linha
+        if dados is None:
+            return versao, None, None
+        return versao, pickle.loads(dados), max(0.0, time.time() - lido_em)
+
+    def publicar(self, aba, df, base, idade=0.0):
+        """Grava o snapshot se a versão ainda for base; devolve a nova versão ou None.
+
+        A comparação evita que um download lento sobrescreva uma escrita
+        publicada por outro processo enquanto ele acontecia.
+        """
+        dados = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._transacao() as db:
+            if self._versao_em(db, aba) != base:
+                return None
+            db.execute("INSERT INTO snapshots VALUES (?, ?, ?, ?) ON CONFLICT(aba) DO UPDATE SET "
+                       "versao = excluded.versao, lido_em = excluded.lido_em, dados = excluded.dados",
+                       (aba, base + 1, time.time() - idade, dados))
+        return base + 1
+
+    def descartar(self, abas=None):
+        """Marca as abas (ou todas) para serem baixadas de novo por quem precisar."""
+        with self._transacao() as db:
+            if abas is None:
+                db.execute("UPDATE snapshots SET versao = versao + 1, dados = NULL")
+                return
+            for aba in abas:
+                db.execute("INSERT INTO snapshots VALUES (?, 1, NULL, NULL) ON CONFLICT(aba) DO UPDATE "
+                           "SET versao = versao + 1, dados = NULL", (aba,))
+
+    @staticmethod
+    def _versao_em(db, aba):
+        linha = db.execute("SELECT versao FROM snapshots WHERE aba = ?", (aba,)).fetchone()
+        return linha[0] if linha else 0
+
+    # Coordenação
+    @contextmanager
+    def travar(self, nome, prazo=PRAZO_TRAVA):
+        """Trava entre processos (single-flight do download de uma aba)."""
+        while True:
+            agora = time.time()
+            with self._lock:
+                cur = self._db.execute(
+                    "INSERT INTO travas VALUES (?, ?, ?) ON CONFLICT(nome) DO UPDATE SET "
+                    "dono = excluded.dono, expira = excluded.expira WHERE travas.expira < ?",
+                    (nome, self.dono, agora + prazo, agora))
+            if cur.rowcount:
+                break
+            time.sleep(ESPERA_TRAVA)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._db.execute("DELETE FROM travas WHERE nome = ? AND dono = ?", (nome, self.dono))
+
+    def reservar(self, nome, intervalo):
+        """True para um único processo a cada intervalo (ex.: checar o fingerprint remoto)."""
+        agora = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO meta VALUES (?, ?) ON CONFLICT(chave) DO UPDATE SET valor = excluded.valor "
+                "WHERE meta.valor <= ?", (f"reserva:{nome}", agora, agora - intervalo))
+        return cur.rowcount > 0
+
+    def meta(self, chave):
+        with self._lock:
+            linha = self._db.execute("SELECT valor FROM meta WHERE chave = ?", (chave,)).fetchone()
+        return linha[0] if linha else None
+
+    def trocar(self, chave, valor):
+        """Grava valor em meta e devolve o anterior."""
+        with self._transacao() as db:
+            linha = db.execute("SELECT valor FROM meta WHERE chave = ?", (chave,)).fetchone()
+            db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (chave, valor))
+        return linha[0] if linha else None
+
+    def incrementar(self, chave, piso=0):
+        return _incrementar(self._transacao, chave, piso)
+
+    # Avisos de escrita entre sessões
+    def registrar_escrita(self, aba, sessao):
+        agora = time.time()
+        with self._transacao() as db:
+            db.execute("INSERT INTO escritas (aba, sessao, em) VALUES (?, ?, ?)", (aba, sessao, agora))
+            db.execute("DELETE FROM escritas WHERE em < ?", (agora - RETENCAO_ESCRITAS,))
+
+    def ultima_escrita(self):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(MAX(id), 0) FROM escritas").fetchone()[0]
+
+    def escritas_desde(self, marca):
+        """[(id, aba, sessao)] registradas depois da marca."""
+        with self._lock:
+            return self._db.execute("SELECT id, aba, sessao FROM escritas WHERE id > ? ORDER BY id",
+                                    (marca,)).fetchall()
+
+
+# --- AVISOS DE ESCRITA NUM SÓ PROCESSO ---
+class EscritasLocais:
+    """Mesmo registro de escritas de SnapshotsCompartilhados, em memória."""
+
+    def __init__(self, limite=1000):
+        self.limite = limite
+        self._itens = []
+        self._proximo = 1
+        self._lock = threading.Lock()
+
+    def registrar_escrita(self, aba, sessao):
+        with self._lock:
+            self._itens.append((self._proximo, aba, sessao))
+            self._proximo += 1
+            del self._itens[:-self.limite]
+
+    def ultima_escrita(self):
+        with self._lock:
+            return self._proximo - 1
+
+    def escritas_desde(self, marca):
+        with self._lock:
+            return [item for item in self._itens if item[0] > marca]
+
+
+# --- CONTADORES DE ID ---
+def _incrementar(transacao, chave, piso):
+    # Leitura e gravação na mesma transação: dois processos nunca recebem o mesmo valor
+    with transacao() as db:
+        linha = db.execute("SELECT valor FROM meta WHERE chave = ?", (chave,)).fetchone()
+        valor = max(int(linha[0]) if linha else 0, int(piso)) + 1
+        db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (chave, valor))
+    return valor
+
+
+class SequenciasLocais:
+    """Contadores de ID num SQLite próprio, para quando não há CACHE_COMPARTILHADO.
+
+    Vale para todos os processos que rodam no mesmo diretório; servidores em
+    máquinas diferentes precisam do arquivo compartilhado.
+    """
+
+    def __init__(self, caminho=CAMINHO_SEQUENCIAS):
+        self._db = sqlite3.connect(caminho, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor)")
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _transacao(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def incrementar(self, chave, piso=0):
+        """Soma 1 ao contador (começando acima de piso) e devolve o valor novo."""
+        return _incrementar(self._transacao, chave, piso)
+
+
+# --- INSTÂNCIAS DO PROCESSO ---
+_armazem = None
+_escritas = None
+_sequencias = None
+_lock = threading.Lock()
+
+def armazem():
+    """SnapshotsCompartilhados do processo, ou None sem CACHE_COMPARTILHADO."""
+    global _armazem
+    if not CAMINHO_COMPARTILHADO:
+        return None
+    with _lock:
+        if _armazem is None:
+            _armazem = SnapshotsCompartilhados(CAMINHO_COMPARTILHADO)
+        return _armazem
+
+def escritas():
+    """Registro de escritas: no arquivo compartilhado, se houver, senão em memória."""
+    global _escritas
+    compartilhado = armazem()
+    if compartilhado is not None:
+        return compartilhado
+    with _lock:
+        if _escritas is None:
+            _escritas = EscritasLocais()
+        return _escritas
+
+def sequencias():
+    """Contadores de ID: no arquivo compartilhado, se houver, senão em CAMINHO_SEQUENCIAS."""
+    global _sequencias
+    compartilhado = armazem()
+    if compartilhado is not None:
+        return compartilhado
+    with _lock:
+        if _sequencias is None:
+            _sequencias = SequenciasLocais(CAMINHO_SEQUENCIAS)
+        return _sequencias
@@ -0,0 +1,283 @@
+import io
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from financas import ALIQUOTA_IMPOSTO
+
+# --- PARÂMETROS ---
+# Transações lidas do extrato por vez: arquivos grandes nunca ficam inteiros em memória como DataFrame
+TAMANHO_BLOCO = 5000
+# Distância máxima (em dias) entre a data no banco e o vencimento do pendente
+JANELA_DIAS = 10
+# Peso da descrição na pontuação; o restante vem da proximidade das datas
+PESO_DESCRICAO = 0.6
+# Propostas a partir desta pontuação já vêm marcadas para baixa
+PONTUACAO_SUGERIDA = 0.5
+COLUNAS = ["Transacao", "Data", "Descricao", "Valor", "Documento"]
+# Versão e campos que a baixa grava, como lidos do pendente: conferidos na gravação (ver linhas_lidas())
+COLUNAS_LIDAS = ["Versao", "Status", "Data_Pagamento", "Valor_Imposto"]
+COLUNAS_PROPOSTA = ["Transacao", "Data", "Descricao_Banco", "Valor_Banco", "Aba", "Chave", "Nome", "Descricao",
+                    "Valor", "Vencimento", "Dias", "Semelhanca", "Pontuacao"] + COLUNAS_LIDAS
+# Palavras de extrato que não dizem quem pagou ou recebeu
+IGNORADAS = {"pix", "ted", "doc", "transf", "transferencia", "pagamento", "pgto", "pag", "recebido", "recebida",
+             "enviado", "enviada", "credito", "debito", "boleto", "tarifa", "compra", "cartao", "deb", "cred",
+             "ltda", "eireli", "me", "sa", "de", "da", "do", "das", "dos", "para"}
+
+
+# --- LEITURA DO EXTRATO (EM BLOCOS) ---
+def _sem_acento(texto):
+    return unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode().lower()
+
+def _codificacao(amostra):
+    try:
+        amostra.decode("utf-8-sig")
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        # Corte no meio de um caractere no fim da amostra não é motivo para trocar
+        try:
+            amostra[:-3].decode("utf-8-sig")
+            return "utf-8-sig"
+        except UnicodeDecodeError:
+            return "latin-1"
+
+def _numero(serie, decimal):
+    texto = serie.fillna("").astype(str).str.replace(r"[R$\s]", "", regex=True)
+    # "150,00 D" / "150,00-": débito marcado por letra ou sinal no fim
+    debito = texto.str.upper().str.endswith(("D", "-"))
+    texto = texto.str.rstrip("CDcd-+")
+    if decimal == ",":
+        texto = texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    else:
+        texto = texto.str.replace(",", "", regex=False)
+    valor = pd.to_numeric(texto, errors="coerce")
+    return valor.where(~debito, -valor.abs())
+
+def _datas(serie):
+    texto = serie.fillna("").astype(str).str.strip().str[:10]
+    datas = pd.to_datetime(texto, format="%d/%m/%Y", errors="coerce")
+    return datas.fillna(pd.to_datetime(texto.where(datas.isna()), format="ISO8601", errors="coerce"))
+
+def _coluna(colunas, *raizes):
+    for raiz in raizes:
+        for original, nome in colunas.items():
+            if nome.startswith(raiz) or f" {raiz}" in nome:
+                return original
+    return None
+
+def _cabecalho(linhas):
+    # Extratos de banco costumam ter agência/conta/período antes do cabeçalho
+    for i, linha in enumerate(linhas):
+        if re.match(r"^\W*data\b", _sem_acento(linha)):
+            return i
+    return 0
+
+def _ler_csv(arquivo, tamanho):
+    amostra = arquivo.read(64 * 1024)
+    arquivo.seek(0)
+    codificacao = _codificacao(amostra)
+    linhas = amostra.decode(codificacao, errors="replace").splitlines()[:30]
+    pular = _cabecalho(linhas)
+    cabecalho = linhas[pular] if linhas else ""
+    separador = ";" if cabecalho.count(";") >= cabecalho.count(",") and ";" in cabecalho else ","
+    # Separador ";" é o padrão brasileiro, com vírgula decimal
+    decimal = "," if separador == ";" else "."
+    texto = io.TextIOWrapper(arquivo, encoding=codificacao, errors="replace", newline="")
+    blocos = pd.read_csv(texto, sep=separador, skiprows=pular, dtype=str, chunksize=tamanho,
+                         skip_blank_lines=True, on_bad_lines="skip")
+    try:
+        for bloco in blocos:
+            colunas = {c: _sem_acento(c).strip() for c in bloco.columns}
+            data = _coluna(colunas, "data")
+            descricao = _coluna(colunas, "descricao", "historico", "lancamento", "memo", "detalhe")
+            valor = _coluna(colunas, "valor", "quantia", "montante")
+            credito, debito = _coluna(colunas, "credito", "entrada"), _coluna(colunas, "debito", "saida")
+            documento = _coluna(colunas, "documento", "doc", "identificador", "id")
+            if data is None or (valor is None and credito is None and debito is None):
+                raise ValueError("Extrato sem colunas de data e valor reconhecíveis.")
+            if valor is not None:
+                quantia = _numero(bloco[valor], decimal)
+            else:
+                # Crédito e débito em colunas separadas (débito às vezes já vem negativo)
+                entra = _numero(bloco[credito], decimal).abs().fillna(0.0) if credito else 0.0
+                sai = _numero(bloco[debito], decimal).abs().fillna(0.0) if debito else 0.0
+                quantia = (entra - sai).where(lambda v: v != 0)
+            yield pd.DataFrame({
+                "Data": _datas(bloco[data]),
+                "Descricao": bloco[descricao].fillna("").astype(str).str.strip() if descricao else "",
+                "Valor": quantia,
+                "Documento": bloco[documento].fillna("").astype(str) if documento else "",
+            })
+    finally:
+        texto.detach()
+
+def _ler_ofx(arquivo, tamanho):
+    amostra = arquivo.read(4096)
+    arquivo.seek(0)
+    # Cabeçalho SGML (OFX 1.x) declara CHARSET:1252 quando não é UTF-8
+    codificacao = "cp1252" if re.search(rb"CHARSET:\s*1252|ENCODING:\s*USASCII", amostra) else _codificacao(amostra)
+    texto = io.TextIOWrapper(arquivo, encoding=codificacao, errors="replace")
+    etiqueta = re.compile(r"<(/?)(\w+)>([^<\r\n]*)")
+    linhas, atual = [], None
+    try:
+        # Linha a linha: o SGML do OFX 1.x nem sempre fecha as etiquetas de valor
+        for linha in texto:
+            for fecha, nome, valor in etiqueta.findall(linha):
+                nome = nome.upper()
+                if nome == "STMTTRN":
+                    if fecha and atual is not None:
+                        linhas.append(atual)
+                        atual = None
+                    elif not fecha:
+                        atual = {}
+                elif atual is not None and not fecha:
+                    atual[nome] = valor.strip()
+            if len(linhas) >= tamanho:
+                yield _normalizar_ofx(linhas)
+                linhas = []
+        if linhas:
+            yield _normalizar_ofx(linhas)
+    finally:
+        texto.detach()
+
+def _normalizar_ofx(linhas):
+    df = pd.DataFrame(linhas).reindex(columns=["DTPOSTED", "TRNAMT", "MEMO", "NAME", "FITID"])
+    memo, nome = df["MEMO"].fillna(""), df["NAME"].fillna("")
+    return pd.DataFrame({
+        "Data": pd.to_datetime(df["DTPOSTED"].fillna("").str[:8], format="%Y%m%d", errors="coerce"),
+        "Descricao": (nome + " " + memo.where(memo != nome, "")).str.strip(),
+        "Valor": pd.to_numeric(df["TRNAMT"].fillna("").str.replace(",", ".", regex=False), errors="coerce"),
+        "Documento": df["FITID"].fillna(""),
+    })
+
+def ler_extrato(arquivo, nome, tamanho=TAMANHO_BLOCO):
+    """Transações do extrato (CSV ou OFX) em blocos de até `tamanho` linhas.
+
+    Cada bloco tem as COLUNAS, com Valor positivo para créditos e negativo para
+    débitos; Transacao numera as transações do arquivo inteiro. Linhas sem data
+    ou valor são descartadas.
+    """
+    leitor = _ler_ofx if nome.lower().endswith((".ofx", ".qfx")) else _ler_csv
+    inicio = 0
+    for bloco in leitor(arquivo, tamanho):
+        bloco = bloco[bloco["Data"].notna() & bloco["Valor"].notna() & (bloco["Valor"] != 0)].reset_index(drop=True)
+        bloco.insert(0, "Transacao", np.arange(inicio, inicio + len(bloco)))
+        inicio += len(bloco)
+        yield bloco
+
+
+# --- PENDENTES ---
+def pendentes(df_fin, df_desp, df_projetos):
+    """Lançamentos (Entrada) e despesas (Saída) em aberto, no formato da conciliação."""
+    partes = []
+    if df_fin is not None and not df_fin.empty:
+        fin = df_fin[df_fin["Status"] == "Pendente"]
+        clientes = df_projetos.drop_duplicates("ID_Projeto").set_index("ID_Projeto")["Cliente"]
+        partes.append(pd.DataFrame({
+            "Aba": "Financeiro", "Chave": fin["ID_Lancamento"], "Fluxo": "Entrada",
+            "Nome": fin["ID_Projeto"].map(clientes).fillna("").astype(str), "Descricao": fin["Descricao"].astype(str),
+            "Valor": fin["Valor"], "Vencimento": fin["Vencimento"],
+            **{c: fin[c] for c in COLUNAS_LIDAS},
+        }))
+    if df_desp is not None and not df_desp.empty:
+        desp = df_desp[df_desp["Status"] == "Pendente"]
+        partes.append(pd.DataFrame({
+            "Aba": "Despesas", "Chave": desp["ID_Despesa"], "Fluxo": "Saída",
+            "Nome": desp["Categoria"].astype(object).fillna("").astype(str), "Descricao": desp["Descricao"].astype(str),
+            "Valor": desp["Valor"], "Vencimento": desp["Vencimento"],
+            **{c: desp[c] for c in COLUNAS_LIDAS if c in desp},
+        }))
+    if not partes:
+        return pd.DataFrame(columns=["Aba", "Chave", "Fluxo", "Nome", "Descricao", "Valor", "Vencimento"]
+                            + COLUNAS_LIDAS + ["Centavos"])
+    df = pd.concat(partes, ignore_index=True)
+    df = df[df["Valor"].notna() & (df["Valor"] > 0) & df["Vencimento"].notna()]
+    return df.assign(Centavos=(df["Valor"] * 100).round().astype("int64")).reset_index(drop=True)
+
+
+# --- CONCILIAÇÃO ---
+def _palavras(texto):
+    return frozenset(p for p in re.findall(r"[a-z0-9]+", _sem_acento(texto)) if len(p) > 1 and p not in IGNORADAS)
+
+def _semelhanca(banco, pendente, memo):
+    # Fração das palavras do lado menor que aparecem no outro (extrato abrevia, o cadastro não)
+    chave = (banco, pendente)
+    if chave not in memo:
+        a, b = _palavras(banco), _palavras(pendente)
+        memo[chave] = len(a & b) / min(len(a), len(b)) if a and b else 0.0
+    return memo[chave]
+
+def candidatos(bloco, abertos, janela=JANELA_DIAS, memo=None):
+    """Pares transação x pendente com o mesmo valor (em centavos) e fluxo, a até `janela` dias, pontuados."""
+    if bloco.empty or abertos.empty:
+        return pd.DataFrame()
+    banco = bloco.assign(Fluxo=np.where(bloco["Valor"] > 0, "Entrada", "Saída"),
+                         Centavos=(bloco["Valor"].abs() * 100).round().astype("int64"))
+    pares = banco.merge(abertos, on=["Fluxo", "Centavos"], suffixes=("_Banco", ""))
+    dias = (pares["Data"] - pares["Vencimento"]).dt.days.abs()
+    pares = pares[dias <= janela].assign(Dias=dias[dias <= janela])
+    if pares.empty:
+        return pares
+    memo = {} if memo is None else memo
+    texto = pares["Nome"] + " " + pares["Descricao"]
+    pares["Semelhanca"] = [_semelhanca(b, p, memo) for b, p in zip(pares["Descricao_Banco"], texto)]
+    pares["Pontuacao"] = (PESO_DESCRICAO * pares["Semelhanca"]
+                          + (1 - PESO_DESCRICAO) * (1 - pares["Dias"] / (janela + 1))).round(3)
+    return pares
+
+def _atribuir(pares):
+    # Guloso pela maior pontuação: cada transação e cada pendente entram em no máximo um par
+    pares = pares.sort_values(["Pontuacao", "Dias", "Transacao"], ascending=[False, True, True])
+    usadas, baixados, escolhidos = set(), set(), []
+    for i, transacao, chave in zip(pares.index, pares["Transacao"], zip(pares["Aba"], pares["Chave"])):
+        if transacao not in usadas and chave not in baixados:
+            usadas.add(transacao)
+            baixados.add(chave)
+            escolhidos.append(i)
+    return pares.loc[escolhidos]
+
+def conciliar(arquivo, nome, abertos, janela=JANELA_DIAS, tamanho=TAMANHO_BLOCO):
+    """Propostas de baixa para o extrato inteiro e o total de transações lidas.
+
+    O extrato é lido em blocos e de cada bloco só ficam os pares candidatos
+    (mesmo valor, dentro da janela); a escolha um-para-um é feita no fim, sobre
+    todos os candidatos, para que uma transação do começo do arquivo não tome
+    o pendente de uma mais parecida lá do fim.
+    """
+    lidas, partes, memo = 0, [], {}
+    for bloco in ler_extrato(arquivo, nome, tamanho):
+        lidas += len(bloco)
+        pares = candidatos(bloco, abertos, janela, memo)
+        if not pares.empty:
+            partes.append(pares)
+    if not partes:
+        return pd.DataFrame(columns=COLUNAS_PROPOSTA), lidas
+    propostas = _atribuir(pd.concat(partes, ignore_index=True))
+    return propostas[COLUNAS_PROPOSTA].sort_values(["Data", "Transacao"], ignore_index=True), lidas
+
+def baixas(propostas):
+    """{aba: {chave: campos}} que quitam os pendentes das propostas, na data do banco.
+
+    Financeiro leva o imposto retido (como o botão Receber); Despesas só Status e data.
+    """
+    registros = {}
+    for _, proposta in propostas.iterrows():
+        campos = {"Status": "Pago", "Data_Pagamento": str(proposta["Data"].date())}
+        if proposta["Aba"] == "Financeiro":
+            campos["Valor_Imposto"] = proposta["Valor"] * ALIQUOTA_IMPOSTO
+        registros.setdefault(proposta["Aba"], {})[proposta["Chave"]] = campos
+    return registros
+
+def linhas_lidas(propostas):
+    """{aba: {chave: linha}} com a versão e os campos da baixa como a conciliação leu cada pendente.
+
+    É a base das condições da gravação (LoteEscrita.atualizar): pendente baixado
+    ou alterado por outra pessoa depois da leitura não é sobrescrito.
+    """
+    linhas = {}
+    for _, proposta in propostas.iterrows():
+        linha = {c: proposta[c] for c in COLUNAS_LIDAS if not (c == "Valor_Imposto" and proposta["Aba"] == "Despesas")}
+        linhas.setdefault(proposta["Aba"], {})[proposta["Chave"]] = linha
+    return linhas
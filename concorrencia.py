@@ -0,0 +1,141 @@
+import pandas as pd
+
+from esquema import ESQUEMAS, tipo_e_dominio
+from planilhas import normalizar_chave, valor_celula
+
+# --- VERSÕES POR LINHA ---
+# Toda gravação do app numa linha soma 1 à coluna Versao dela; quem editou a
+# partir de uma versão antiga passa pela mesclagem campo a campo (mesclar)
+COLUNA_VERSAO = "Versao"
+ABAS_VERSIONADAS = ["Projetos", "Tarefas", "Financeiro", "Despesas"]
+# Tarefas é endereçada pela posição: estas colunas confirmam que a linha ainda é a mesma
+IDENTIDADE = {"Tarefas": ["ID_Projeto", "Descricao"]}
+
+
+class ConflitoEscrita(Exception):
+    """Outra pessoa mudou, desde a leitura, um campo que esta escrita também muda."""
+
+    def __init__(self, aba, chave, campos):
+        self.aba = aba
+        self.chave = chave
+        self.campos = list(campos)
+        super().__init__(f"{aba} {chave}: {', '.join(self.campos)} alterado(s) por outra pessoa")
+
+
+# --- COMPARAÇÃO DE VALORES ---
+def versao_linha(valor):
+    try:
+        return int(float(valor_celula(valor) or 0))
+    except (TypeError, ValueError):
+        return 0
+
+def _normalizar(aba, campo, valor):
+    # O mesmo valor chega tipado (tela), como gravado (fila) ou como a planilha devolve
+    tipo, _ = tipo_e_dominio(ESQUEMAS.get(aba, {}).get(campo, "texto"))
+    valor = valor_celula(valor)
+    if isinstance(valor, str):
+        valor = valor.strip()
+    if tipo == "numero":
+        numero = pd.to_numeric(valor if valor != "" else 0, errors="coerce")
+        return round(float(numero), 6) if pd.notna(numero) else valor
+    if tipo == "data":
+        if valor == "":
+            return ""
+        # Planilha em pt-BR devolve dd/mm/aaaa; o app grava aaaa-mm-dd
+        data = pd.to_datetime(valor, errors="coerce", dayfirst="/" in str(valor))
+        return data.strftime("%Y-%m-%d") if pd.notna(data) else valor
+    return normalizar_chave(valor) if valor != "" else ""
+
+def mesmo(aba, campo, a, b):
+    return _normalizar(aba, campo, a) == _normalizar(aba, campo, b)
+
+def linhas_iguais(aba, df, linhas):
+    """Posições em df das linhas (registros lidos antes) que continuam exatamente como foram lidas.
+
+    Cada registro casa com no máximo uma posição; o que mudou em qualquer
+    campo ou saiu da aba fica de fora.
+    """
+    colunas = list(df.columns)
+    livres = {}
+    for pos, registro in enumerate(df.to_dict("records")):
+        livres.setdefault(tuple(_normalizar(aba, c, registro[c]) for c in colunas), []).append(pos)
+    posicoes = []
+    for registro in linhas:
+        iguais = livres.get(tuple(_normalizar(aba, c, registro.get(c, "")) for c in colunas))
+        if iguais:
+            posicoes.append(iguais.pop(0))
+    return sorted(posicoes)
+
+def realocar(aba, df, pos, condicao):
+    """Posição atual da linha de Tarefas que a condição descreve (a linha anda quando outras são arquivadas).
+
+    Fica a mesma se ainda confere ou se as colunas de identidade não
+    apontam uma única linha; nesse caso mesclar recusa a escrita.
+    """
+    identidade = [c for c in IDENTIDADE.get(aba, []) if condicao and c in condicao["campos"] and c in df.columns]
+    if not identidade:
+        return pos
+    base = condicao["campos"]
+
+    def confere(p):
+        return all(mesmo(aba, c, df[c].iloc[p], base[c]) for c in identidade)
+
+    if 0 <= pos < len(df) and confere(pos):
+        return pos
+    candidatas = [p for p in range(len(df)) if confere(p)]
+    return candidatas[0] if len(candidatas) == 1 else pos
+
+
+# --- CONDIÇÕES E MESCLAGEM ---
+def condicao(aba, base, campos):
+    """O que a tela mostrava da linha (base) antes de alterar campos: versão e valores.
+
+    Vai junto com a alteração até a planilha; None para abas sem versão ou
+    sem linha de referência (grava sem conferir).
+    """
+    if aba not in ABAS_VERSIONADAS or base is None:
+        return None
+    colunas = list(campos) + IDENTIDADE.get(aba, [])
+    return {"versao": versao_linha(base.get(COLUNA_VERSAO)),
+            "campos": {c: valor_celula(base[c]) for c in colunas if c in base}}
+
+def juntar(anterior, nova):
+    """Duas alterações seguidas da mesma linha: vale a leitura mais antiga de cada campo."""
+    if anterior is None or nova is None:
+        return anterior if nova is None else nova
+    return {"versao": anterior["versao"], "campos": {**nova["campos"], **anterior["campos"]}}
+
+def mesclar(aba, chave, atual, campos, condicao=None):
+    """Campos a gravar sobre a linha como ela está agora (atual), com a versão seguinte.
+
+    Na mesma versão da leitura grava tudo. Se outra gravação passou antes,
+    cada campo é gravado só se continua como estava na leitura; campos que
+    não mudamos ficam com o valor de quem gravou antes. Se alguém mudou
+    o mesmo campo para outro valor, levanta ConflitoEscrita sem gravar nada.
+    """
+    if aba not in ABAS_VERSIONADAS:
+        return dict(campos)
+    versao = versao_linha(atual.get(COLUNA_VERSAO))
+    if condicao is None:
+        # Sem leitura de referência; a cópia vinda do banco local já traz a própria versão
+        return {COLUNA_VERSAO: versao + 1, **campos}
+    base = condicao["campos"]
+    trocada = [c for c in IDENTIDADE.get(aba, []) if c in base and not mesmo(aba, c, atual.get(c), base[c])]
+    if trocada:
+        raise ConflitoEscrita(aba, chave, trocada)
+    if versao == condicao["versao"]:
+        return {**campos, COLUNA_VERSAO: versao + 1}
+    gravar, conflitos = {}, []
+    for campo, valor in campos.items():
+        if campo in base and mesmo(aba, campo, valor, base[campo]):
+            continue
+        if mesmo(aba, campo, atual.get(campo), valor):
+            continue
+        if campo in base and mesmo(aba, campo, atual.get(campo), base[campo]):
+            gravar[campo] = valor
+        else:
+            conflitos.append(campo)
+    if conflitos:
+        raise ConflitoEscrita(aba, chave, conflitos)
+    gravar[COLUNA_VERSAO] = versao + 1
+    return gravar
@@ -0,0 +1,291 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from financas import _kpis, movimentos
+
+# --- ESTRUTURA ---
+# Duas tabelas com os totais do mês: uma pelas dimensões do dashboard (pequena,
+# cresce com os meses) e outra por projeto
+DIMENSOES = ["Mes", "Fluxo", "Status", "Origem", "Tipo", "Categoria"]
+DIMENSOES_PROJETO = ["Mes", "ID_Projeto", "Fluxo", "Status"]
+MEDIDAS = ["Valor", "Valor_Imposto", "Lancamentos"]
+# Dimensão que não se aplica (ex.: Categoria numa entrada) ou projeto sem cadastro
+SEM = ""
+COLUNA_ID = {"Financeiro": "ID_Lancamento", "Despesas": "ID_Despesa"}
+# Abas de que o consolidado depende (com as partições arquivadas)
+ABAS_CONSOLIDADO = ["Financeiro", "Despesas", "Projetos"]
+
+
+def _id(serie):
+    # IDs chegam como Int64, float ou texto; 0 marca "sem projeto"
+    return pd.to_numeric(serie, errors="coerce").fillna(0).astype("int64")
+
+def contribuicoes(df_fin, df_desp, df_proj):
+    """Uma linha por lançamento e despesa com as dimensões do consolidado.
+
+    Funciona com as abas tipadas ou como vêm da planilha. O delta de um
+    registro só (Consolidado._contribuicao) segue as mesmas regras.
+    """
+    mov = movimentos(df_fin, df_desp)
+    projetos = df_proj.drop_duplicates("ID_Projeto").set_index(_id(df_proj["ID_Projeto"].drop_duplicates()))
+    linhas = pd.DataFrame({
+        "Registro": _id(mov["Registro"]),
+        "Mes": mov["Mes"],
+        "Fluxo": mov["Fluxo"],
+        "Status": mov["Status"].astype(str),
+        "ID_Projeto": _id(mov["ID_Projeto"]),
+    })
+    for col in ["Origem", "Tipo"]:
+        valores = projetos[col].astype(object).where(projetos[col].notna(), SEM) if col in projetos else pd.Series(dtype=object)
+        linhas[col] = linhas["ID_Projeto"].map(valores).fillna(SEM).astype(str)
+    linhas["Categoria"] = mov["Categoria"].astype(object).where(mov["Categoria"].notna(), SEM).astype(str)
+    linhas["Valor"] = mov["Valor"].astype("float64")
+    linhas["Valor_Imposto"] = np.asarray(mov["Valor_Imposto"], dtype="float64")
+    linhas["Lancamentos"] = 1
+    return linhas
+
+def _escalar(valor, conversor):
+    try:
+        return conversor(valor, errors="coerce")
+    except (TypeError, ValueError):
+        return None
+
+def _atributos(df_proj):
+    # {ID_Projeto: (Origem, Tipo)} com a mesma regra de contribuicoes()
+    projetos = df_proj.drop_duplicates("ID_Projeto")
+    ids = _id(projetos["ID_Projeto"])
+    colunas = [projetos[c].astype(object).where(projetos[c].notna(), SEM).astype(str) if c in projetos
+               else pd.Series(SEM, index=projetos.index) for c in ("Origem", "Tipo")]
+    return dict(zip(ids, zip(*colunas)))
+
+
+# --- CONSOLIDADO MENSAL ---
+class Consolidado:
+    """Totais mensais por projeto, Origem/Tipo e Categoria, mantidos entre reruns.
+
+    É montado uma vez por versão dos dados (Financeiro, Despesas e Projetos,
+    com o arquivo). Lançamentos criados ou baixados pelo app entram como
+    delta: sai a contribuição antiga do registro, entra a nova. Como nos
+    índices de entidades.py, o delta só é aplicado se essa escrita foi a única
+    mudança desde a montagem; senão, a próxima leitura monta de novo.
+    """
+
+    def __init__(self):
+        self.versoes = None
+        self._totais = {}
+        self._totais_projeto = {}
+        self._fontes = {}
+        self._alterados = {}
+        self._atributos = {}
+        self._consultas = {}
+        self._lock = threading.RLock()
+
+    # Montagem
+    def montar(self, df_fin, df_desp, df_proj, versoes):
+        with self._lock:
+            linhas = contribuicoes(df_fin, df_desp, df_proj)
+            # Totais em dicionários (chave -> [valor, imposto, lançamentos]): o delta é O(1)
+            self._totais, self._totais_projeto = (
+                {chave: valores for chave, valores in zip(grupos.index, grupos.to_numpy(dtype="float64"))}
+                for grupos in (linhas.groupby(dims, observed=True)[MEDIDAS].sum()
+                               for dims in (DIMENSOES, DIMENSOES_PROJETO))
+            )
+            # Registros de origem por ID, para calcular o delta de uma escrita
+            self._fontes = {aba: df.set_index(_id(df[COLUNA_ID[aba]]), drop=False)
+                            for aba, df in (("Financeiro", df_fin), ("Despesas", df_desp))}
+            # Registros que mudaram desde a montagem (valem mais que os de _fontes)
+            self._alterados = {aba: {} for aba in self._fontes}
+            self._atributos = _atributos(df_proj)
+            self._consultas = {}
+            self.versoes = versoes
+
+    def adotar(self, outro, versoes):
+        """Passa a usar os totais (e as consultas já feitas) de outro Consolidado,
+        como o gravado pelo lote noturno (precalculo.py)."""
+        with self._lock:
+            for campo in ("_totais", "_totais_projeto", "_fontes", "_alterados", "_atributos", "_consultas"):
+                setattr(self, campo, getattr(outro, campo))
+            self.versoes = versoes
+
+    # Pickle (lote noturno): a trava não vai para o disco
+    def __getstate__(self):
+        estado = self.__dict__.copy()
+        del estado["_lock"]
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.RLock()
+
+    def _pode_aplicar(self, abas, antes, depois):
+        if self.versoes is None or self.versoes != antes:
+            return False
+        return all(depois[a] == antes[a] or (a in abas and depois[a][0] == antes[a][0] + 1) for a in antes)
+
+    def _contribuicao(self, aba, registro):
+        """A conta de contribuicoes() para um registro só, sem montar DataFrames."""
+        vencimento = _escalar(registro.get("Vencimento"), pd.to_datetime)
+        if vencimento is None or pd.isna(vencimento):
+            return []
+        pagamento = _escalar(registro.get("Data_Pagamento"), pd.to_datetime)
+        status = registro.get("Status")
+        data = pagamento if status == "Pago" and pagamento is not None and not pd.isna(pagamento) else vencimento
+        valor = _escalar(registro.get("Valor"), pd.to_numeric)
+        if aba == "Financeiro":
+            imposto = _escalar(registro.get("Valor_Imposto"), pd.to_numeric)
+            id_projeto = _escalar(registro.get("ID_Projeto"), pd.to_numeric)
+            id_projeto = 0 if id_projeto is None or pd.isna(id_projeto) else int(id_projeto)
+            categoria = SEM
+        else:
+            imposto, id_projeto = 0.0, 0
+            categoria = registro.get("Categoria")
+            categoria = SEM if categoria is None or pd.isna(categoria) else str(categoria)
+        origem, tipo = self._atributos.get(id_projeto, (SEM, SEM))
+        return [{
+            "Mes": pd.Timestamp(data.year, data.month, 1),
+            "Fluxo": "Entrada" if aba == "Financeiro" else "Saída",
+            "Status": str(status),
+            "ID_Projeto": id_projeto, "Origem": origem, "Tipo": tipo, "Categoria": categoria,
+            "Valor": 0.0 if valor is None or pd.isna(valor) else float(valor),
+            "Valor_Imposto": 0.0 if imposto is None or pd.isna(imposto) else float(imposto),
+            "Lancamentos": 1,
+        }]
+
+    def _somar(self, linhas, sinal):
+        for linha in linhas:
+            valores = np.array([linha[m] for m in MEDIDAS], dtype="float64") * sinal
+            for totais, dims in ((self._totais, DIMENSOES), (self._totais_projeto, DIMENSOES_PROJETO)):
+                chave = tuple(linha[d] for d in dims)
+                totais[chave] = totais.get(chave, 0.0) + valores
+
+    def registrar(self, aba, chave, campos, antes, depois):
+        """Aplica a inclusão ou alteração de um lançamento (Financeiro) ou despesa (Despesas).
+
+        campos são os gravados (o registro inteiro numa inclusão); antes e
+        depois, as versões dos dados em volta da escrita. Devolve se aplicou.
+        """
+        return self.registrar_lote({aba: {chave: campos}}, antes, depois)
+
+    def registrar_lote(self, registros, antes, depois):
+        """Como registrar(), para uma escrita única com vários registros: {aba: {chave: campos}}."""
+        with self._lock:
+            if not set(registros) <= set(self._fontes) or not self._pode_aplicar(set(registros), antes, depois):
+                return False
+            for aba, por_chave in registros.items():
+                for chave, campos in por_chave.items():
+                    self._aplicar(aba, chave, campos)
+            self._consultas = {}
+            self.versoes = depois
+            return True
+
+    def _aplicar(self, aba, chave, campos):
+        fonte, alterados = self._fontes[aba], self._alterados[aba]
+        chave = int(pd.to_numeric(chave))
+        anterior = alterados.get(chave)
+        if anterior is None and chave in fonte.index:
+            anterior = fonte.loc[chave].to_dict()
+        novo = dict(anterior or {}, **campos)
+        novo[COLUNA_ID[aba]] = chave
+        if anterior is not None:
+            self._somar(self._contribuicao(aba, anterior), -1)
+        self._somar(self._contribuicao(aba, novo), 1)
+        alterados[chave] = novo
+
+    # Consultas (memorizadas até a próxima mudança)
+    def _memo(self, nome, calcular):
+        with self._lock:
+            if nome not in self._consultas:
+                self._consultas[nome] = calcular()
+            return self._consultas[nome]
+
+    @staticmethod
+    def _tabela(totais, dims):
+        if not totais:
+            return pd.DataFrame(columns=dims + MEDIDAS + ["Ano"])
+        df = pd.DataFrame(list(totais.values()), columns=MEDIDAS,
+                          index=pd.MultiIndex.from_tuples(list(totais), names=dims)).reset_index()
+        # Combinações que zeraram após deltas (registro que mudou de mês/status) saem da tabela
+        df = df[df["Lancamentos"] != 0]
+        df["Mes"] = pd.to_datetime(df["Mes"])
+        df["Ano"] = df["Mes"].dt.year
+        return df
+
+    def _plana(self):
+        return self._memo("plana", lambda: self._tabela(self._totais, DIMENSOES))
+
+    @property
+    def tabela(self):
+        """Totais por mês, fluxo, status, Origem, Tipo e Categoria."""
+        return self._plana()
+
+    @property
+    def tabela_projetos(self):
+        """Totais por mês, projeto, fluxo e status."""
+        return self._memo("projetos", lambda: self._tabela(self._totais_projeto, DIMENSOES_PROJETO))
+
+    def anos(self):
+        return sorted(self._plana()["Ano"].unique().tolist())
+
+    def resumo(self, ano):
+        """KPIs do ano (financas._kpis) e o DataFrame "fluxo_mensal" com as colunas Mes, Tipo e Valor."""
+        def calcular():
+            plana = self._plana()
+            do_ano = plana[plana["Ano"] == ano]
+            resumo = _kpis(do_ano.groupby(["Fluxo", "Status"])[["Valor", "Valor_Imposto"]].sum())
+            fluxo = do_ano.groupby(["Mes", "Fluxo"])["Valor"].sum().reset_index()
+            fluxo["Mes"] = fluxo["Mes"].dt.strftime("%Y-%m")
+            resumo["fluxo_mensal"] = fluxo.rename(columns={"Fluxo": "Tipo"}).sort_values("Mes")
+            return resumo
+        return self._memo(("resumo", ano), calcular)
+
+    def por_dimensao(self, ano, dimensao, fluxo="Entrada"):
+        """Valor do ano (pago + pendente) por Origem, Tipo, Categoria ou ID_Projeto."""
+        def calcular():
+            plana = self.tabela_projetos if dimensao == "ID_Projeto" else self._plana()
+            sel = plana[(plana["Ano"] == ano) & (plana["Fluxo"] == fluxo) & (plana[dimensao] != SEM)]
+            return sel.groupby(dimensao)["Valor"].sum().reset_index()
+        return self._memo(("dimensao", ano, dimensao, fluxo), calcular)
+
+    def comparativo_anual(self):
+        """Uma linha por ano: receita, impostos e custos pagos, lucro e variação sobre o ano anterior."""
+        def calcular():
+            pagos = self._plana()
+            pagos = pagos[pagos["Status"] == "Pago"]
+            totais = pagos.groupby(["Ano", "Fluxo"])[["Valor", "Valor_Imposto"]].sum().unstack("Fluxo", fill_value=0.0)
+            tabela = pd.DataFrame({"Ano": self.anos()}).set_index("Ano")
+            tabela["Receita"] = totais.get(("Valor", "Entrada"), 0.0)
+            tabela["Impostos"] = totais.get(("Valor_Imposto", "Entrada"), 0.0)
+            tabela["Custos"] = totais.get(("Valor", "Saída"), 0.0)
+            tabela = tabela.fillna(0.0)
+            tabela["Lucro"] = tabela["Receita"] - tabela["Impostos"] - tabela["Custos"]
+            tabela = tabela.reset_index()
+            anterior = tabela["Receita"].shift(1)
+            tabela["Var_Receita_%"] = ((tabela["Receita"] - anterior) / anterior.where(anterior > 0) * 100).round(1)
+            return tabela
+        return self._memo("comparativo", calcular)
+
+    def ultimos_12_meses(self, referencia):
+        """Entradas e saídas pagas mês a mês nos 12 meses até referencia, e os totais
+        desses 12 meses contra os 12 anteriores."""
+        fim = pd.Timestamp(referencia).to_period("M")
+        def calcular():
+            plana = self._plana()
+            pagos = plana[plana["Status"] == "Pago"]
+            mes = pagos["Mes"].dt.to_period("M")
+            janela = pagos[(mes > fim - 12) & (mes <= fim)]
+            anterior = pagos[(mes > fim - 24) & (mes <= fim - 12)]
+            meses = pd.period_range(fim - 11, fim, freq="M")
+            serie = (janela.groupby([janela["Mes"].dt.to_period("M"), "Fluxo"])["Valor"].sum()
+                     .unstack("Fluxo").reindex(meses).fillna(0.0)
+                     .reindex(columns=["Entrada", "Saída"], fill_value=0.0))
+            serie.index = serie.index.strftime("%Y-%m")
+            totais = {
+                "entradas": float(janela.loc[janela["Fluxo"] == "Entrada", "Valor"].sum()),
+                "saidas": float(janela.loc[janela["Fluxo"] == "Saída", "Valor"].sum()),
+                "entradas_anterior": float(anterior.loc[anterior["Fluxo"] == "Entrada", "Valor"].sum()),
+                "saidas_anterior": float(anterior.loc[anterior["Fluxo"] == "Saída", "Valor"].sum()),
+            }
+            return serie.rename_axis("Mes").reset_index(), totais
+        return self._memo(("12m", str(fim)), calcular)
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from esquema import EQUIPE
+from graficos import plotly
+
+# --- PARÂMETROS ---
+# Tarefas sem data de início aparecem com esta duração antes do prazo
+DURACAO_PADRAO = timedelta(days=5)
+# Paleta G10 do plotly: a equipe atual mantém as cores de sempre (azul e vermelho)
+PALETA = ["#3366CC", "#DC3912", "#FF9900", "#109618", "#990099", "#0099C6", "#DD4477", "#66AA00", "#B82E2E", "#316395"]
+COR_RESUMO = "#7F8C8D"
+
+
+# --- CORES ---
+def mapa_cores(responsaveis):
+    """Cor fixa por responsável: primeiro a equipe cadastrada, depois os demais em ordem alfabética."""
+    nomes = list(EQUIPE) + sorted(set(map(str, responsaveis)) - set(EQUIPE))
+    return {nome: PALETA[i % len(PALETA)] for i, nome in enumerate(nomes)}
+
+
+# --- PREPARAÇÃO ---
+def preparar_tarefas(pendentes, df_projetos):
+    tarefas = pendentes[["ID_Projeto", "Descricao", "Responsavel", "Status", "Data_Inicio", "Data_Deadline"]].copy()
+    tarefas["Data_Inicio"] = tarefas["Data_Inicio"].fillna(tarefas["Data_Deadline"] - DURACAO_PADRAO)
+    tarefas = tarefas.merge(df_projetos[["ID_Projeto", "Cliente"]], on="ID_Projeto", how="left")
+    return tarefas.dropna(subset=["Data_Inicio", "Data_Deadline"])
+
+def filtrar(tarefas, inicio, fim, clientes=None, responsaveis=None):
+    """Mantém só as tarefas que cruzam a janela [inicio, fim] e passam nos filtros."""
+    mascara = (tarefas["Data_Inicio"] <= pd.Timestamp(fim)) & (tarefas["Data_Deadline"] >= pd.Timestamp(inicio))
+    if clientes:
+        mascara &= tarefas["Cliente"].isin(clientes)
+    if responsaveis:
+        mascara &= tarefas["Responsavel"].isin(responsaveis)
+    return tarefas[mascara]
+
+def resumir_por_projeto(tarefas):
+    """Uma barra por projeto, do primeiro início ao último prazo."""
+    return (tarefas.groupby("Cliente", observed=True)
+            .agg(Data_Inicio=("Data_Inicio", "min"), Data_Deadline=("Data_Deadline", "max"),
+                 Tarefas=("Descricao", "size"))
+            .reset_index())
+
+
+# --- FIGURA ---
+def figura_gantt(tarefas, inicio, fim, resumido=False):
+    px, _ = plotly()
+    if resumido:
+        dados = resumir_por_projeto(tarefas)
+        fig = px.timeline(dados, x_start="Data_Inicio", x_end="Data_Deadline", y="Cliente",
+                          hover_data=["Tarefas"], color_discrete_sequence=[COR_RESUMO])
+    else:
+        # Só as colunas usadas vão para o navegador
+        dados = tarefas[["Cliente", "Responsavel", "Descricao", "Status", "Data_Inicio", "Data_Deadline"]]
+        dados = dados.assign(Responsavel=dados["Responsavel"].astype(str), Status=dados["Status"].astype(str))
+        fig = px.timeline(dados, x_start="Data_Inicio", x_end="Data_Deadline",
+                          y="Cliente", color="Responsavel", hover_data=["Descricao", "Status"],
+                          color_discrete_map=mapa_cores(dados["Responsavel"].unique()))
+    fig.update_yaxes(autorange="reversed")
+    fig.update_xaxes(range=[pd.Timestamp(inicio), pd.Timestamp(fim)])
+    return fig
@@ -0,0 +1,182 @@
+import threading
+
+from busca import IndiceTexto, cruzar
+from compartilhado import sequencias
+from planilhas import CHAVES, normalizar_chave
+from repositorio import Repositorio
+
+# --- CONFIGURAÇÃO ---
+# Colunas com índice hash (valor -> posições), além da chave primária de cada aba
+INDICES = {
+    "Projetos": ["Cliente"],
+    "Tarefas": ["ID_Projeto"],
+    "Financeiro": ["ID_Projeto"],
+    "Despesas": [],
+    "Recorrencias": [],
+}
+# Colunas da busca por palavra (índice invertido, montado na primeira busca)
+TEXTO = {
+    "Projetos": ["Cliente", "Cidade", "Servicos", "Historico_Log"],
+    "Tarefas": ["Descricao", "Historico_Log"],
+    "Financeiro": ["Descricao"],
+    "Despesas": ["Descricao", "Categoria"],
+}
+
+
+# --- ÍNDICE DE UMA ABA ---
+class _IndiceAba:
+    def __init__(self, aba, df, versao):
+        self.aba = aba
+        self.versao = versao
+        self.n = 0
+        self.chave = {}
+        self.colunas = {col: {} for col in INDICES.get(aba, [])}
+        self._valores = {col: {} for col in INDICES.get(aba, [])}
+        self.max_id = 0
+        self.incluir(df.to_dict("records"))
+
+    def _indexar(self, pos, registro):
+        coluna_chave = CHAVES.get(self.aba)
+        if coluna_chave is not None and coluna_chave in registro:
+            chave = normalizar_chave(registro[coluna_chave])
+            self.chave[chave] = pos
+            if isinstance(chave, int):
+                self.max_id = max(self.max_id, chave)
+        for col, mapa in self.colunas.items():
+            if col in registro:
+                valor = normalizar_chave(registro[col])
+                mapa.setdefault(valor, []).append(pos)
+                self._valores[col][pos] = valor
+
+    def incluir(self, registros):
+        for registro in registros:
+            self._indexar(self.n, registro)
+            self.n += 1
+
+    def alterar(self, chave, campos):
+        pos = int(chave) if CHAVES.get(self.aba) is None else self.chave.get(normalizar_chave(chave))
+        if pos is None:
+            return
+        for col, mapa in self.colunas.items():
+            if col in campos:
+                anterior = self._valores[col].get(pos)
+                if anterior in mapa and pos in mapa[anterior]:
+                    mapa[anterior].remove(pos)
+                valor = normalizar_chave(campos[col])
+                mapa.setdefault(valor, []).append(pos)
+                self._valores[col][pos] = valor
+
+
+# --- REPOSITÓRIO INDEXADO ---
+class RepositorioIndexado(Repositorio):
+    """Envolve qualquer Repositorio com índices hash e um alocador de IDs.
+
+    Os índices guardam posições de linha do snapshot lido (df.loc[pos]).
+    São montados uma vez por versão dos dados e, após escritas feitas por
+    aqui, atualizados incrementalmente em vez de reconstruídos.
+    """
+
+    def __init__(self, repo, contadores=None):
+        self.repo = repo
+        self.contadores = contadores or sequencias()
+        self._indices = {}
+        self._textos = {}
+        self._lock = threading.RLock()
+
+    # Delegação
+    def ler(self, aba):
+        return self.repo.ler(aba)
+
+    def versao(self, aba):
+        return self.repo.versao(aba)
+
+    def consultar(self, aba, **filtros):
+        return self.repo.consultar(aba, **filtros)
+
+    def gravar(self, aba, df):
+        self.repo.gravar(aba, df)
+
+    def remover(self, aba, linhas):
+        return self.repo.remover(aba, linhas)
+
+    def aplicar(self, anexos, alteracoes, condicoes=None):
+        with self._lock:
+            abas = set(anexos) | set(alteracoes)
+            antes = {aba: self.versao(aba) for aba in abas}
+            self.repo.aplicar(anexos, alteracoes, condicoes)
+            for aba in abas:
+                for indice in (self._indices.get(aba), self._textos.get(aba)):
+                    # Só atualiza no lugar se a única mudança desde o índice foi esta escrita
+                    if indice is None or indice.versao != antes[aba] or self.versao(aba) != antes[aba] + 1:
+                        continue
+                    for chave, campos in alteracoes.get(aba, {}).items():
+                        indice.alterar(chave, campos)
+                    indice.incluir(anexos.get(aba, []))
+                    indice.versao = self.versao(aba)
+
+    def __getattr__(self, nome):
+        # Recursos específicos do backend (pendentes, sincronizar, ...)
+        if nome == "repo":
+            raise AttributeError(nome)
+        return getattr(self.repo, nome)
+
+    # Índices
+    def _indice(self, aba):
+        with self._lock:
+            indice = self._indices.get(aba)
+            if indice is None or indice.versao != self.versao(aba):
+                df = self.repo.ler(aba)
+                indice = _IndiceAba(aba, df, self.versao(aba))
+                self._indices[aba] = indice
+            return indice
+
+    def posicao(self, aba, chave):
+        """Posição da linha com a chave primária informada, ou None."""
+        return self._indice(aba).chave.get(normalizar_chave(chave))
+
+    def posicoes(self, aba, coluna, valor):
+        """Posições das linhas em que a coluna indexada tem o valor informado."""
+        return list(self._indice(aba).colunas[coluna].get(normalizar_chave(valor), []))
+
+    # Busca
+    def _texto(self, aba):
+        with self._lock:
+            indice = self._textos.get(aba)
+            if indice is None or indice.versao != self.versao(aba):
+                df = self.repo.ler(aba)
+                indice = IndiceTexto(aba, TEXTO[aba], df, self.versao(aba))
+                self._textos[aba] = indice
+            return indice
+
+    def buscar(self, consulta, abas=None):
+        """{aba: posições} das linhas que têm todas as palavras da consulta (sem acento, sem plural).
+
+        Nas abas ligadas a projetos (ID_Projeto indexado) a palavra também vale
+        se estiver no projeto da linha: "maria reforma" acha as tarefas de
+        reforma da cliente Maria.
+        """
+        with self._lock:
+            resultado, projetos = {}, None
+            for aba in abas or TEXTO:
+                conjuntos = self._texto(aba).termos(consulta)
+                if aba != "Projetos" and "ID_Projeto" in INDICES.get(aba, []):
+                    if projetos is None:
+                        ids = {pos: chave for chave, pos in self._indice("Projetos").chave.items()}
+                        projetos = [{ids[pos] for pos in c if pos in ids} for c in self._texto("Projetos").termos(consulta)]
+                    filhos = self._indice(aba).colunas["ID_Projeto"]
+                    conjuntos = [c.union(*(filhos.get(i, ()) for i in ids_termo))
+                                 for c, ids_termo in zip(conjuntos, projetos)]
+                resultado[aba] = cruzar(conjuntos)
+            return resultado
+
+    # IDs
+    def proximo_id(self, aba):
+        """Próximo ID da aba: maior que qualquer ID existente ou já alocado.
+
+        O contador fica num SQLite comum aos processos (ver
+        compartilhado.sequencias) e sobe numa transação só, então dois
+        processos nunca recebem o mesmo ID; o maior ID da aba serve de piso
+        para um contador novo (outro servidor, arquivo apagado).
+        """
+        with self._lock:
+            return self.contadores.incrementar(f"id:{aba}", self._indice(aba).max_id)
@@ -0,0 +1,124 @@
+import pandas as pd
+
+# --- DOMÍNIOS CONHECIDOS ---
+STATUS_PROJETO = ["Ativo", "Concluído", "Suspenso", "Cancelado"]
+STATUS_TAREFA = ["A Fazer", "Em Andamento", "Revisão", "Concluído"]
+STATUS_PAGAMENTO = ["Pendente", "Pago"]
+PRIORIDADES = ["Alta", "Média", "Baixa"]
+FASES = ["Modelagem", "Compatibilização", "Pranchas"]
+EQUIPE = ["GABRIEL", "MILENNA"]
+TIPOS_PROJETO = ["Residencial Unifamiliar", "Residencial Multifamiliar", "Comercial", "Reforma", "Industrial"]
+CATEGORIAS_DESPESA = ["Contabilidade", "Software/Licenças", "Pro-labore", "Marketing", "Taxas", "Outros"]
+TIPOS_RECORRENCIA = ["Despesa", "Parcelamento"]
+FREQUENCIAS = ["Mensal", "Trimestral", "Anual"]
+
+# --- ESQUEMAS ---
+# Tipos: "id" (inteiro anulável), "numero" (float, vazio = 0), "data" (datetime64),
+# "categoria" (valores conhecidos + os encontrados na planilha) e "texto" (sem conversão)
+ESQUEMAS = {
+    "Projetos": {
+        "ID_Projeto": "id", "Cliente": "texto", "Origem": "categoria", "Tipo": ("categoria", TIPOS_PROJETO),
+        "Area_m2": "numero", "Proposta_Aceita_R$": "numero", "Servicos": "texto", "Link_Proposta": "texto",
+        "Link_Pasta_Executivo": "texto", "Link_Pasta_Renders": "texto", "Data_Cadastro": "data",
+        "Status_Geral": ("categoria", STATUS_PROJETO), "Cidade": "texto", "Historico_Log": "texto", "Versao": "numero",
+    },
+    "Tarefas": {
+        "ID_Projeto": "id", "Fase": ("categoria", FASES), "Disciplina": "texto", "Descricao": "texto",
+        "Responsavel": ("categoria", EQUIPE), "Data_Inicio": "data", "Data_Deadline": "data",
+        "Prioridade": ("categoria", PRIORIDADES), "Status": ("categoria", STATUS_TAREFA),
+        "Historico_Log": "texto", "Data_Conclusao": "texto", "Horas_Gastas": "numero", "Versao": "numero",
+    },
+    "Financeiro": {
+        "ID_Lancamento": "id", "ID_Projeto": "id", "Descricao": "texto", "Valor": "numero",
+        "Vencimento": "data", "Status": ("categoria", STATUS_PAGAMENTO), "Data_Pagamento": "data",
+        "Valor_Imposto": "numero", "Recorrencia": "texto", "Versao": "numero",
+    },
+    "Despesas": {
+        "ID_Despesa": "id", "Descricao": "texto", "Categoria": ("categoria", CATEGORIAS_DESPESA), "Valor": "numero",
+        "Vencimento": "data", "Status": ("categoria", STATUS_PAGAMENTO), "Data_Pagamento": "data",
+        "Recorrencia": "texto", "Versao": "numero",
+    },
+    # Uma linha por série (despesa fixa ou plano de parcelas); ver recorrencias.py
+    "Recorrencias": {
+        "ID_Recorrencia": "id", "Tipo": ("categoria", TIPOS_RECORRENCIA), "Descricao": "texto",
+        "Categoria": ("categoria", CATEGORIAS_DESPESA), "ID_Projeto": "id", "Valor": "numero",
+        "Entrada_Pct": "numero", "Frequencia": ("categoria", FREQUENCIAS), "Ocorrencias": "numero",
+        "Inicio": "data", "Fim": "data",
+    },
+}
+# Colunas criadas depois das abas: ausentes numa planilha antiga não geram aviso
+OPCIONAIS = {"Recorrencia", "Versao"}
+FORMATO_DATA = "%Y-%m-%d"
+
+
+def tipo_e_dominio(tipo):
+    """(tipo, valores conhecidos) de uma definição do ESQUEMAS; o domínio é opcional."""
+    return tipo if isinstance(tipo, tuple) else (tipo, [])
+
+def _vazio(serie):
+    return serie.isna() | (serie.astype(str).str.strip() == "")
+
+
+# --- LEITURA (planilha -> tipos) ---
+def _converter(serie, tipo, conhecidos):
+    if tipo == "numero":
+        return pd.to_numeric(serie, errors="coerce").fillna(0.0).astype("float64")
+    if tipo == "data":
+        return pd.to_datetime(serie, errors="coerce")
+    if tipo == "id":
+        numeros = pd.to_numeric(serie, errors="coerce")
+        inteiros = numeros.dropna()
+        # Só converte se nenhum ID se perderia (texto ou decimal fica como está)
+        if numeros.notna().sum() == (~_vazio(serie)).sum() and (inteiros % 1 == 0).all():
+            return numeros.astype("Int64")
+        return serie
+    if tipo == "categoria":
+        serie = serie.where(~_vazio(serie))
+        valores = set(serie.dropna().astype(str))
+        # Ordem alfabética mantém o mesmo sort_values de quando era texto
+        categorias = sorted(valores | set(conhecidos))
+        return serie.astype(str).where(serie.notna()).astype(pd.CategoricalDtype(categorias))
+    return serie
+
+def tipar(aba, df):
+    """Completa as colunas do esquema e converte cada uma para o seu tipo.
+
+    Problemas encontrados (colunas ausentes, valores que não converteram)
+    ficam em df.attrs["avisos"].
+    """
+    esquema = ESQUEMAS[aba]
+    df = df.copy()
+    avisos = []
+    faltando = [col for col in esquema if col not in df.columns]
+    ausentes = [col for col in faltando if col not in OPCIONAIS]
+    if ausentes and not df.empty:
+        avisos.append(f"{aba}: colunas ausentes {', '.join(ausentes)}")
+    for col in faltando:
+        df[col] = pd.Series(pd.NA, index=df.index, dtype=object)
+    for col, definicao in esquema.items():
+        tipo, conhecidos = tipo_e_dominio(definicao)
+        convertida = _converter(df[col], tipo, conhecidos)
+        if tipo in ("numero", "data"):
+            lidos = convertida if tipo == "data" else pd.to_numeric(df[col], errors="coerce")
+            invalidos = int((lidos.isna() & ~_vazio(df[col])).sum())
+            if invalidos:
+                avisos.append(f"{aba}.{col}: {invalidos} valor(es) inválido(s)")
+        df[col] = convertida
+    df.attrs["avisos"] = avisos
+    return df
+
+
+# --- ESCRITA (tipos -> planilha) ---
+def serializar(aba, df):
+    """Converte de volta ao formato gravado na planilha (datas ISO, vazios como "")."""
+    df = df.copy()
+    for col, definicao in ESQUEMAS[aba].items():
+        if col not in df.columns:
+            continue
+        tipo, _ = tipo_e_dominio(definicao)
+        if tipo == "data":
+            df[col] = pd.to_datetime(df[col], errors="coerce").dt.strftime(FORMATO_DATA)
+        elif tipo in ("id", "categoria"):
+            df[col] = df[col].astype(object)
+        df[col] = df[col].where(df[col].notna(), "")
+    return df
@@ -0,0 +1,428 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from concorrencia import IDENTIDADE, ConflitoEscrita, juntar
+from planilhas import CHAVES, atribuir_celula, normalizar_chave, valor_celula
+from repositorio import Repositorio, RepositorioSheets
+
+# --- CONFIGURAÇÃO ---
+# FILA_ESCRITA=0 volta a gravar de forma síncrona. O arquivo pode ser o mesmo para
+# todos os processos do servidor: cada item tem dono e só ele o envia
+CAMINHO_FILA = os.environ.get("FILA_CAMINHO", "fila.db")
+# Espera antes de enviar: edições em sequência (ex.: horas de várias tarefas) saem juntas
+ATRASO_ENVIO = 1.0
+# Nova tentativa após falha: ESPERA_BASE * 2^(n-1) segundos, até ESPERA_MAXIMA
+ESPERA_BASE = 2.0
+ESPERA_MAXIMA = 300.0
+# Depois disso o item fica parado como falha até alguém pedir nova tentativa
+MAX_TENTATIVAS = 10
+# Alterações descartadas por conflito que continuam visíveis no status
+MAX_CONFLITOS = 20
+
+
+def ativa():
+    return os.environ.get("FILA_ESCRITA", "1") != "0"
+
+def _dono():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _vivo(dono):
+    # Só dá para saber de processos desta máquina; os de outra continuam com o dono deles
+    maquina, _, pid = dono.rpartition(":")
+    if maquina != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except (ProcessLookupError, ValueError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# --- REPOSITÓRIO COM FILA DE ESCRITA ---
+class RepositorioComFila(Repositorio):
+    """Grava em segundo plano (write-behind) sobre outro Repositorio.
+
+    aplicar() só registra as mutações numa fila em SQLite (sobrevive a
+    reinícios) e volta na hora; ler() devolve os dados do backend com as
+    mutações pendentes já aplicadas. Uma thread envia a fila ao backend:
+    alterações seguidas na mesma linha viram uma só, e falhas são
+    reenviadas com espera exponencial. Alteração recusada por conflito
+    (ConflitoEscrita) não é reenviada: sai da fila e fica em conflitos.
+
+    Cada item leva o processo que o criou (dono): vários processos dividem o
+    arquivo sem enviar os itens uns dos outros, e os itens de um processo
+    que morreu passam para o próximo que abrir a fila.
+    """
+
+    def __init__(self, repo, caminho=CAMINHO_FILA, atraso_envio=ATRASO_ENVIO, dono=None):
+        self.repo = repo
+        self.atraso_envio = atraso_envio
+        self.dono = dono or _dono()
+        self.ultimo_envio = None
+        self.ultimo_erro = None
+        self.conflitos = []
+        self._db = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fila (id INTEGER PRIMARY KEY, aba TEXT, tipo TEXT, chave TEXT, "
+            "campos TEXT, tentativas INTEGER DEFAULT 0, proxima REAL DEFAULT 0, erro TEXT, condicao TEXT, "
+            "dono TEXT)"
+        )
+        colunas = [r[1] for r in self._db.execute("PRAGMA table_info(fila)")]
+        if "condicao" not in colunas:
+            # Fila criada antes das versões por linha
+            self._db.execute("ALTER TABLE fila ADD COLUMN condicao TEXT")
+        if "dono" not in colunas:
+            self._db.execute("ALTER TABLE fila ADD COLUMN dono TEXT")
+        self._db.commit()
+        # Adota os itens de processos encerrados (ou de antes da coluna dono); o UPDATE
+        # condicionado ao dono antigo garante que só um processo fica com eles
+        for (anterior,) in self._db.execute("SELECT DISTINCT dono FROM fila WHERE dono IS NOT ?",
+                                            (self.dono,)).fetchall():
+            if anterior is None or not _vivo(anterior):
+                self._db.execute("UPDATE fila SET dono = ? WHERE dono IS ?", (self.dono, anterior))
+                self._db.commit()
+        self._lock = threading.RLock()
+        self._envio = threading.Lock()
+        self._em_envio = set()
+        self._versoes = {}
+        self._base = {}
+        self._itens = [
+            {"id": i, "aba": aba, "tipo": tipo, "chave": json.loads(chave), "campos": json.loads(campos),
+             "tentativas": tentativas, "proxima": proxima, "erro": erro,
+             "condicao": json.loads(condicao) if condicao else None}
+            for i, aba, tipo, chave, campos, tentativas, proxima, erro, condicao
+            in self._db.execute("SELECT id, aba, tipo, chave, campos, tentativas, proxima, erro, condicao "
+                                "FROM fila WHERE dono = ? ORDER BY id", (self.dono,))
+        ]
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        threading.Thread(target=self._laco_envio, daemon=True, name="fila-escrita").start()
+        if self._itens:
+            self._acordar.set()
+
+    # Leitura (estado otimista)
+    def versao(self, aba):
+        with self._lock:
+            base = self.repo.versao(aba)
+            # Mudança no backend (envio concluído, leitura nova) também muda a versão vista
+            if self._base.get(aba) != base:
+                self._base[aba] = base
+                self._versoes[aba] = self._versoes.get(aba, 0) + 1
+            return self._versoes.get(aba, 0)
+
+    def ler(self, aba):
+        # repo.ler já devolve uma cópia: as pendências são aplicadas direto nela
+        df = self.repo.ler(aba)
+        with self._lock:
+            return self._aplicar_pendentes(aba, df)
+
+    def _aplicar_pendentes(self, aba, df):
+        itens = [i for i in self._itens if i["aba"] == aba]
+        if not itens:
+            return df
+        coluna = CHAVES.get(aba)
+        posicoes = None
+        chaves_base = None
+        for item in itens:
+            if item["tipo"] == "anexo":
+                if coluna is not None and chaves_base is None and coluna in df.columns:
+                    chaves_base = set(map(normalizar_chave, df[coluna]))
+                if self._ja_aplicado(aba, df, item, chaves_base):
+                    continue
+                df = pd.concat([df, pd.DataFrame([item["campos"]])], ignore_index=True)
+                posicoes = None
+                continue
+            if coluna is None:
+                pos = item["chave"] if 0 <= item["chave"] < len(df) else None
+            else:
+                if posicoes is None:
+                    posicoes = {normalizar_chave(v): p for p, v in enumerate(df[coluna])}
+                pos = posicoes.get(item["chave"])
+            if pos is None:
+                continue
+            for campo, valor in item["campos"].items():
+                if campo not in df.columns:
+                    df[campo] = ""
+                atribuir_celula(df, pos, campo, valor)
+        return df
+
+    def _ja_aplicado(self, aba, df, item, chaves_base=None):
+        # Inclusão já presente no backend (envio recém-concluído ou interrompido no meio)
+        coluna = CHAVES.get(aba)
+        if coluna is None:
+            if isinstance(item["chave"], int):
+                # Item de antes da chave por identidade: confere a posição estimada
+                pos = item["chave"]
+                if pos >= len(df):
+                    return False
+                linha = df.iloc[pos]
+                # Compara normalizado: a planilha devolve 0 onde gravamos 0.0, por exemplo
+                return all(normalizar_chave(valor_celula(linha.get(c))) == normalizar_chave(v)
+                           for c, v in item["campos"].items())
+            # Chave = identidade + quantas linhas com ela já existiam: incluída se agora há mais
+            *identidade, anteriores = item["chave"]
+            return _contar(aba, df, identidade) > anteriores
+        if coluna not in df.columns:
+            return False
+        if chaves_base is None:
+            chaves_base = set(map(normalizar_chave, df[coluna]))
+        return item["chave"] in chaves_base
+
+    # Escrita
+    def aplicar(self, anexos, alteracoes, condicoes=None):
+        condicoes = condicoes or {}
+        with self._lock:
+            abas = set(anexos) | set(alteracoes)
+            for aba in abas:
+                coluna = CHAVES.get(aba)
+                # Sem coluna de ID (Tarefas), a inclusão é chamada pela identidade da linha
+                vista = self.ler(aba) if coluna is None and anexos.get(aba) else None
+                for registro in anexos.get(aba, []):
+                    campos = {c: valor_celula(v) for c, v in registro.items()}
+                    if coluna is None:
+                        identidade = _identidade(aba, campos)
+                        chave = identidade + [_contar(aba, vista, identidade)]
+                        vista = pd.concat([vista, pd.DataFrame([campos])], ignore_index=True)
+                    else:
+                        chave = normalizar_chave(campos.get(coluna))
+                    self._enfileirar(aba, "anexo", chave, campos)
+                for chave, campos in alteracoes.get(aba, {}).items():
+                    campos = {c: valor_celula(v) for c, v in campos.items()}
+                    self._enfileirar(aba, "alteracao", normalizar_chave(chave), campos,
+                                     condicoes.get(aba, {}).get(chave))
+            self._db.commit()
+            for aba in abas:
+                self._versoes[aba] = self.versao(aba) + 1
+        self._acordar.set()
+
+    def _enfileirar(self, aba, tipo, chave, campos, condicao=None):
+        if tipo == "alteracao":
+            # Junta com a inclusão/alteração ainda não enviada da mesma linha
+            for item in reversed(self._itens):
+                if (item["aba"] == aba and item["chave"] == chave and item["id"] not in self._em_envio
+                        and item["tentativas"] < MAX_TENTATIVAS):
+                    item["campos"].update(campos)
+                    if item["tipo"] == "alteracao":
+                        item["condicao"] = juntar(item["condicao"], condicao)
+                    self._db.execute("UPDATE fila SET campos = ?, condicao = ? WHERE id = ?",
+                                     (json.dumps(item["campos"], ensure_ascii=False), _json(item["condicao"]),
+                                      item["id"]))
+                    return
+        cursor = self._db.execute(
+            "INSERT INTO fila (aba, tipo, chave, campos, condicao, dono) VALUES (?, ?, ?, ?, ?, ?)",
+            (aba, tipo, json.dumps(chave), json.dumps(campos, ensure_ascii=False), _json(condicao), self.dono),
+        )
+        self._itens.append({"id": cursor.lastrowid, "aba": aba, "tipo": tipo, "chave": chave, "campos": campos,
+                            "tentativas": 0, "proxima": 0, "erro": None, "condicao": condicao})
+
+    def gravar(self, aba, df):
+        # df já vem da visão otimista: as mutações pendentes da aba estão nele
+        with self._envio:
+            self.repo.gravar(aba, df)
+            with self._lock:
+                self._remover([i for i in self._itens if i["aba"] == aba])
+                self._versoes[aba] = self.versao(aba) + 1
+
+    def remover(self, aba, linhas):
+        # As pendências da aba vão antes: a remoção muda as posições das tarefas
+        self.enviar(forcar=True)
+        with self._envio:
+            with self._lock:
+                if any(i["aba"] == aba for i in self._itens):
+                    raise RuntimeError(f"{aba}: há alterações na fila ainda não gravadas; tente de novo depois")
+            removidas = self.repo.remover(aba, linhas)
+            with self._lock:
+                self._versoes[aba] = self.versao(aba) + 1
+        return removidas
+
+    def __getattr__(self, nome):
+        if nome == "repo":
+            raise AttributeError(nome)
+        return getattr(self.repo, nome)
+
+    # Envio em segundo plano
+    def _remover(self, itens):
+        ids = {i["id"] for i in itens}
+        self._itens = [i for i in self._itens if i["id"] not in ids]
+        self._db.executemany("DELETE FROM fila WHERE id = ?", [(i,) for i in ids])
+        self._db.commit()
+
+    def _falhou(self, itens, erro):
+        agora = time.time()
+        for item in itens:
+            item["tentativas"] += 1
+            item["erro"] = f"{type(erro).__name__}: {erro}"
+            item["proxima"] = agora + min(ESPERA_BASE * 2 ** (item["tentativas"] - 1), ESPERA_MAXIMA)
+            self._db.execute("UPDATE fila SET tentativas = ?, proxima = ?, erro = ? WHERE id = ?",
+                             (item["tentativas"], item["proxima"], item["erro"], item["id"]))
+        self._db.commit()
+        self.ultimo_erro = (datetime.now(), item["erro"])
+
+    def _descartar(self, item, conflito):
+        # Reenviar não adianta: a linha mudou nos mesmos campos; a visão volta ao que está no backend
+        self._remover([item])
+        self._versoes[item["aba"]] = self.versao(item["aba"]) + 1
+        self.conflitos = (self.conflitos + [(datetime.now(), item, str(conflito))])[-MAX_CONFLITOS:]
+
+    def _enviar(self, itens):
+        anexos, alteracoes, condicoes = {}, {}, {}
+        for item in itens:
+            if item["tipo"] == "anexo":
+                anexos.setdefault(item["aba"], []).append(item["campos"])
+            else:
+                alteracoes.setdefault(item["aba"], {})[item["chave"]] = item["campos"]
+                if item["condicao"] is not None:
+                    condicoes.setdefault(item["aba"], {})[item["chave"]] = item["condicao"]
+        abas = set(anexos) | set(alteracoes)
+        antes = {aba: self.repo.versao(aba) for aba in abas}
+        self.repo.aplicar(anexos, alteracoes, condicoes)
+        with self._lock:
+            for aba in abas:
+                # O backend só recebeu o que a visão otimista já mostrava: a versão vista não muda
+                if self._base.get(aba) == antes[aba] and self.repo.versao(aba) == antes[aba] + 1:
+                    self._base[aba] = antes[aba] + 1
+
+    def enviar(self, forcar=False):
+        """Envia ao backend os itens prontos da fila (com forcar, também os que
+        aguardam nova tentativa). Devolve quantos foram gravados."""
+        with self._envio:
+            with self._lock:
+                agora = float("inf") if forcar else time.time()
+                prontos = [i for i in self._itens if i["proxima"] <= agora and i["tentativas"] < MAX_TENTATIVAS]
+                self._em_envio = {i["id"] for i in prontos}
+            enviados = 0
+            try:
+                # Inclusões primeiro (uma chamada por aba, removidas assim que gravadas),
+                # depois todas as alterações numa chamada só
+                grupos = [[i for i in prontos if i["tipo"] == "anexo" and i["aba"] == aba]
+                          for aba in dict.fromkeys(i["aba"] for i in prontos if i["tipo"] == "anexo")]
+                alteracoes = [i for i in prontos if i["tipo"] == "alteracao"]
+                for grupo in grupos:
+                    aba = grupo[0]["aba"]
+                    if CHAVES.get(aba) is not None or IDENTIDADE.get(aba):
+                        # Inclusão que já chegou à planilha numa tentativa anterior não é repetida
+                        df = self.repo.ler(aba)
+                        ja = {i["id"] for i in grupo if self._ja_aplicado(aba, df, i)}
+                        with self._lock:
+                            self._remover([i for i in grupo if i["id"] in ja])
+                        grupo = [i for i in grupo if i["id"] not in ja]
+                    try:
+                        if grupo:
+                            self._enviar(grupo)
+                    except Exception as erro:
+                        with self._lock:
+                            self._falhou(grupo, erro)
+                        continue
+                    with self._lock:
+                        self._remover(grupo)
+                    enviados += len(grupo)
+                if alteracoes:
+                    try:
+                        self._enviar(alteracoes)
+                        lotes = [alteracoes]
+                    except Exception:
+                        # Um registro problemático não pode travar os demais: tenta um a um
+                        lotes = []
+                        for item in alteracoes:
+                            try:
+                                self._enviar([item])
+                                lotes.append([item])
+                            except ConflitoEscrita as conflito:
+                                with self._lock:
+                                    self._descartar(item, conflito)
+                            except Exception as erro:
+                                with self._lock:
+                                    self._falhou([item], erro)
+                    with self._lock:
+                        for lote in lotes:
+                            self._remover(lote)
+                            enviados += len(lote)
+            finally:
+                with self._lock:
+                    self._em_envio = set()
+            if enviados:
+                self.ultimo_envio = datetime.now()
+                if not any(i["erro"] for i in self._itens):
+                    self.ultimo_erro = None
+            return enviados
+
+    def _laco_envio(self):
+        while not self._parar.is_set():
+            with self._lock:
+                agora = time.time()
+                esperas = [i["proxima"] - agora for i in self._itens if i["tentativas"] < MAX_TENTATIVAS]
+            if not esperas:
+                self._acordar.wait()
+            elif min(esperas) > 0:
+                self._acordar.wait(min(esperas))
+            self._acordar.clear()
+            if self._parar.is_set():
+                return
+            # Dá tempo de juntar edições feitas em sequência
+            time.sleep(self.atraso_envio)
+            try:
+                self.enviar()
+            except Exception as erro:
+                self.ultimo_erro = (datetime.now(), f"{type(erro).__name__}: {erro}")
+                self._parar.wait(ESPERA_BASE)
+
+    def status_fila(self):
+        with self._lock:
+            return {
+                "pendentes": sum(1 for i in self._itens if i["tentativas"] < MAX_TENTATIVAS),
+                "falhas": [i for i in self._itens if i["tentativas"] >= MAX_TENTATIVAS],
+                "tentando": sum(1 for i in self._itens if 0 < i["tentativas"] < MAX_TENTATIVAS),
+                "ultimo_envio": self.ultimo_envio,
+                "ultimo_erro": self.ultimo_erro,
+                "conflitos": list(self.conflitos),
+            }
+
+    def tentar_novamente(self):
+        """Devolve à fila os itens que esgotaram as tentativas."""
+        with self._lock:
+            for item in self._itens:
+                item["tentativas"], item["proxima"] = 0, 0
+            self._db.execute("UPDATE fila SET tentativas = 0, proxima = 0 WHERE dono = ?", (self.dono,))
+            self._db.commit()
+        self._acordar.set()
+
+    def dispensar_conflitos(self):
+        with self._lock:
+            self.conflitos = []
+
+    def fechar(self):
+        self._parar.set()
+        self._acordar.set()
+        self._db.close()
+
+
+def _identidade(aba, campos):
+    return [normalizar_chave(valor_celula(campos.get(c))) for c in IDENTIDADE.get(aba, [])]
+
+def _contar(aba, df, identidade):
+    # Linhas da aba com a mesma identidade (ID_Projeto + Descricao, em Tarefas)
+    colunas = IDENTIDADE.get(aba, [])
+    if df is None or df.empty or not set(colunas) <= set(df.columns):
+        return 0
+    return sum(1 for valores in df[colunas].itertuples(index=False)
+               if [normalizar_chave(valor_celula(v)) for v in valores] == identidade)
+
+def _json(condicao):
+    return None if condicao is None else json.dumps(condicao, ensure_ascii=False)
+
+
+def criar_fila(repo):
+    """Envolve o backend Google Sheets com a fila de escrita, salvo se FILA_ESCRITA=0.
+
+    O backend SQLite já grava localmente e sincroniza a planilha em segundo plano.
+    """
+    return RepositorioComFila(repo) if ativa() and isinstance(repo, RepositorioSheets) else repo
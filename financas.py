@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+# --- REGRAS ---
+ALIQUOTA_IMPOSTO = 0.155
+
+
+# --- MOVIMENTOS (ENTRADAS + SAÍDAS) ---
+def data_considerada(df):
+    # Data Híbrida (Caixa vs Competência): pagamento se pago, senão vencimento
+    vencimento = pd.to_datetime(df["Vencimento"], errors="coerce")
+    if "Data_Pagamento" not in df.columns:
+        return vencimento
+    pagamento = pd.to_datetime(df["Data_Pagamento"], errors="coerce")
+    return pagamento.where((df["Status"] == "Pago") & pagamento.notna(), vencimento)
+
+def _movimentos_de(df, fluxo, coluna_id):
+    df = df[pd.to_datetime(df["Vencimento"], errors="coerce").notna()]
+    data = data_considerada(df)
+    mov = pd.DataFrame({
+        "Fluxo": fluxo,
+        "Registro": df[coluna_id] if coluna_id in df.columns else np.nan,
+        "ID_Projeto": df["ID_Projeto"] if "ID_Projeto" in df.columns else np.nan,
+        "Categoria": df["Categoria"] if "Categoria" in df.columns else np.nan,
+        "Status": df["Status"],
+        "Valor": pd.to_numeric(df["Valor"], errors="coerce").fillna(0.0),
+        "Valor_Imposto": pd.to_numeric(df["Valor_Imposto"], errors="coerce").fillna(0.0) if "Valor_Imposto" in df.columns else 0.0,
+        "Data_Considerada": data,
+    })
+    return mov
+
+def movimentos(df_fin, df_desp):
+    """Entradas (Financeiro) e saídas (Despesas) numa tabela só, com Ano e Mês de referência."""
+    mov = pd.concat([_movimentos_de(df_fin, "Entrada", "ID_Lancamento"), _movimentos_de(df_desp, "Saída", "ID_Despesa")],
+                    ignore_index=True)
+    mov = mov.dropna(subset=["Data_Considerada"])
+    mov["Ano_Ref"] = mov["Data_Considerada"].dt.year
+    mov["Mes"] = mov["Data_Considerada"].values.astype("datetime64[M]")
+    return mov
+
+
+# --- KPIs POR ANO ---
+def _kpis(totais):
+    def total(fluxo, status, col="Valor"):
+        return float(totais[col].get((fluxo, status), 0.0))
+
+    receita_bruta = total("Entrada", "Pago")
+    impostos_pagos = total("Entrada", "Pago", "Valor_Imposto")
+    custos_fixos_pagos = total("Saída", "Pago")
+    lucro_liquido = receita_bruta - impostos_pagos - custos_fixos_pagos
+    return {
+        "receita_bruta": receita_bruta,
+        "impostos_pagos": impostos_pagos,
+        "custos_fixos_pagos": custos_fixos_pagos,
+        "lucro_liquido": lucro_liquido,
+        "margem_lucro": (lucro_liquido / receita_bruta * 100) if receita_bruta > 0 else 0,
+        "a_receber": total("Entrada", "Pendente"),
+        "a_pagar": total("Saída", "Pendente"),
+    }
+
+def resumo_vazio():
+    resumo = _kpis(pd.DataFrame(columns=["Valor", "Valor_Imposto"]))
+    resumo["fluxo_mensal"] = pd.DataFrame(columns=["Mes", "Tipo", "Valor"])
+    return resumo
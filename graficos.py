@@ -0,0 +1,59 @@
+import threading
+
+# --- CORES ---
+# Mapas de cor das telas, montados uma vez por processo (import do módulo)
+CORES_FLUXO = {"Entrada": "#27AE60", "Saída": "#E74C3C"}
+CORES_ANUAIS = {"Receita": "#2E86C1", "Custos": "#E67E22", "Lucro": "#27AE60"}
+CORES_KPI = ["#2E86C1", "#E74C3C", "#E67E22", "#27AE60"]
+# Template registrado por cima do padrão do plotly: números no formato brasileiro (1.234,56)
+TEMPLATE = "engenharia360"
+
+_lock = threading.Lock()
+_pronto = False
+
+
+# --- PLOTLY SOB DEMANDA ---
+def plotly():
+    """(px, go), importados só aqui, com o TEMPLATE registrado como padrão.
+
+    Telas sem gráficos nunca pagam o import do plotly; a primeira chamada no
+    processo (normalmente a de aquecer()) registra o template.
+    """
+    global _pronto
+    import plotly.express as px
+    import plotly.graph_objects as go
+    if _pronto:
+        return px, go
+    with _lock:
+        if not _pronto:
+            import plotly.io as pio
+            # Já mesclado com o "plotly": um padrão composto ("plotly+...") seria mesclado de novo
+            # (cópia e validação do template inteiro) a cada figura criada
+            pio.templates[TEMPLATE] = pio.templates.merge_templates(
+                pio.templates["plotly"], go.layout.Template(layout=dict(separators=",.")))
+            pio.templates.default = TEMPLATE
+            _pronto = True
+    return px, go
+
+
+# --- AQUECIMENTO ---
+def aquecer():
+    """Deixa pronto o que a primeira tela com gráfico ou PDF pagaria: imports,
+    template e os validadores de cada tipo de figura usado pelo app."""
+    import pandas as pd
+
+    px, go = plotly()
+    df = pd.DataFrame({"Nome": ["a", "b"], "Valor": [1.0, 2.0],
+                       "Inicio": pd.to_datetime(["2026-01-01", "2026-01-02"]),
+                       "Fim": pd.to_datetime(["2026-01-03", "2026-01-04"])})
+    figuras = [
+        px.bar(df, x="Nome", y="Valor", color="Nome", text_auto=True),
+        px.line(df, x="Inicio", y="Valor", markers=True),
+        px.pie(df, values="Valor", names="Nome", hole=0.4),
+        px.timeline(df, x_start="Inicio", x_end="Fim", y="Nome"),
+        go.Figure(go.Heatmap(z=[[1.0, 2.0]], colorbar=dict(title="%"))),
+    ]
+    for fig in figuras:
+        # Serialização é o que o st.plotly_chart faz com cada figura
+        fig.to_json()
+    import relatorios  # noqa: F401 (fpdf)
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+import pandas as pd
+
+# --- PRAZOS ---
+# Urgente: prazo entre hoje e amanhã (card "Urgentes (48h)")
+DIAS_URGENCIA = 1
+
+
+# --- OPERACIONAL ---
+def kpis_operacionais(df_projetos, df_tarefas, hoje):
+    """Projetos ativos e tarefas pendentes, atrasadas e urgentes na data hoje."""
+    hoje = pd.Timestamp(hoje)
+    pendentes = df_tarefas[df_tarefas["Status"] != "Concluído"].copy()
+    prazo = pendentes["Data_Deadline"]
+    return {
+        "proj_ativos": df_projetos[df_projetos["Status_Geral"] == "Ativo"],
+        "pendentes": pendentes,
+        "atrasadas": pendentes[prazo < hoje],
+        "urgentes": pendentes[(prazo >= hoje) & (prazo <= hoje + timedelta(days=DIAS_URGENCIA))],
+    }
+
+
+# --- FINANCEIRO ---
+def kpis_financeiros(resumo, previstas):
+    """KPIs do ano (Consolidado.resumo) com as ocorrências de recorrências ainda não pagas nas pendências."""
+    kpis = {chave: valor for chave, valor in resumo.items() if chave != "fluxo_mensal"}
+    kpis["a_receber"] += float(previstas.loc[previstas["Fluxo"] == "Entrada", "Valor"].sum())
+    kpis["a_pagar"] += float(previstas.loc[previstas["Fluxo"] == "Saída", "Valor"].sum())
+    kpis["previsao"] = kpis["a_receber"] - kpis["a_pagar"]
+    return kpis
+
+def eficiencia(df_projetos, df_tarefas):
+    """Valor real da hora de cada projeto com horas lançadas (proposta / horas), do menor para o maior."""
+    horas_por_proj = df_tarefas.groupby("ID_Projeto")["Horas_Gastas"].sum().reset_index()
+    proj_financeiro = df_projetos[["ID_Projeto", "Cliente", "Proposta_Aceita_R$"]].copy()
+    df_eficiencia = pd.merge(proj_financeiro, horas_por_proj, on="ID_Projeto", how="inner")
+
+    df_eficiencia = df_eficiencia[df_eficiencia["Horas_Gastas"] > 0].copy()
+    df_eficiencia["Valor_Hora_Real"] = df_eficiencia["Proposta_Aceita_R$"] / df_eficiencia["Horas_Gastas"]
+    return df_eficiencia.sort_values(by="Valor_Hora_Real", ascending=True)
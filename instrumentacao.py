@@ -0,0 +1,170 @@
+import hmac
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# --- CONFIGURAÇÃO ---
+# PERFIL=1 liga a instrumentação; desligada, etapa() devolve um contexto vazio
+ATIVO = os.environ.get("PERFIL", "0") == "1"
+CAMINHO_LOG = os.environ.get("PERFIL_LOG", "perfil.jsonl")
+# Token do painel (?admin=<token>); sem token definido o painel não abre
+TOKEN_ADMIN = os.environ.get("PERFIL_ADMIN", "")
+RERUNS_RECENTES = 50
+
+_recentes = deque(maxlen=RERUNS_RECENTES)
+_abertos = {}
+_local = threading.local()
+_lock = threading.Lock()
+
+
+class _Nulo:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULO = _Nulo()
+
+
+# --- REGISTRO DE UM RERUN ---
+class Rerun:
+    def __init__(self, sessao, aba=None):
+        self.sessao = sessao
+        self.aba = aba
+        self.inicio = datetime.now()
+        self.t0 = time.perf_counter()
+        self.fim = None
+        self.etapas = []
+        self.io = []
+        self.interrompido = False
+
+    def como_dict(self):
+        fim = self.fim if self.fim is not None else time.perf_counter()
+        return {
+            "inicio": self.inicio.isoformat(timespec="milliseconds"),
+            "sessao": self.sessao,
+            "aba": self.aba,
+            "total_ms": round((fim - self.t0) * 1000, 2),
+            "interrompido": self.interrompido,
+            "etapas": self.etapas,
+            "io": self.io,
+        }
+
+
+class _Etapa:
+    __slots__ = ("rerun", "nome", "inicio", "nivel")
+
+    def __init__(self, rerun, nome):
+        self.rerun = rerun
+        self.nome = nome
+
+    def __enter__(self):
+        # Profundidade por thread: etapas em threads de carga não se aninham nas do script
+        self.nivel = getattr(_local, "nivel", 0)
+        _local.nivel = self.nivel + 1
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        fim = time.perf_counter()
+        _local.nivel = self.nivel
+        self.rerun.fim = fim
+        self.rerun.etapas.append({
+            "etapa": self.nome,
+            "nivel": self.nivel,
+            "inicio_ms": round((self.inicio - self.rerun.t0) * 1000, 2),
+            "ms": round((fim - self.inicio) * 1000, 2),
+        })
+        return False
+
+
+# --- API ---
+def atual():
+    return getattr(_local, "rerun", None)
+
+def iniciar_rerun(sessao, aba=None):
+    """Abre o registro do rerun desta sessão na thread do script.
+
+    Reruns cortados por st.rerun()/st.stop() não chegam ao finalizar_rerun():
+    são fechados aqui, no início do rerun seguinte, marcados como interrompidos.
+    """
+    if not ATIVO:
+        return None
+    anterior = _abertos.pop(sessao, None)
+    if anterior is not None:
+        anterior.interrompido = True
+        _fechar(anterior)
+    rerun = Rerun(sessao, aba)
+    _abertos[sessao] = rerun
+    _local.rerun = rerun
+    return rerun
+
+def vincular(rerun):
+    """Associa a thread atual (ex.: uma thread de carga) ao rerun informado."""
+    _local.rerun = rerun
+    _local.nivel = 0
+
+def finalizar_rerun():
+    rerun = atual()
+    if rerun is None:
+        return
+    _local.rerun = None
+    _abertos.pop(rerun.sessao, None)
+    rerun.fim = time.perf_counter()
+    _fechar(rerun)
+
+def _fechar(rerun):
+    registro = rerun.como_dict()
+    with _lock:
+        _recentes.append(registro)
+        try:
+            with open(CAMINHO_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+
+def etapa(nome):
+    """Contexto que cronometra um trecho do rerun atual (sem custo se desligado)."""
+    if not ATIVO:
+        return _NULO
+    rerun = atual()
+    if rerun is None:
+        return _NULO
+    return _Etapa(rerun, nome)
+
+def registrar_io(operacao, aba, linhas, dados, inicio):
+    """Anota uma leitura/escrita na planilha: linhas, bytes trafegados e duração.
+
+    dados é o DataFrame lido/gravado ou o corpo JSON enviado; bytes é o tamanho
+    dos valores em JSON, como a API do Sheets os transporta, e só é calculado
+    com a instrumentação ligada.
+    """
+    if not ATIVO:
+        return
+    rerun = atual()
+    if rerun is None:
+        return
+    ms = (time.perf_counter() - inicio) * 1000
+    rerun.io.append({"operacao": operacao, "aba": aba, "linhas": int(linhas),
+                     "bytes": _tamanho(dados), "ms": round(ms, 2)})
+
+def _tamanho(dados):
+    if hasattr(dados, "columns"):
+        # DataFrame lido/gravado: cabeçalho e linhas, vazios como "" (a memória do
+        # DataFrame não é o que passa pela rede)
+        dados = [list(map(str, dados.columns))] + dados.astype(object).where(dados.notna(), "").values.tolist()
+    return len(json.dumps(dados, ensure_ascii=False, default=str).encode("utf-8"))
+
+def recentes():
+    with _lock:
+        return list(_recentes)
+
+def admin(parametros):
+    """Painel só com a instrumentação ligada e ?admin= igual ao PERFIL_ADMIN configurado."""
+    if not ATIVO or not TOKEN_ADMIN:
+        return False
+    return hmac.compare_digest(str(parametros.get("admin", "")).encode(), TOKEN_ADMIN.encode())
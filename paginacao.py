@@ -0,0 +1,56 @@
+import streamlit as st
+
+# --- LISTAS PAGINADAS ---
+# Carteira, extrato e despesas: a ordem vem pronta (cache por versão dos dados)
+# e só os itens da página visível viram widgets
+ITENS_POR_PAGINA = 20
+
+
+# --- ORDEM E PÁGINAS (sem widgets) ---
+def ordenar(df, criterios):
+    """Rótulos de df na ordem dos critérios ((coluna, crescente), ...); sem critérios, dos mais novos aos mais antigos."""
+    if not criterios:
+        return df.index.to_numpy()[::-1]
+    colunas = [coluna for coluna, _ in criterios]
+    if "Pendente" in colunas and "Pendente" not in df.columns:
+        df = df.assign(Pendente=df["Status"].eq("Pendente"))
+    return df.sort_values(colunas, ascending=[crescente for _, crescente in criterios], kind="stable").index.to_numpy()
+
+def total_paginas(total):
+    return max(1, -(-total // ITENS_POR_PAGINA))
+
+def pagina_valida(pagina, total):
+    """Página dentro do intervalo: a lista pode ter encolhido (arquivamento, outra sessão, filtro)."""
+    return min(max(int(pagina or 1), 1), total_paginas(total))
+
+def fatia(rotulos, pagina):
+    inicio = (pagina - 1) * ITENS_POR_PAGINA
+    return rotulos[inicio:inicio + ITENS_POR_PAGINA]
+
+
+# --- WIDGETS ---
+def escolher_ordem(ordens, lista):
+    # Mudar a ordem volta para a primeira página
+    return st.selectbox("Ordenar por", list(ordens), key=f"ordem_{lista}",
+                        on_change=st.session_state.pop, args=(f"pagina_{lista}", None))
+
+def paginar(rotulos, lista):
+    """Fatia de rótulos da página escolhida; o seletor só aparece com mais de uma página."""
+    total = len(rotulos)
+    paginas = total_paginas(total)
+    if paginas == 1:
+        return rotulos
+    chave = f"pagina_{lista}"
+    if chave in st.session_state:
+        # Fora do intervalo: fica na última (ou na primeira) página
+        st.session_state[chave] = pagina_valida(st.session_state[chave], total)
+    pagina = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, step=1, key=chave)
+    inicio = (pagina - 1) * ITENS_POR_PAGINA
+    st.caption(f"{inicio + 1}–{min(inicio + ITENS_POR_PAGINA, total)} de {total}")
+    return fatia(rotulos, pagina)
+
+def expander_sob_demanda(label, chave, aberto=False):
+    """Expander que só executa o conteúdo aberto (use `if exp.open: with exp:`)."""
+    if aberto:
+        st.session_state[chave] = True
+    return st.expander(label, key=chave, on_change="rerun")
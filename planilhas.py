@@ -0,0 +1,506 @@
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+
+from compartilhado import INTERVALO_CONSULTA
+from instrumentacao import registrar_io
+
+# --- PARÂMETROS DO CACHE ---
+# Intervalo mínimo (segundos) entre consultas ao fingerprint remoto da planilha
+INTERVALO_CHECAGEM = 15
+# Planilhas públicas não expõem metadados: o snapshot expira por idade
+TTL_SEM_FINGERPRINT = 60
+
+# Chave primária de cada aba; Tarefas não tem ID e é endereçada pela posição da linha
+CHAVES = {
+    "Projetos": "ID_Projeto",
+    "Tarefas": None,
+    "Financeiro": "ID_Lancamento",
+    "Despesas": "ID_Despesa",
+    "Recorrencias": "ID_Recorrencia",
+}
+
+
+# --- CONVERSÕES PARA A PLANILHA ---
+def valor_celula(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, date):
+        return "" if pd.isnull(valor) else valor.strftime("%Y-%m-%d")
+    if hasattr(valor, "item"):
+        valor = valor.item()
+    try:
+        if pd.isnull(valor):
+            return ""
+    except (TypeError, ValueError):
+        pass
+    return valor
+
+def normalizar_chave(valor):
+    # IDs lidos da planilha chegam como float (1.0) ou texto ("1")
+    try:
+        numero = float(valor)
+        return int(numero) if numero.is_integer() else numero
+    except (TypeError, ValueError):
+        return str(valor).strip()
+
+def atribuir_celula(df, pos, col, valor):
+    """df.loc[pos, col] = valor, passando a coluna para object se o tipo dela não comporta o valor."""
+    try:
+        df.loc[pos, col] = valor
+    except (TypeError, ValueError):
+        df[col] = df[col].astype(object)
+        df.loc[pos, col] = valor
+
+
+# --- CACHE VERSIONADO DAS ABAS ---
+class CachePlanilhas:
+    """Snapshot em memória de cada aba, com versão local e fingerprint remoto.
+
+    Uma aba só é baixada de novo quando nós a escrevemos (invalidar) ou quando
+    o fingerprint remoto (modifiedTime do Drive) mudou por escrita de terceiros.
+
+    Com um SnapshotsCompartilhados (compartilhado), os processos do servidor
+    dividem os snapshots: a aba é baixada por um só deles, quem escreve publica
+    o resultado e os demais trocam o seu snapshot ao ver a versão nova.
+    """
+
+    def __init__(self, conn, intervalo_checagem=INTERVALO_CHECAGEM, ttl_sem_fingerprint=TTL_SEM_FINGERPRINT,
+                 compartilhado=None, intervalo_consulta=INTERVALO_CONSULTA):
+        self.conn = conn
+        self.intervalo_checagem = intervalo_checagem
+        self.ttl_sem_fingerprint = ttl_sem_fingerprint
+        self.compartilhado = compartilhado
+        self.intervalo_consulta = intervalo_consulta
+        self._consultado_em = {}
+        self._snapshots = {}
+        # Último snapshot usado por aplicar: dá as posições mesmo depois de descartado
+        self._referencias = {}
+        self._versoes = {}
+        self._fingerprint = None
+        self._ultima_checagem = 0.0
+        self._planilha = None
+        self._lock = threading.RLock()
+        self._travas = {}
+
+    def _fingerprint_remoto(self):
+        # Só a conta de serviço (gspread) permite consultar o modifiedTime
+        try:
+            if self._planilha is None:
+                self._planilha = self.conn.client._open_spreadsheet()
+            return self._planilha.get_lastUpdateTime()
+        except Exception:
+            return None
+
+    def _checar_remoto(self, forcar=False):
+        agora = time.monotonic()
+        if not forcar and agora - self._ultima_checagem < self.intervalo_checagem:
+            return
+        self._ultima_checagem = agora
+        if not forcar and self.compartilhado is not None \
+                and not self.compartilhado.reservar("fingerprint", self.intervalo_checagem):
+            # Outro processo já checou neste intervalo; a mudança chega pelas versões
+            self._fingerprint = self.compartilhado.meta("fingerprint") or self._fingerprint
+            return
+        fingerprint = self._fingerprint_remoto()
+        if fingerprint is None:
+            return
+        anterior = self._fingerprint
+        if self.compartilhado is not None:
+            anterior = self.compartilhado.trocar("fingerprint", fingerprint)
+        # O modifiedTime é da planilha inteira: alteração externa invalida todas as abas
+        if anterior is not None and fingerprint != anterior:
+            self._snapshots.clear()
+            if self.compartilhado is not None:
+                self.compartilhado.descartar()
+        self._fingerprint = fingerprint
+
+    def _expirado(self, snap):
+        if self._fingerprint is not None:
+            return False
+        return time.monotonic() - snap["lido_em"] > self.ttl_sem_fingerprint
+
+    def _sincronizar(self, aba, forcar=False):
+        # Outro processo publicou a aba (escrita ou download novo): o snapshot local ficou velho
+        if self.compartilhado is None:
+            return
+        agora = time.monotonic()
+        if not forcar and agora - self._consultado_em.get(aba, 0.0) < self.intervalo_consulta:
+            return
+        self._consultado_em[aba] = agora
+        snap = self._snapshots.get(aba)
+        if snap is not None and snap["compartilhada"] != self.compartilhado.versao(aba):
+            del self._snapshots[aba]
+            self._versoes[aba] = self._versoes.get(aba, 0) + 1
+
+    def versao(self, aba):
+        if self.compartilhado is not None:
+            with self._lock:
+                self._sincronizar(aba)
+        return self._versoes.get(aba, 0)
+
+    def _ler_planilha(self, aba):
+        # gspread só chega junto com a conexão (o app desenha o menu antes)
+        from gspread.exceptions import WorksheetNotFound
+        inicio = time.perf_counter()
+        try:
+            df = self.conn.read(worksheet=aba, ttl=0)
+        except WorksheetNotFound:
+            # Aba nova (ex.: Recorrencias) ainda não criada: começa vazia e é criada na primeira escrita
+            df = pd.DataFrame()
+        registrar_io("leitura", aba, len(df), df, inicio)
+        return df
+
+    def _baixar(self, aba):
+        """Snapshot novo da aba, lido da planilha ou do armazém compartilhado.
+
+        Com vários processos, só o primeiro que pede a aba a baixa; os demais
+        esperam a trava e recebem o que ele publicou.
+        """
+        if self.compartilhado is None:
+            return {"df": self._ler_planilha(aba), "lido_em": time.monotonic(), "compartilhada": None}
+        with self.compartilhado.travar(f"leitura:{aba}"):
+            versao, df, idade = self.compartilhado.obter(aba)
+            if df is None or (self._fingerprint is None and idade > self.ttl_sem_fingerprint):
+                lido = self._ler_planilha(aba)
+                nova = self.compartilhado.publicar(aba, lido, versao)
+                if nova is not None:
+                    versao, df, idade = nova, lido, 0.0
+                else:
+                    # Uma escrita foi publicada durante o download e vale mais que o lido
+                    versao, df, idade = self.compartilhado.obter(aba)
+                    if df is None:
+                        df, idade = lido, 0.0
+        return {"df": df, "lido_em": time.monotonic() - idade, "compartilhada": versao}
+
+    def _publicar(self, aba, snap):
+        # Os outros processos passam a ver a nossa escrita sem baixar a aba
+        if self.compartilhado is None:
+            return
+        nova = self.compartilhado.publicar(aba, snap["df"], snap["compartilhada"], time.monotonic() - snap["lido_em"])
+        if nova is None:
+            # Outro processo publicou no meio do caminho: todos baixam a aba de novo
+            self.compartilhado.descartar([aba])
+            self._snapshots.pop(aba, None)
+        else:
+            snap["compartilhada"] = nova
+
+    def _snapshot(self, aba):
+        snap = self._snapshots.get(aba)
+        if snap is None or self._expirado(snap):
+            snap = self._baixar(aba)
+            self._versoes[aba] = self._versoes.get(aba, 0) + 1
+            self._snapshots[aba] = snap
+        return snap
+
+    def _valido(self, aba):
+        snap = self._snapshots.get(aba)
+        return snap if snap is not None and not self._expirado(snap) else None
+
+    def ler(self, aba):
+        """Cópia do snapshot da aba, baixando-a se preciso.
+
+        O download roda fora do lock geral (só com o lock da própria aba), então
+        abas diferentes podem ser lidas em paralelo por várias threads.
+        """
+        with self._lock:
+            self._checar_remoto()
+            self._sincronizar(aba)
+            snap = self._valido(aba)
+            if snap is not None:
+                return snap["df"].copy()
+            trava = self._travas.setdefault(aba, threading.Lock())
+        with trava:
+            with self._lock:
+                # Outra thread pode ter baixado a aba enquanto esperávamos
+                snap = self._valido(aba)
+                if snap is not None:
+                    return snap["df"].copy()
+                versao_inicial = self._versoes.get(aba, 0)
+            snap = self._baixar(aba)
+            with self._lock:
+                if self._versoes.get(aba, 0) != versao_inicial:
+                    # Uma escrita nossa mudou a aba durante o download: o lido já está velho
+                    return self.ler(aba)
+                self._versoes[aba] = versao_inicial + 1
+                self._snapshots[aba] = snap
+                return snap["df"].copy()
+
+    def _renovar_fingerprint(self):
+        # Após uma escrita nossa, adota o novo modifiedTime sem invalidar as demais abas
+        fingerprint = self._fingerprint_remoto()
+        if fingerprint is not None:
+            self._fingerprint = fingerprint
+            self._ultima_checagem = time.monotonic()
+            if self.compartilhado is not None:
+                self.compartilhado.trocar("fingerprint", fingerprint)
+
+    def invalidar(self, aba):
+        # Chamado após reescrevermos a aba inteira: só ela é baixada de novo
+        with self._lock:
+            self._snapshots.pop(aba, None)
+            self._referencias.pop(aba, None)
+            self._versoes[aba] = self._versoes.get(aba, 0) + 1
+            if self.compartilhado is not None:
+                self.compartilhado.descartar([aba])
+            self._renovar_fingerprint()
+
+    def _posicoes(self, aba, df, chaves):
+        coluna = CHAVES.get(aba)
+        if not chaves:
+            return {}, []
+        if coluna is None:
+            posicoes = {int(c): int(c) for c in chaves if 0 <= int(c) < len(df)}
+        elif coluna not in df.columns:
+            # Aba vazia (sem cabeçalho): nenhuma chave existe ainda
+            posicoes = {}
+        else:
+            indice = {normalizar_chave(v): pos for pos, v in enumerate(df[coluna])}
+            posicoes = {c: indice[normalizar_chave(c)] for c in chaves if normalizar_chave(c) in indice}
+        faltando = [c for c in chaves if c not in posicoes]
+        return posicoes, faltando
+
+    def _recarregar(self, aba):
+        # Snapshot desatualizado: baixa a aba de novo
+        self._snapshots.pop(aba, None)
+        if self.compartilhado is not None:
+            self.compartilhado.descartar([aba])
+        return self._snapshot(aba)
+
+    def _linhas_atuais(self, pedidos):
+        """Linhas pedidas ((aba, linha da planilha)) como estão agora, numa única values.batchGet."""
+        if self._planilha is None:
+            self._planilha = self.conn.client._open_spreadsheet()
+        inicio = time.perf_counter()
+        resposta = self._planilha.values_batch_get(
+            [f"'{aba}'!{linha}:{linha}" for aba, linha in pedidos],
+            params={"valueRenderOption": "UNFORMATTED_VALUE", "dateTimeRenderOption": "FORMATTED_STRING"},
+        )
+        faixas = resposta.get("valueRanges", [])
+        registrar_io("conferencia", ",".join(sorted({aba for aba, _ in pedidos})), len(pedidos), faixas, inicio)
+        return {pedido: (faixa.get("values") or [[]])[0] for pedido, faixa in zip(pedidos, faixas)}
+
+    def aplicar(self, anexos, alteracoes, condicoes=None):
+        """Grava inclusões e alterações de células de várias abas.
+
+        A aba não precisa estar em dia: o cabeçalho e as linhas alteradas são
+        lidos da planilha (uma values.batchGet para todas as abas), conferidos
+        pela chave e mesclados com o que a tela leu (concorrencia.mesclar). Um
+        ConflitoEscrita interrompe o lote antes de qualquer gravação. Alterações
+        sem condição sobre um snapshot confirmado pelo fingerprint dispensam
+        essa leitura, como antes das versões por linha.
+
+        As alterações de todas as abas vão numa única chamada values.batchUpdate;
+        as inclusões usam values.append (uma chamada por aba), que é seguro mesmo
+        se outra pessoa acrescentou linhas nesse meio tempo.
+        """
+        from gspread.exceptions import WorksheetNotFound
+        from gspread.utils import rowcol_to_a1
+
+        from concorrencia import (ABAS_VERSIONADAS, COLUNA_VERSAO, IDENTIDADE, ConflitoEscrita, mesclar, mesmo,
+                                  realocar)
+        condicoes = condicoes or {}
+        with self._lock:
+            abas = set(anexos) | set(alteracoes)
+            # As posições vêm do snapshot que já temos, mesmo que uma escrita de fora o tenha
+            # deixado velho (as linhas são conferidas abaixo); sem baixar a aba de novo
+            usados = {aba: self._snapshots.get(aba) or self._referencias.get(aba) for aba in abas}
+            self._checar_remoto(forcar=True)
+            for aba in abas:
+                self._sincronizar(aba, forcar=True)
+
+            def campos_gravados(aba):
+                alteradas = alteracoes.get(aba, {})
+                campos = {c for r in anexos.get(aba, []) for c in r} | {c for a in alteradas.values() for c in a}
+                return campos | ({COLUNA_VERSAO} if alteradas and aba in ABAS_VERSIONADAS else set())
+
+            def localizar(aba, snap):
+                df = snap["df"]
+                posicoes, faltando = self._posicoes(aba, df, alteracoes.get(aba, {}))
+                if CHAVES.get(aba) is None:
+                    # Tarefas: a linha pode ter andado (arquivamento); as colunas de identidade a acham
+                    por_linha = condicoes.get(aba, {})
+                    posicoes = {c: realocar(aba, df, posicoes.get(int(c), -1), por_linha.get(c))
+                                for c in alteracoes.get(aba, {})}
+                    faltando = [c for c, pos in posicoes.items() if not 0 <= pos < len(df)]
+                    posicoes = {c: pos for c, pos in posicoes.items() if c not in faltando}
+                if faltando:
+                    raise KeyError(f"{aba}: registros não encontrados {faltando}")
+                return snap, posicoes
+
+            alvos, reescritas, atuais = {}, set(), {}
+            for aba in abas:
+                snap = usados[aba] or self._snapshot(aba)
+                df = snap["df"]
+                if (df.empty or not campos_gravados(aba) <= set(df.columns)
+                        or self._posicoes(aba, df, alteracoes.get(aba, {}))[1]):
+                    # Snapshot sem a coluna ou a chave (criada depois dele): baixa a aba de novo
+                    snap = self._recarregar(aba)
+                    if snap["df"].empty or not campos_gravados(aba) <= set(snap["df"].columns):
+                        # Aba vazia ou coluna nova: o cabeçalho muda e a aba é reescrita inteira
+                        reescritas.add(aba)
+                alvos[aba] = localizar(aba, snap)
+                if aba in reescritas:
+                    # Leitura nova: as linhas atuais já estão nela
+                    _, posicoes = alvos[aba]
+                    for chave, pos in posicoes.items():
+                        atuais[(aba, chave)] = snap["df"].iloc[pos].to_dict()
+
+            def conferir_na_planilha(aba):
+                # Alteração com condição é mesclada com a linha como está agora; sem condição, o
+                # snapshot basta se a checagem do fingerprint acabou de confirmar que ele está em dia
+                if aba in reescritas or not alteracoes.get(aba):
+                    return False
+                em_dia = self._fingerprint is not None and self._snapshots.get(aba) is alvos[aba][0]
+                return not em_dia or any(condicoes.get(aba, {}).get(c) is not None for c in alteracoes[aba])
+
+            # Cabeçalho e linhas-alvo como estão agora na planilha
+            conferir = [aba for aba in abas if conferir_na_planilha(aba)]
+            for aba in abas - reescritas - set(conferir):
+                snap, posicoes = alvos[aba]
+                linhas = snap["df"].iloc[list(posicoes.values())].to_dict("records")
+                atuais.update(((aba, chave), linha) for chave, linha in zip(posicoes, linhas))
+            pedidos = [(aba, linha) for aba in conferir for linha in [1] + [p + 2 for p in alvos[aba][1].values()]]
+            linhas = self._linhas_atuais(pedidos) if pedidos else {}
+            for aba in conferir:
+                snap, posicoes = alvos[aba]
+                cabecalho = [str(c) for c in linhas[(aba, 1)]]
+                coluna = CHAVES.get(aba)
+                lidas = {}
+                for chave, pos in posicoes.items():
+                    valores = list(linhas[(aba, pos + 2)])
+                    lidas[chave] = dict(zip(cabecalho, valores + [""] * (len(cabecalho) - len(valores))))
+
+                def trocada(chave, linha):
+                    if coluna is not None:
+                        return normalizar_chave(linha.get(coluna)) != normalizar_chave(chave)
+                    base = (condicoes.get(aba, {}).get(chave) or {}).get("campos", {})
+                    return any(c in base and not mesmo(aba, c, linha.get(c), base[c]) for c in IDENTIDADE.get(aba, []))
+
+                deslocada = any(trocada(chave, linha) for chave, linha in lidas.items())
+                colunas = list(snap["df"].columns)
+                fora_do_lugar = any(c not in cabecalho or cabecalho.index(c) != colunas.index(c)
+                                    for c in campos_gravados(aba) | ({coluna} if coluna else set()))
+                if fora_do_lugar or deslocada:
+                    # Colunas ou linhas mudaram de lugar na planilha: vale uma leitura nova da aba
+                    snap, posicoes = alvos[aba] = localizar(aba, self._recarregar(aba))
+                    if not campos_gravados(aba) <= set(snap["df"].columns):
+                        reescritas.add(aba)
+                    lidas = {chave: snap["df"].iloc[pos].to_dict() for chave, pos in posicoes.items()}
+                for chave, linha in lidas.items():
+                    atuais[(aba, chave)] = linha
+
+            finais = {}
+            try:
+                for aba in abas:
+                    for chave, campos in alteracoes.get(aba, {}).items():
+                        finais.setdefault(aba, {})[chave] = mesclar(aba, chave, atuais[(aba, chave)], campos,
+                                                                   condicoes.get(aba, {}).get(chave))
+            except ConflitoEscrita as conflito:
+                # Nada foi gravado; quem relê a aba passa a ver a linha como os outros a deixaram
+                self._recarregar(conflito.aba)
+                raise
+
+            dados, inclusoes = [], {}
+            for aba in abas - reescritas:
+                snap, posicoes = alvos[aba]
+                cabecalho = list(snap["df"].columns)
+                for chave, campos in finais.get(aba, {}).items():
+                    linha = posicoes[chave] + 2
+                    for campo, valor in campos.items():
+                        celula = rowcol_to_a1(linha, cabecalho.index(campo) + 1)
+                        dados.append({"range": f"'{aba}'!{celula}", "values": [[valor_celula(valor)]]})
+                novos = anexos.get(aba, [])
+                if novos:
+                    inclusoes[aba] = [[valor_celula(r.get(c)) for c in cabecalho] for r in novos]
+
+            if (dados or inclusoes) and self._planilha is None:
+                self._planilha = self.conn.client._open_spreadsheet()
+            planilha = self._planilha
+            if dados:
+                inicio = time.perf_counter()
+                planilha.values_batch_update(body={"valueInputOption": "USER_ENTERED", "data": dados})
+                registrar_io("celulas", ",".join(sorted(finais)), len(dados), dados, inicio)
+            for aba, linhas in inclusoes.items():
+                inicio = time.perf_counter()
+                planilha.values_append(
+                    f"'{aba}'!A1",
+                    params={"valueInputOption": "USER_ENTERED", "insertDataOption": "INSERT_ROWS"},
+                    body={"values": linhas},
+                )
+                registrar_io("inclusao", aba, len(linhas), linhas, inicio)
+
+            # Reflete a escrita no snapshot local, sem baixar a aba de novo
+            for aba in abas:
+                snap, posicoes = alvos[aba]
+                df = snap["df"]
+                # Uma atribuição por coluna, não por célula
+                por_coluna = {}
+                for chave, campos in finais.get(aba, {}).items():
+                    for campo, valor in campos.items():
+                        por_coluna.setdefault(campo, {})[posicoes[chave]] = valor_celula(valor)
+                for campo, valores in por_coluna.items():
+                    if campo not in df.columns:
+                        df[campo] = ""
+                    atribuir_celula(df, list(valores), campo, list(valores.values()))
+                novos = anexos.get(aba, [])
+                if novos:
+                    linhas = pd.DataFrame([{c: valor_celula(v) for c, v in r.items()} for r in novos])
+                    df = pd.concat([df, linhas], ignore_index=True)
+                if aba in reescritas:
+                    inicio = time.perf_counter()
+                    try:
+                        self.conn.update(worksheet=aba, data=df)
+                    except WorksheetNotFound:
+                        self.conn.create(worksheet=aba, data=df)
+                    registrar_io("reescrita", aba, len(df), df, inicio)
+                snap["df"] = df
+                self._referencias[aba] = snap
+                self._versoes[aba] = self._versoes.get(aba, 0) + 1
+                # Se uma escrita de fora descartou o snapshot, a próxima leitura baixa a aba
+                if self._snapshots.get(aba) is snap:
+                    self._publicar(aba, snap)
+            self._renovar_fingerprint()
+
+    def remover(self, aba, linhas):
+        """Apaga da planilha as linhas (registros como lidos) que continuam iguais; devolve quantas.
+
+        A aba é lida de novo aqui dentro e cada linha é conferida campo a campo
+        (concorrencia.linhas_iguais): uma linha alterada depois da leitura fica,
+        e as incluídas nesse meio tempo não são tocadas. As linhas saem numa
+        única chamada batchUpdate (deleteDimension), de baixo para cima.
+        """
+        from concorrencia import linhas_iguais
+        with self._lock:
+            self._checar_remoto(forcar=True)
+            snap = self._recarregar(aba)
+            posicoes = linhas_iguais(aba, snap["df"], linhas)
+            if not posicoes:
+                return 0
+            # Linha 0 da planilha é o cabeçalho; linhas seguidas saem numa faixa só
+            faixas = []
+            for pos in posicoes:
+                if faixas and faixas[-1][1] == pos + 1:
+                    faixas[-1][1] = pos + 2
+                else:
+                    faixas.append([pos + 1, pos + 2])
+            if self._planilha is None:
+                self._planilha = self.conn.client._open_spreadsheet()
+            id_aba = self._planilha.worksheet(aba).id
+            pedidos = [{"deleteDimension": {"range": {"sheetId": id_aba, "dimension": "ROWS",
+                                                      "startIndex": ini, "endIndex": fim}}}
+                       for ini, fim in reversed(faixas)]
+            inicio = time.perf_counter()
+            self._planilha.batch_update({"requests": pedidos})
+            registrar_io("remocao", aba, len(posicoes), pedidos, inicio)
+
+            df = snap["df"]
+            snap["df"] = df.drop(df.index[posicoes]).reset_index(drop=True)
+            self._referencias[aba] = snap
+            self._versoes[aba] = self._versoes.get(aba, 0) + 1
+            if self._snapshots.get(aba) is snap:
+                self._publicar(aba, snap)
+            self._renovar_fingerprint()
+            return len(posicoes)
@@ -0,0 +1,186 @@
+"""Lote noturno: KPIs, agregados e relatórios calculados fora do Streamlit.
+
+Lê as abas (e o arquivo) como o app, calcula o que os dashboards mostram e
+grava tudo na pasta PRECALCULO. O app usa um resultado gravado enquanto a
+assinatura das abas de que ele depende (conteúdo + partições arquivadas) for
+a mesma; qualquer escrita depois do lote muda a assinatura e o app volta a
+calcular como sempre.
+
+Uso (na raiz do projeto, com o mesmo .streamlit/secrets.toml do app):
+    python -m precalculo
+    python -m precalculo --pasta /var/cache/engenharia360 --sem-pdfs
+
+No cron (todo dia às 5h):
+    0 5 * * * cd /srv/sistema-gestao-projetos && python -m precalculo >> precalculo.log 2>&1
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+# --- PARÂMETROS ---
+PASTA_PRECALCULO = os.environ.get("PRECALCULO", "precalculado")
+# Abas que o Dash Financeiro lê com o histórico arquivado
+ABAS_HISTORICO = ["Projetos", "Tarefas", "Financeiro", "Despesas"]
+COLUNAS_LISTAS = ["Cliente", "Descricao", "Fase", "Responsavel", "Data_Deadline", "Status"]
+
+
+# --- ASSINATURAS E ARQUIVOS ---
+def assinatura(df, anos_arquivados=()):
+    """Impressão digital do conteúdo de uma aba como lida da planilha (e das partições arquivadas)."""
+    h = hashlib.sha256(json.dumps([list(map(str, df.columns)), list(anos_arquivados)]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+def _caminho(pasta, nome):
+    return os.path.join(pasta, f"{nome}.pkl")
+
+def gravar(nome, valor, assinaturas, hoje=None, pasta=PASTA_PRECALCULO):
+    """Grava valor com as assinaturas das abas usadas (e o dia, se o resultado depende dele)."""
+    os.makedirs(pasta, exist_ok=True)
+    cabecalho = {"assinaturas": assinaturas, "hoje": None if hoje is None else str(pd.Timestamp(hoje).date()),
+                 "gerado_em": time.time()}
+    temporario = _caminho(pasta, nome) + ".tmp"
+    with open(temporario, "wb") as f:
+        # Cabeçalho separado: quem só confere a assinatura não desempacota o valor
+        pickle.dump(cabecalho, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(valor, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporario, _caminho(pasta, nome))
+
+def ler(nome, assinaturas, hoje=None, pasta=PASTA_PRECALCULO):
+    """Valor gravado pelo lote, ou None se não existe ou não vale mais para estes dados (e este dia)."""
+    try:
+        with open(_caminho(pasta, nome), "rb") as f:
+            cabecalho = pickle.load(f)
+            if cabecalho["assinaturas"] != assinaturas:
+                return None
+            if hoje is not None and cabecalho["hoje"] != str(pd.Timestamp(hoje).date()):
+                return None
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, KeyError):
+        return None
+
+
+# --- LOTE ---
+def _ler_aba(repo, aba):
+    # Mesmo comportamento do load_data do app: aba ausente vira tabela vazia
+    try:
+        return repo.ler(aba)
+    except Exception:
+        return pd.DataFrame()
+
+def _com_cliente(tarefas, df_projetos):
+    clientes = df_projetos.drop_duplicates("ID_Projeto").set_index("ID_Projeto")["Cliente"]
+    lista = tarefas.assign(Cliente=tarefas["ID_Projeto"].map(clientes))
+    return lista[[c for c in COLUNAS_LISTAS if c in lista.columns]].sort_values("Data_Deadline")
+
+def executar(abrir_conexao, pasta=PASTA_PRECALCULO, hoje=None, pdfs=True):
+    """Calcula e grava os resultados dos dashboards; devolve o resumo gravado em kpis.json."""
+    from arquivo import criar_arquivo
+    from capacidade import carga
+    from consolidado import ABAS_CONSOLIDADO, Consolidado
+    from cronograma import preparar_tarefas
+    from esquema import tipar
+    from financas import resumo_vazio
+    from indicadores import eficiencia, kpis_financeiros, kpis_operacionais
+    from recorrencias import expandir, ocorrencias_pagas
+    from repositorio import ABAS, criar_repositorio
+
+    inicio = time.time()
+    hoje = pd.Timestamp(hoje or date.today()).normalize()
+    os.makedirs(pasta, exist_ok=True)
+    repo = criar_repositorio(abrir_conexao)
+    arquivo = criar_arquivo(abrir_conexao)
+    brutas = {aba: _ler_aba(repo, aba) for aba in ABAS}
+    assinaturas = {aba: assinatura(df, arquivo.anos(aba)) for aba, df in brutas.items()}
+    tipadas = {aba: tipar(aba, df) for aba, df in brutas.items()}
+    historico = {aba: tipar(aba, arquivo.com_historico(aba, brutas[aba])) for aba in ABAS_HISTORICO}
+
+    def de(*abas):
+        return {aba: assinaturas[aba] for aba in abas}
+
+    # Dash Operacional (abas de trabalho)
+    kpis = kpis_operacionais(tipadas["Projetos"], tipadas["Tarefas"], hoje)
+    if not kpis["pendentes"].empty:
+        gravar("tarefas_gantt", preparar_tarefas(kpis["pendentes"], tipadas["Projetos"]),
+               de("Tarefas", "Projetos"), pasta=pasta)
+        gravar("carga", carga(tipadas["Tarefas"], hoje), de("Tarefas"), hoje, pasta=pasta)
+    for lista in ("atrasadas", "urgentes"):
+        _com_cliente(kpis[lista], tipadas["Projetos"]).to_csv(os.path.join(pasta, f"{lista}.csv"), index=False)
+
+    # Dash Financeiro (todos os anos): consolidado com as consultas das telas já feitas
+    cons = Consolidado()
+    cons.montar(historico["Financeiro"], historico["Despesas"], historico["Projetos"], None)
+    for ano in cons.anos():
+        cons.resumo(ano)
+        cons.por_dimensao(ano, "Origem")
+        cons.por_dimensao(ano, "Tipo")
+        cons.por_dimensao(ano, "Categoria", fluxo="Saída")
+    cons.comparativo_anual()
+    cons.ultimos_12_meses(hoje.date())
+    gravar("consolidado", cons, de(*ABAS_CONSOLIDADO), pasta=pasta)
+    gravar("eficiencia", eficiencia(historico["Projetos"], historico["Tarefas"]), de("Projetos", "Tarefas"),
+           pasta=pasta)
+
+    ano = hoje.year
+    regras = tipadas["Recorrencias"]
+    previstas = expandir(regras if not regras.empty else None, f"{ano}-01-01", f"{ano}-12-31", historico["Projetos"],
+                         ocorrencias_pagas(historico["Financeiro"], historico["Despesas"]))
+    financeiro = kpis_financeiros(cons.resumo(ano) if not cons.tabela.empty else resumo_vazio(), previstas)
+
+    # Relatórios de status dos projetos ativos (o app acha cada PDF pelo hash do conteúdo)
+    arquivos = {}
+    if pdfs and not kpis["proj_ativos"].empty:
+        import relatorios
+        pasta_pdfs = os.path.join(pasta, "pdfs")
+        arquivos = relatorios.gerar_pdfs_lote(kpis["proj_ativos"], tipadas["Tarefas"], gravar_em=pasta_pdfs)
+        with open(os.path.join(pasta, "Status_Projetos.zip"), "wb") as f:
+            f.write(relatorios.compactar_zip(arquivos))
+        # PDFs de conteúdo que não existe mais (o lote regravou todos os atuais)
+        for nome in os.listdir(pasta_pdfs):
+            caminho = os.path.join(pasta_pdfs, nome)
+            if os.path.getmtime(caminho) < inicio:
+                os.remove(caminho)
+
+    resumo = {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "hoje": str(hoje.date()),
+        "segundos": round(time.time() - inicio, 2),
+        "operacional": {"projetos_ativos": len(kpis["proj_ativos"]), "pendentes": len(kpis["pendentes"]),
+                        "atrasadas": len(kpis["atrasadas"]), "urgentes": len(kpis["urgentes"])},
+        "financeiro": {"ano": ano, **{chave: round(float(valor), 2) for chave, valor in financeiro.items()}},
+        "pdfs": len(arquivos),
+    }
+    with open(os.path.join(pasta, "kpis.json"), "w", encoding="utf-8") as f:
+        json.dump(resumo, f, ensure_ascii=False, indent=2)
+    return resumo
+
+
+# --- LINHA DE COMANDO ---
+def abrir_conexao():
+    # A mesma conexão do app (lê .streamlit/secrets.toml), sem servidor do Streamlit
+    import streamlit as st
+    from streamlit_gsheets import GSheetsConnection
+    return st.connection("gsheets", type=GSheetsConnection)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pré-calcula KPIs, agregados e relatórios dos dashboards.")
+    parser.add_argument("--pasta", default=PASTA_PRECALCULO,
+                        help="onde gravar (a mesma da variável PRECALCULO do app)")
+    parser.add_argument("--hoje", help="data de referência AAAA-MM-DD (padrão: hoje)")
+    parser.add_argument("--sem-pdfs", action="store_true", help="não gera os relatórios de status")
+    args = parser.parse_args(argv)
+
+    resumo = executar(abrir_conexao, args.pasta, args.hoje, pdfs=not args.sem_pdfs)
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
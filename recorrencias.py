@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+# --- REGRAS ---
+# Uma linha da aba Recorrencias descreve uma série inteira:
+#   Despesa: Valor a cada Frequencia, a partir de Inicio (Ocorrencias = 0: sem fim)
+#   Parcelamento: Valor total (0 = Proposta_Aceita_R$ do projeto) em Ocorrencias
+#                 parcelas, a primeira com Entrada_Pct % do total
+# As ocorrências só viram linhas em Despesas/Financeiro quando são pagas, com
+# Recorrencia = "<ID_Recorrencia>/<n>"; as demais são geradas na hora, só para o
+# período que a tela pede.
+MESES = {"Mensal": 1, "Trimestral": 3, "Anual": 12}
+COLUNAS = ["Recorrencia", "ID_Recorrencia", "N", "Ocorrencias", "Tipo", "Fluxo", "Descricao", "Categoria",
+           "ID_Projeto", "Valor", "Vencimento"]
+# Ocorrência paga adiantada fica na partição arquivada do ano do pagamento, que
+# pode ser anterior ao do vencimento (no máximo este número de anos)
+ANTECEDENCIA_ANOS = 1
+
+
+def chave(id_recorrencia, n):
+    return f"{int(id_recorrencia)}/{int(n)}"
+
+def ocorrencias_pagas(*dfs):
+    """Chaves das ocorrências que já têm linha própria (em qualquer das abas)."""
+    return {v for df in dfs if df is not None and "Recorrencia" in df.columns
+            for v in df["Recorrencia"].dropna().astype(str) if v.strip()}
+
+def anos_com_pagas(anos, inicio):
+    """Partições arquivadas (anos) que podem ter ocorrências pagas com vencimento a partir de inicio."""
+    return tuple(ano for ano in anos if ano >= pd.Timestamp(inicio).year - ANTECEDENCIA_ANOS)
+
+def _mes(datas):
+    return datas.dt.year.to_numpy() * 12 + datas.dt.month.to_numpy() - 1
+
+def _totais(regras, df_projetos):
+    # Parcelamento com Valor 0 acompanha a proposta atual do projeto
+    total = regras["Valor"].astype("float64")
+    if df_projetos is not None and not df_projetos.empty:
+        proposta = df_projetos.drop_duplicates("ID_Projeto").set_index("ID_Projeto")["Proposta_Aceita_R$"]
+        total = total.where(total > 0, regras["ID_Projeto"].map(proposta).astype("float64"))
+    return total.fillna(0.0)
+
+def expandir(regras, inicio, fim, df_projetos=None, pagas=()):
+    """Ocorrências das regras com vencimento em [inicio, fim] que ainda não foram pagas.
+
+    Só a janela pedida é gerada: uma despesa mensal sem fim custa o número de
+    meses da janela, não o de meses desde o início da regra.
+    """
+    if regras is None or regras.empty:
+        return pd.DataFrame(columns=COLUNAS)
+    regras = regras[regras["Inicio"].notna() & regras["ID_Recorrencia"].notna()].reset_index(drop=True)
+    regras = regras[regras["Frequencia"].astype(object).isin(list(MESES))].reset_index(drop=True)
+    parcelamento = (regras["Tipo"] == "Parcelamento").to_numpy()
+    quantidade = regras["Ocorrencias"].fillna(0).astype(int).to_numpy()
+    # Parcelamento precisa de um número de parcelas; sem ele a regra não gera nada
+    regras = regras[~parcelamento | (quantidade > 0)].reset_index(drop=True)
+    if regras.empty:
+        return pd.DataFrame(columns=COLUNAS)
+    parcelamento = (regras["Tipo"] == "Parcelamento").to_numpy()
+    quantidade = regras["Ocorrencias"].fillna(0).astype(int).to_numpy()
+    inicio, fim = pd.Timestamp(inicio), pd.Timestamp(fim)
+
+    # Intervalo de n (número da ocorrência) que cai nos meses da janela, por regra
+    passo = regras["Frequencia"].astype(object).map(MESES).to_numpy()
+    mes0 = _mes(regras["Inicio"])
+    mes_ini, mes_fim = inicio.year * 12 + inicio.month - 1, fim.year * 12 + fim.month - 1
+    n_ini = np.maximum(0, -((mes0 - mes_ini) // passo))
+    n_fim = (mes_fim - mes0) // passo
+    n_fim = np.where(quantidade > 0, np.minimum(n_fim, quantidade - 1), n_fim)
+    tem_fim = regras["Fim"].notna().to_numpy()
+    if tem_fim.any():
+        n_fim = np.where(tem_fim, np.minimum(n_fim, (_mes(regras["Fim"].fillna(fim)) - mes0) // passo), n_fim)
+    contagem = np.maximum(n_fim - n_ini + 1, 0)
+    if contagem.sum() == 0:
+        return pd.DataFrame(columns=COLUNAS)
+
+    # Uma linha por ocorrência, sem laço por regra
+    linha = np.repeat(np.arange(len(regras)), contagem)
+    n = np.repeat(n_ini, contagem) + np.arange(contagem.sum()) - np.repeat(np.cumsum(contagem) - contagem, contagem)
+    meses = mes0[linha] + n * passo[linha]
+    primeiro = pd.to_datetime(pd.DataFrame({"year": meses // 12, "month": meses % 12 + 1, "day": 1}))
+    # Dia 31 numa série mensal cai no último dia dos meses mais curtos
+    dia = np.minimum(regras["Inicio"].dt.day.to_numpy()[linha], primeiro.dt.days_in_month.to_numpy())
+    vencimento = primeiro + pd.to_timedelta(dia - 1, unit="D")
+
+    total = _totais(regras, df_projetos).to_numpy()[linha]
+    qtd = quantidade[linha]
+    # Parcela única leva o total, com ou sem entrada
+    pct = np.where(qtd > 1, regras["Entrada_Pct"].fillna(0).to_numpy()[linha] / 100, 0.0)
+    entrada = np.round(total * pct, 2)
+    # Com entrada: n=0 é a entrada e o restante se divide nas demais; sem: tudo em partes iguais
+    resto, partes = np.where(pct > 0, total - entrada, total), np.where(pct > 0, qtd - 1, qtd)
+    parcela = np.round(resto / np.maximum(partes, 1), 2)
+    # A última parcela absorve os centavos do arredondamento
+    ultima = np.round(resto - parcela * (partes - 1), 2)
+    valor_parcela = np.where((pct > 0) & (n == 0), entrada, np.where(n == qtd - 1, ultima, parcela))
+    valor = np.where(parcelamento[linha], valor_parcela, regras["Valor"].to_numpy(dtype="float64")[linha])
+
+    tipo = regras["Tipo"].astype(object).to_numpy()[linha]
+    ids = regras["ID_Recorrencia"].to_numpy(dtype="int64")[linha]
+    ocorrencias = pd.DataFrame({
+        # Mesmo formato de chave()
+        "Recorrencia": pd.Series(ids).astype(str) + "/" + pd.Series(n).astype(str),
+        "ID_Recorrencia": ids,
+        "N": n,
+        "Ocorrencias": qtd,
+        "Tipo": tipo,
+        "Fluxo": np.where(tipo == "Parcelamento", "Entrada", "Saída"),
+        "Descricao": regras["Descricao"].to_numpy()[linha],
+        "Categoria": regras["Categoria"].astype(object).to_numpy()[linha],
+        "ID_Projeto": regras["ID_Projeto"].to_numpy()[linha],
+        "Valor": valor,
+        "Vencimento": vencimento.to_numpy(),
+    })
+    fim_regra = regras["Fim"].to_numpy()[linha]
+    dentro = (ocorrencias["Vencimento"] >= inicio) & (ocorrencias["Vencimento"] <= fim)
+    dentro &= ~(pd.notna(fim_regra) & (ocorrencias["Vencimento"].to_numpy() > fim_regra))
+    dentro &= ~ocorrencias["Recorrencia"].isin(pagas)
+    return ocorrencias[dentro].sort_values(["Vencimento", "ID_Recorrencia"], ignore_index=True)
+
+def descricao(ocorrencia):
+    """Texto da linha gravada quando a ocorrência é paga (ex.: "Honorários 2/6", "Contador 03/2026")."""
+    if ocorrencia["Tipo"] == "Parcelamento":
+        return f"{ocorrencia['Descricao']} {int(ocorrencia['N']) + 1}/{int(ocorrencia['Ocorrencias'])}"
+    return f"{ocorrencia['Descricao']} {ocorrencia['Vencimento']:%m/%Y}"
+
+def encerradas(regras, hoje):
+    """Máscara das regras que não geram mais ocorrências a partir de hoje."""
+    if regras.empty:
+        return pd.Series(dtype=bool)
+    hoje = pd.Timestamp(hoje)
+    fim = regras["Fim"].notna() & (regras["Fim"] < hoje)
+    passo = regras["Frequencia"].astype(object).map(MESES).fillna(1)
+    meses_ultima = _mes(regras["Inicio"]) + (regras["Ocorrencias"].fillna(0).to_numpy() - 1) * passo.to_numpy()
+    esgotada = (regras["Ocorrencias"] > 0) & (meses_ultima < hoje.year * 12 + hoje.month - 1)
+    return fim | esgotada
@@ -0,0 +1,165 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from fpdf import FPDF
+
+from precalculo import PASTA_PRECALCULO
+
+# --- PARÂMETROS ---
+# PDFs já renderizados, por hash do conteúdo (projeto + tarefas)
+CACHE_PDF_MAX = 256
+# Gravados pelo lote noturno (precalculo.py) com o mesmo hash no nome
+PASTA_PDFS = os.path.join(PASTA_PRECALCULO, "pdfs")
+# Abaixo disso não compensa subir processos
+MIN_PDFS_PARALELO = 4
+
+_cache_pdfs = OrderedDict()
+
+
+# --- CLASSE PARA GERAR PDF ---
+class PDFRelatorio(FPDF):
+    def header(self):
+        self.set_font('Arial', 'B', 15)
+        self.cell(0, 10, 'Relatório de Status do Projeto', 0, 1, 'C')
+        self.ln(5)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+
+def _renderizar(projeto, tarefas):
+    # Recebe só tipos simples para ser barato de enviar a outro processo
+    pdf = PDFRelatorio()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    pdf.set_fill_color(240, 240, 240)
+    pdf.cell(0, 10, f"Cliente: {projeto['Cliente']}", ln=True, fill=True)
+    pdf.set_font("Arial", size=10)
+    pdf.cell(0, 8, f"Local: {projeto['Cidade']} | Tipo: {projeto['Tipo']}", ln=True)
+    pdf.cell(0, 8, f"Status Atual: {projeto['Status_Geral']}", ln=True)
+    pdf.ln(5)
+    pdf.set_font("Arial", 'B', 11)
+    pdf.cell(0, 10, "Status das Atividades Recentes:", ln=True)
+    pdf.set_font("Arial", size=10)
+
+    if tarefas:
+        for descricao, fase, status_clean in tarefas:
+            marcador = "[OK]" if status_clean == 'Concluído' else "[..]"
+            pdf.cell(15, 8, marcador, 0, 0)
+            pdf.cell(120, 8, f"{descricao} ({fase})", 0, 0)
+            pdf.cell(0, 8, f"{status_clean}", 0, 1)
+    else:
+        pdf.cell(0, 8, "Nenhuma tarefa registrada.", ln=True)
+
+    pdf.ln(10)
+    pdf.set_font("Arial", 'I', 8)
+    pdf.cell(0, 10, "Documento gerado automaticamente pelo Sistema de Gestão.", ln=True)
+    return pdf.output(dest='S').encode('latin-1')
+
+def _renderizar_item(item):
+    return _renderizar(*item)
+
+def _dados_relatorio(projeto_dados, tarefas_proj):
+    projeto = {c: str(projeto_dados[c]) for c in ("Cliente", "Cidade", "Tipo", "Status_Geral")}
+    tarefas = []
+    if not tarefas_proj.empty:
+        ordenadas = tarefas_proj.sort_values(by="Status")
+        tarefas = list(zip(ordenadas["Descricao"].astype(str), ordenadas["Fase"].astype(str),
+                           ordenadas["Status"].astype(str)))
+    return projeto, tarefas
+
+def _chave(projeto, tarefas):
+    return hashlib.sha256(json.dumps([projeto, tarefas], ensure_ascii=False).encode()).hexdigest()
+
+def _guardar(chave, pdf_bytes):
+    _cache_pdfs[chave] = pdf_bytes
+    _cache_pdfs.move_to_end(chave)
+    while len(_cache_pdfs) > CACHE_PDF_MAX:
+        _cache_pdfs.popitem(last=False)
+
+def _pronto(chave):
+    """PDF já renderizado (em memória ou no disco, pelo lote), ou None."""
+    if chave in _cache_pdfs:
+        # Usado agora: vai para o fim da fila de descarte
+        _cache_pdfs.move_to_end(chave)
+        return _cache_pdfs[chave]
+    try:
+        with open(os.path.join(PASTA_PDFS, f"{chave}.pdf"), "rb") as f:
+            pdf_bytes = f.read()
+    except OSError:
+        return None
+    _guardar(chave, pdf_bytes)
+    return pdf_bytes
+
+def _gravar_disco(pasta, chave, pdf_bytes):
+    caminho = os.path.join(pasta, f"{chave}.pdf")
+    with open(caminho + ".tmp", "wb") as f:
+        f.write(pdf_bytes)
+    os.replace(caminho + ".tmp", caminho)
+
+
+# --- RELATÓRIOS ---
+def gerar_pdf_status(projeto_dados, tarefas_proj):
+    projeto, tarefas = _dados_relatorio(projeto_dados, tarefas_proj)
+    chave = _chave(projeto, tarefas)
+    pdf_bytes = _pronto(chave)
+    if pdf_bytes is None:
+        pdf_bytes = _renderizar(projeto, tarefas)
+        _guardar(chave, pdf_bytes)
+    return pdf_bytes
+
+def gerar_pdfs_lote(df_projetos, df_tarefas, processos=None, gravar_em=None):
+    """Gera o PDF de status de cada projeto de df_projetos.
+
+    Relatórios cujo projeto e tarefas não mudaram vêm do cache; os demais
+    são renderizados em paralelo num pool de processos. Com gravar_em (lote
+    noturno), todos os PDFs do lote também são gravados nessa pasta pelo
+    hash do conteúdo. Retorna {nome_do_arquivo: bytes}.
+    """
+    grupos = {id_p: g for id_p, g in df_tarefas.groupby("ID_Projeto")}
+    sem_tarefas = df_tarefas.iloc[0:0]
+    arquivos, faltando, chaves = {}, {}, {}
+    for _, projeto_dados in df_projetos.iterrows():
+        nome = f"Status_{projeto_dados['Cliente']}.pdf"
+        if nome in arquivos or nome in faltando:
+            nome = f"Status_{projeto_dados['Cliente']}_{projeto_dados['ID_Projeto']}.pdf"
+        projeto, tarefas = _dados_relatorio(projeto_dados, grupos.get(projeto_dados["ID_Projeto"], sem_tarefas))
+        chave = chaves[nome] = _chave(projeto, tarefas)
+        pdf_bytes = _pronto(chave)
+        if pdf_bytes is not None:
+            arquivos[nome] = pdf_bytes
+        else:
+            faltando[nome] = (chave, projeto, tarefas)
+
+    itens = [(projeto, tarefas) for _, projeto, tarefas in faltando.values()]
+    if len(itens) < MIN_PDFS_PARALELO:
+        renderizados = [_renderizar_item(item) for item in itens]
+    else:
+        processos = processos or min(len(itens), os.cpu_count() or 1)
+        # spawn: não herda threads nem locks do servidor do Streamlit
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as pool:
+            renderizados = list(pool.map(_renderizar_item, itens, chunksize=max(1, len(itens) // (processos * 4))))
+
+    for (nome, (chave, _, _)), pdf_bytes in zip(faltando.items(), renderizados):
+        _guardar(chave, pdf_bytes)
+        arquivos[nome] = pdf_bytes
+    if gravar_em is not None:
+        os.makedirs(gravar_em, exist_ok=True)
+        for nome, pdf_bytes in arquivos.items():
+            _gravar_disco(gravar_em, chaves[nome], pdf_bytes)
+    return arquivos
+
+def compactar_zip(arquivos):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for nome, conteudo in arquivos.items():
+            zf.writestr(nome, conteudo)
+    return buffer.getvalue()
@@ -0,0 +1,389 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import pandas as pd
+
+from compartilhado import armazem
+from concorrencia import (ABAS_VERSIONADAS, COLUNA_VERSAO, IDENTIDADE, condicao, juntar, linhas_iguais, mesclar,
+                          mesmo, realocar)
+from instrumentacao import registrar_io
+from planilhas import CHAVES, CachePlanilhas, normalizar_chave, valor_celula
+
+# --- CONFIGURAÇÃO ---
+# ARMAZENAMENTO=sheets (padrão) lê e grava direto no Google Sheets.
+# ARMAZENAMENTO=sqlite usa o banco local e mantém a planilha como espelho.
+ABAS = ["Projetos", "Tarefas", "Financeiro", "Despesas", "Recorrencias"]
+CAMINHO_SQLITE = "dados.db"
+INTERVALO_SINCRONIA = 5
+# Colunas consultadas com frequência além da chave primária
+COLUNAS_INDICE = ["ID_Projeto", "Status", "Vencimento"]
+
+
+# --- INTERFACE ---
+class Repositorio(ABC):
+    """Acesso às entidades (abas da planilha), independente de onde os dados moram."""
+
+    @abstractmethod
+    def ler(self, aba):
+        ...
+
+    @abstractmethod
+    def versao(self, aba):
+        ...
+
+    @abstractmethod
+    def aplicar(self, anexos, alteracoes, condicoes=None):
+        """Grava inclusões e alterações; condicoes ({aba: {chave: condição}}) diz
+        o que a tela leu de cada linha alterada (ver concorrencia.mesclar)."""
+        ...
+
+    @abstractmethod
+    def gravar(self, aba, df):
+        ...
+
+    @abstractmethod
+    def remover(self, aba, linhas):
+        """Apaga as linhas (registros como foram lidos) que ninguém alterou desde
+        então; devolve quantas saíram. Linhas alteradas ou incluídas depois ficam."""
+        ...
+
+    def consultar(self, aba, **filtros):
+        df = self.ler(aba)
+        for col, valor in filtros.items():
+            df = df[df[col].map(normalizar_chave) == normalizar_chave(valor)]
+        return df
+
+
+# --- BACKEND GOOGLE SHEETS ---
+class RepositorioSheets(Repositorio):
+    def __init__(self, conn, compartilhado=None):
+        self.conn = conn
+        self.cache = CachePlanilhas(conn, compartilhado=compartilhado)
+
+    def ler(self, aba):
+        return self.cache.ler(aba)
+
+    def versao(self, aba):
+        return self.cache.versao(aba)
+
+    def aplicar(self, anexos, alteracoes, condicoes=None):
+        self.cache.aplicar(anexos, alteracoes, condicoes)
+
+    def gravar(self, aba, df):
+        inicio = time.perf_counter()
+        self.conn.update(worksheet=aba, data=df)
+        registrar_io("reescrita", aba, len(df), df, inicio)
+        self.cache.invalidar(aba)
+
+    def remover(self, aba, linhas):
+        return self.cache.remover(aba, linhas)
+
+
+# --- BACKEND SQLITE LOCAL ---
+def _valor_sql(valor):
+    valor = valor_celula(valor)
+    return None if valor == "" else valor
+
+class RepositorioSQLite(Repositorio):
+    """Banco local com índices; o Google Sheets (espelho) recebe as mesmas
+    mutações em segundo plano e continua acessível para o escritório.
+
+    As mutações ainda não enviadas ficam na tabela _sincronia, então
+    sobrevivem a um reinício do servidor.
+    """
+
+    def __init__(self, caminho=CAMINHO_SQLITE, espelho=None, intervalo_sincronia=INTERVALO_SINCRONIA):
+        self.espelho = espelho
+        self.intervalo_sincronia = intervalo_sincronia
+        self.ultimo_erro = None
+        self._db = sqlite3.connect(caminho, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS _sincronia (id INTEGER PRIMARY KEY, payload TEXT)")
+        self._lock = threading.RLock()
+        self._versoes = {}
+        self._cache = {}
+        self._parar = threading.Event()
+        if espelho is not None:
+            threading.Thread(target=self._laco_sincronia, daemon=True, name="sincronia-sheets").start()
+
+    # Tabelas
+    def _existe(self, aba):
+        sql = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+        return self._db.execute(sql, (aba,)).fetchone() is not None
+
+    def _colunas(self, aba):
+        return [r[1] for r in self._db.execute(f'PRAGMA table_info("{aba}")') if r[1] != "_linha"]
+
+    def _criar_indices(self, aba):
+        chave = CHAVES.get(aba)
+        for col in [chave] + COLUNAS_INDICE:
+            if col and col in self._colunas(aba):
+                self._db.execute(f'CREATE INDEX IF NOT EXISTS "ix_{aba}_{col}" ON "{aba}" ("{col}")')
+
+    def _criar_tabela(self, aba, df):
+        self._db.execute(f'DROP TABLE IF EXISTS "{aba}"')
+        colunas = ", ".join(f'"{c}"' for c in df.columns)
+        self._db.execute(f'CREATE TABLE "{aba}" (_linha INTEGER PRIMARY KEY{", " if colunas else ""}{colunas})')
+        self._inserir(aba, list(df.columns), df.to_dict("records"))
+        self._criar_indices(aba)
+
+    def _inserir(self, aba, colunas, registros):
+        existentes = self._colunas(aba)
+        for col in colunas:
+            if col not in existentes:
+                self._db.execute(f'ALTER TABLE "{aba}" ADD COLUMN "{col}"')
+                existentes.append(col)
+        if not registros:
+            return
+        campos = ", ".join(f'"{c}"' for c in colunas)
+        marcas = ", ".join("?" for _ in colunas)
+        self._db.executemany(f'INSERT INTO "{aba}" ({campos}) VALUES ({marcas})',
+                             [[_valor_sql(r.get(c)) for c in colunas] for r in registros])
+
+    def _garantir(self, aba):
+        if self._existe(aba):
+            return
+        # Primeira execução: importa a aba do espelho (ou cria vazia se offline)
+        df = self.espelho.ler(aba) if self.espelho is not None else pd.DataFrame()
+        self._criar_tabela(aba, df)
+        self._db.commit()
+
+    def importar(self, aba):
+        """Substitui a tabela local pelo conteúdo atual da planilha."""
+        with self._lock:
+            self._criar_tabela(aba, self.espelho.ler(aba))
+            self._db.commit()
+            self._versoes[aba] = self.versao(aba) + 1
+
+    # Leitura
+    def versao(self, aba):
+        return self._versoes.get(aba, 0)
+
+    def ler(self, aba):
+        with self._lock:
+            cache = self._cache.get(aba)
+            if cache is None or cache[0] != self.versao(aba):
+                self._garantir(aba)
+                df = pd.read_sql_query(f'SELECT * FROM "{aba}" ORDER BY _linha', self._db)
+                cache = (self.versao(aba), df.drop(columns="_linha"))
+                self._cache[aba] = cache
+            return cache[1].copy()
+
+    def consultar(self, aba, **filtros):
+        # Usa os índices do SQLite em vez de filtrar a tabela inteira em memória
+        with self._lock:
+            self._garantir(aba)
+            condicoes = " AND ".join(f'"{c}" = ?' for c in filtros) or "1 = 1"
+            df = pd.read_sql_query(f'SELECT * FROM "{aba}" WHERE {condicoes} ORDER BY _linha', self._db,
+                                   params=[_valor_sql(v) for v in filtros.values()])
+            return df.drop(columns="_linha")
+
+    # Escrita
+    def _linha(self, aba, chave):
+        coluna = CHAVES.get(aba)
+        if coluna is None:
+            cursor = self._db.execute(f'SELECT * FROM "{aba}" WHERE _linha = ?', [int(chave) + 1])
+        else:
+            cursor = self._db.execute(f'SELECT * FROM "{aba}" WHERE "{coluna}" = ?', [normalizar_chave(chave)])
+        linha = cursor.fetchone()
+        if linha is None:
+            raise KeyError(f"{aba}: registro não encontrado {chave}")
+        return dict(zip([d[0] for d in cursor.description], linha))
+
+    def _atualizar(self, aba, chave, campos, condicao=None):
+        coluna = CHAVES.get(aba)
+        if coluna is None and condicao is not None:
+            try:
+                linha = self._linha(aba, chave)
+            except KeyError:
+                linha = {}
+            base = condicao["campos"]
+            if any(c in base and not mesmo(aba, c, linha.get(c), base[c]) for c in IDENTIDADE.get(aba, [])):
+                # Tarefas: a linha andou (arquivamento); as colunas de identidade a acham
+                df = pd.read_sql_query(f'SELECT * FROM "{aba}" ORDER BY _linha', self._db).drop(columns="_linha")
+                chave = realocar(aba, df, int(chave), condicao)
+        if aba in ABAS_VERSIONADAS:
+            # O banco local é a fonte: a linha atual vem dele, não da planilha
+            campos = mesclar(aba, chave, self._linha(aba, chave), campos, condicao)
+        self._inserir(aba, list(campos), [])
+        atribuicoes = ", ".join(f'"{c}" = ?' for c in campos)
+        valores = [_valor_sql(v) for v in campos.values()]
+        if coluna is None:
+            # Tarefas: a chave é a posição atual da linha (já realocada acima se o arquivamento a moveu)
+            cursor = self._db.execute(f'UPDATE "{aba}" SET {atribuicoes} WHERE _linha = ?', valores + [int(chave) + 1])
+        else:
+            cursor = self._db.execute(f'UPDATE "{aba}" SET {atribuicoes} WHERE "{coluna}" = ?',
+                                      valores + [normalizar_chave(chave)])
+        if cursor.rowcount == 0:
+            raise KeyError(f"{aba}: registro não encontrado {chave}")
+        return chave, campos
+
+    def aplicar(self, anexos, alteracoes, condicoes=None):
+        condicoes = condicoes or {}
+        with self._lock:
+            abas = set(anexos) | set(alteracoes)
+            try:
+                gravadas = {}
+                for aba in abas:
+                    self._garantir(aba)
+                    registros = anexos.get(aba, [])
+                    colunas = list(dict.fromkeys(c for r in registros for c in r))
+                    self._inserir(aba, colunas, registros)
+                    for chave, campos in alteracoes.get(aba, {}).items():
+                        chave, campos = self._atualizar(aba, chave, campos, condicoes.get(aba, {}).get(chave))
+                        gravadas.setdefault(aba, {})[chave] = campos
+                # O espelho recebe o resultado da mesclagem (e a posição atual da tarefa), com a versão do banco local
+                alteracoes = gravadas
+                if self.espelho is not None:
+                    payload = {
+                        "anexos": {a: [{c: valor_celula(v) for c, v in r.items()} for r in rs] for a, rs in anexos.items()},
+                        "alteracoes": {a: [[valor_celula(k), {c: valor_celula(v) for c, v in cs.items()}]
+                                           for k, cs in alt.items()] for a, alt in alteracoes.items()},
+                    }
+                    self._db.execute("INSERT INTO _sincronia (payload) VALUES (?)", (json.dumps(payload),))
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                raise
+            for aba in abas:
+                self._versoes[aba] = self.versao(aba) + 1
+
+    def gravar(self, aba, df):
+        with self._lock:
+            self._criar_tabela(aba, df)
+            self._db.commit()
+            self._versoes[aba] = self.versao(aba) + 1
+        if self.espelho is not None:
+            self.espelho.gravar(aba, df)
+
+    def remover(self, aba, linhas):
+        with self._lock:
+            self._garantir(aba)
+            df = self.ler(aba)
+            posicoes = linhas_iguais(aba, df, linhas)
+            if not posicoes:
+                return 0
+            try:
+                # Recriada sem as linhas: _linha volta a ser a posição (Tarefas é endereçada por ela)
+                self._criar_tabela(aba, df.drop(df.index[posicoes]).reset_index(drop=True))
+                if self.espelho is not None:
+                    # O espelho confere e apaga as mesmas linhas, na ordem das demais mutações
+                    removidas = [{c: valor_celula(v) for c, v in r.items()}
+                                 for r in df.iloc[posicoes].to_dict("records")]
+                    payload = {"anexos": {}, "alteracoes": {}, "remocoes": {aba: removidas}}
+                    self._db.execute("INSERT INTO _sincronia (payload) VALUES (?)", (json.dumps(payload),))
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                raise
+            self._versoes[aba] = self.versao(aba) + 1
+            return len(posicoes)
+
+    # Sincronia com o Google Sheets
+    def pendentes(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM _sincronia").fetchone()[0]
+
+    def sincronizar(self):
+        """Envia ao espelho, em ordem, as mutações pendentes. Para no primeiro erro."""
+        while True:
+            with self._lock:
+                linha = self._db.execute("SELECT id, payload FROM _sincronia ORDER BY id LIMIT 1").fetchone()
+            if linha is None:
+                return
+            payload = json.loads(linha[1])
+            alteracoes = {a: {k: cs for k, cs in alt} for a, alt in payload["alteracoes"].items()}
+            try:
+                if payload["anexos"] or alteracoes:
+                    self.espelho.aplicar(payload["anexos"], alteracoes)
+                for aba, linhas in payload.get("remocoes", {}).items():
+                    self.espelho.remover(aba, linhas)
+                self.ultimo_erro = None
+            except Exception as erro:
+                self.ultimo_erro = erro
+                return
+            with self._lock:
+                self._db.execute("DELETE FROM _sincronia WHERE id = ?", (linha[0],))
+                self._db.commit()
+
+    def _laco_sincronia(self):
+        while not self._parar.wait(self.intervalo_sincronia):
+            self.sincronizar()
+
+    def fechar(self):
+        self._parar.set()
+        self._db.close()
+
+
+# --- LOTE DE ESCRITAS ---
+class LoteEscrita:
+    """Acumula inclusões e alterações por chave e grava tudo de uma vez.
+
+    Alterações seguidas na mesma linha são mescladas numa só.
+    """
+
+    def __init__(self, destino):
+        self.destino = destino
+        self.anexos = {}
+        self.alteracoes = {}
+        self.condicoes = {}
+
+    def __len__(self):
+        return sum(len(v) for v in self.anexos.values()) + sum(len(v) for v in self.alteracoes.values())
+
+    def anexar(self, aba, registro):
+        registro = dict(registro)
+        if aba in ABAS_VERSIONADAS:
+            registro.setdefault(COLUNA_VERSAO, 1)
+        self.anexos.setdefault(aba, []).append(registro)
+        return self
+
+    def atualizar(self, aba, chave, campos, base=None):
+        """base é a linha como a tela a mostrava: a gravação confere se ninguém
+        mudou os mesmos campos desde então (ver concorrencia.mesclar)."""
+        self.alteracoes.setdefault(aba, {}).setdefault(chave, {}).update(campos)
+        nova = condicao(aba, base, campos)
+        if nova is not None:
+            por_chave = self.condicoes.setdefault(aba, {})
+            por_chave[chave] = juntar(por_chave.get(chave), nova)
+        return self
+
+    def salvar(self):
+        if len(self):
+            self.destino.aplicar(self.anexos, self.alteracoes, self.condicoes)
+        self.anexos, self.alteracoes, self.condicoes = {}, {}, {}
+
+
+def alteracoes_por_linha(original, editado, colunas):
+    """Compara uma grade editada com o original e devolve {índice: {coluna: novo valor}}."""
+    alteracoes = {}
+    for col in colunas:
+        antes, depois = original[col], editado[col].reindex(original.index)
+        if pd.api.types.is_datetime64_any_dtype(antes):
+            # DateColumn devolve datetime.date; a grade veio tipada em datetime64
+            depois = pd.to_datetime(depois, errors="coerce")
+        antes, depois = antes.astype(object), depois.astype(object)
+        mudou = ~((antes == depois) | (antes.isna() & depois.isna()))
+        for idx, valor in depois[mudou].items():
+            alteracoes.setdefault(idx, {})[col] = valor
+    return alteracoes
+
+
+# --- FÁBRICA ---
+def criar_repositorio(abrir_conexao):
+    """Escolhe o backend pelas variáveis de ambiente.
+
+    ARMAZENAMENTO_SQLITE define o arquivo do banco local,
+    ARMAZENAMENTO_ESPELHO=0 desliga a sincronia (uso offline) e
+    CACHE_COMPARTILHADO divide os snapshots do Sheets entre processos.
+    """
+    backend = os.environ.get("ARMAZENAMENTO", "sheets").lower()
+    if backend == "sqlite":
+        espelho = None
+        if os.environ.get("ARMAZENAMENTO_ESPELHO", "1") != "0":
+            espelho = RepositorioSheets(abrir_conexao(), compartilhado=armazem())
+        return RepositorioSQLite(os.environ.get("ARMAZENAMENTO_SQLITE", CAMINHO_SQLITE), espelho=espelho)
+    return RepositorioSheets(abrir_conexao(), compartilhado=armazem())
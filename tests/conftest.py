@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Os módulos do app ficam na raiz do repositório, ao lado de app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.conexao_local import ConexaoLocal  # noqa: E402
+from esquema import ESQUEMAS  # noqa: E402
+
+
+def aba_vazia(aba):
+    return pd.DataFrame(columns=list(ESQUEMAS[aba]))
+
+def planilha(**abas):
+    """ConexaoLocal com todas as abas do esquema; as passadas vêm como listas de dicts."""
+    dados = {aba: aba_vazia(aba) for aba in ESQUEMAS}
+    for aba, linhas in abas.items():
+        dados[aba] = pd.DataFrame(linhas, columns=list(ESQUEMAS[aba])).fillna("")
+    return ConexaoLocal(dados)
+
+
+@pytest.fixture
+def sem_arquivos(tmp_path, monkeypatch):
+    # fila.db, o contador de IDs (sequencias.db) e afins caem numa pasta temporária;
+    # o contador é aberto uma vez por processo, então a instância é zerada para abrir lá
+    import compartilhado
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(compartilhado, "_sequencias", None)
+    return tmp_path
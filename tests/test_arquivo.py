@@ -0,0 +1,228 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from arquivo import Arquivo, ParticoesParquet
+from conftest import planilha
+from esquema import tipar
+from recorrencias import expandir
+from repositorio import RepositorioSheets
+
+HOJE = date(2025, 6, 15)
+
+
+def _projeto(id_projeto, status, cadastro, proposta=12000):
+    return {"ID_Projeto": id_projeto, "Cliente": f"Cliente {id_projeto}", "Status_Geral": status,
+            "Data_Cadastro": cadastro, "Proposta_Aceita_R$": proposta, "Versao": 1}
+
+
+def test_projeto_com_parcelamento_em_vigor_fica_nas_abas_de_trabalho(tmp_path):
+    conn = planilha(
+        Projetos=[_projeto(1, "Concluído", "2023-03-01"), _projeto(2, "Concluído", "2023-04-01")],
+        Recorrencias=[{"ID_Recorrencia": 1, "Tipo": "Parcelamento", "Descricao": "Parcelas", "ID_Projeto": 1,
+                       "Valor": 0, "Entrada_Pct": 0, "Frequencia": "Mensal", "Ocorrencias": 24,
+                       "Inicio": "2024-01-10", "Fim": ""}],
+    )
+    repo = RepositorioSheets(conn)
+    arquivo = Arquivo(ParticoesParquet(str(tmp_path / "arquivo")))
+
+    assert arquivo.arquivar(repo, HOJE) == {"Projetos": 1}
+    projetos = tipar("Projetos", repo.ler("Projetos"))
+    assert projetos["ID_Projeto"].tolist() == [1]
+    assert arquivo.ler("Projetos")["ID_Projeto"].astype(int).tolist() == [2]
+
+    ocorrencias = expandir(tipar("Recorrencias", repo.ler("Recorrencias")), "2025-06-01", "2025-06-30", projetos)
+    assert ocorrencias["Valor"].tolist() == [500.0]
+    assert ocorrencias["ID_Projeto"].tolist() == [1]
+
+
+def test_regra_encerrada_nao_segura_o_projeto(tmp_path):
+    conn = planilha(
+        Projetos=[_projeto(1, "Concluído", "2023-03-01")],
+        Recorrencias=[{"ID_Recorrencia": 1, "Tipo": "Parcelamento", "Descricao": "Parcelas", "ID_Projeto": 1,
+                       "Valor": 0, "Entrada_Pct": 0, "Frequencia": "Mensal", "Ocorrencias": 3,
+                       "Inicio": "2023-03-10", "Fim": ""}],
+    )
+    repo = RepositorioSheets(conn)
+    arquivo = Arquivo(ParticoesParquet(str(tmp_path / "arquivo")))
+
+    assert arquivo.pendentes(repo, HOJE) == {"Projetos": 1}
+    assert arquivo.arquivar(repo, HOJE) == {"Projetos": 1}
+    assert repo.ler("Projetos").empty
+    assert isinstance(arquivo.ler("Projetos"), pd.DataFrame)
+
+
+def _tarefa(id_projeto, descricao, status, conclusao="", horas=1):
+    return {"ID_Projeto": id_projeto, "Descricao": descricao, "Status": status, "Data_Conclusao": conclusao,
+            "Data_Deadline": "2023-05-01", "Horas_Gastas": horas, "Versao": 1}
+
+
+def _base_tarefas():
+    return planilha(
+        Projetos=[_projeto(1, "Ativo", "2023-03-01")],
+        Tarefas=[_tarefa(1, "Planta antiga", "Concluído", "10/05/2023 10:00"),
+                 _tarefa(1, "Cortes", "Em Andamento"),
+                 _tarefa(1, "Fachada antiga", "Concluído", "12/05/2023 10:00")],
+        Financeiro=[{"ID_Lancamento": 1, "ID_Projeto": 1, "Descricao": "Entrada", "Valor": 100,
+                     "Vencimento": "2023-04-01", "Status": "Pago", "Data_Pagamento": "2023-04-02", "Versao": 1},
+                    {"ID_Lancamento": 2, "ID_Projeto": 1, "Descricao": "Final", "Valor": 100,
+                     "Vencimento": "2025-08-01", "Status": "Pendente", "Versao": 1}],
+    )
+
+
+def test_selecao_por_ano_de_encerramento(tmp_path):
+    repo = RepositorioSheets(_base_tarefas())
+    arquivo = Arquivo(ParticoesParquet(str(tmp_path / "arquivo")))
+    assert arquivo.pendentes(repo, HOJE) == {"Tarefas": 2, "Financeiro": 1}
+    assert arquivo.pendentes(repo, date(2023, 12, 31)) == {}
+
+
+class _Concorrente(RepositorioSheets):
+    """Outra sessão grava direto na planilha entre a seleção e a remoção."""
+
+    def __init__(self, conn, mexer):
+        super().__init__(conn)
+        self.mexer = mexer
+
+    def remover(self, aba, linhas):
+        self.mexer(self.conn, aba)
+        return super().remover(aba, linhas)
+
+
+def test_remocao_preserva_o_que_mudou_depois_da_leitura(tmp_path):
+    def mexer(conn, aba):
+        if aba != "Tarefas":
+            return
+        df = conn.abas["Tarefas"]
+        df.loc[2, "Horas_Gastas"] = 5
+        conn.abas["Tarefas"] = pd.concat([df, pd.DataFrame([_tarefa(1, "Nova", "A Fazer")])], ignore_index=True)
+        conn.modificacao += 1
+
+    conn = _base_tarefas()
+    repo = _Concorrente(conn, mexer)
+    arquivo = Arquivo(ParticoesParquet(str(tmp_path / "arquivo")))
+
+    assert arquivo.arquivar(repo, HOJE) == {"Tarefas": 1, "Financeiro": 1}
+    assert conn.abas["Tarefas"]["Descricao"].tolist() == ["Cortes", "Fachada antiga", "Nova"]
+    assert conn.abas["Tarefas"]["Horas_Gastas"].tolist()[1] == 5
+    assert conn.abas["Financeiro"]["ID_Lancamento"].tolist() == [2]
+    # A alterada ficou na aba de trabalho e saiu da partição
+    assert arquivo.ler("Tarefas")["Descricao"].tolist() == ["Planta antiga"]
+
+    # Na próxima passada vai para o arquivo com a versão nova, sem duplicar
+    repo.mexer = lambda conn, aba: None
+    assert arquivo.arquivar(repo, HOJE) == {"Tarefas": 1}
+    tarefas = arquivo.ler("Tarefas")
+    assert tarefas["Descricao"].tolist() == ["Planta antiga", "Fachada antiga"]
+    assert float(tarefas["Horas_Gastas"].iloc[1]) == 5
+
+
+class _Falha(RepositorioSheets):
+    """remover() cai uma vez (queda de rede), depois das partições gravadas."""
+
+    falhas = 1
+
+    def remover(self, aba, linhas):
+        if self.falhas:
+            self.falhas -= 1
+            raise ConnectionError("queda")
+        return super().remover(aba, linhas)
+
+
+def test_passada_interrompida_e_repetida_nao_duplica(tmp_path):
+    conn = planilha(Projetos=[_projeto(1, "Ativo", "2023-03-01"), _projeto(2, "Concluído", "2023-04-01"),
+                              _projeto(3, "Cancelado", "2022-04-01")],
+                    Tarefas=[_tarefa(1, "Planta antiga", "Concluído", "10/05/2023 10:00"),
+                             _tarefa(1, "Planta antiga", "Concluído", "10/05/2022 10:00")])
+    repo = _Falha(conn)
+    arquivo = Arquivo(ParticoesParquet(str(tmp_path / "arquivo")))
+
+    with pytest.raises(ConnectionError):
+        arquivo.arquivar(repo, HOJE)
+    # Um ano copiado sem ter saído: o histórico mostra a versão de trabalho uma vez só
+    assert arquivo.ler("Tarefas")["Descricao"].tolist() == ["Planta antiga"]
+    assert len(arquivo.com_historico("Tarefas", repo.ler("Tarefas"))) == 2
+
+    assert arquivo.arquivar(repo, HOJE) == {"Tarefas": 2, "Projetos": 2}
+    assert repo.ler("Tarefas").empty
+    assert len(arquivo.ler("Tarefas")) == 2
+    assert sorted(arquivo.ler("Projetos")["ID_Projeto"].astype(int)) == [2, 3]
+    historico = arquivo.com_historico("Projetos", repo.ler("Projetos"))
+    assert sorted(historico["ID_Projeto"].map(int)) == [1, 2, 3]
+
+
+def test_tarefa_alterada_pela_posicao_antiga_acha_a_linha_depois_do_arquivamento(tmp_path):
+    from repositorio import LoteEscrita
+
+    conn = _base_tarefas()
+    repo = RepositorioSheets(conn)
+    base = repo.ler("Tarefas").iloc[1].to_dict()
+    Arquivo(ParticoesParquet(str(tmp_path / "arquivo"))).arquivar(repo, HOJE)
+
+    LoteEscrita(repo).atualizar("Tarefas", 1, {"Horas_Gastas": 8}, base=base).salvar()
+    tarefas = conn.abas["Tarefas"]
+    assert tarefas["Descricao"].tolist() == ["Cortes"]
+    assert tarefas.loc[0, "Horas_Gastas"] == 8
+    assert tarefas.loc[0, "Versao"] == 2
+
+
+def test_sqlite_remove_e_espelho_apaga_as_mesmas_linhas(tmp_path):
+    from repositorio import RepositorioSQLite
+
+    conn = _base_tarefas()
+    repo = RepositorioSQLite(str(tmp_path / "dados.db"), espelho=RepositorioSheets(conn), intervalo_sincronia=3600)
+    try:
+        assert Arquivo(ParticoesParquet(str(tmp_path / "arquivo"))).arquivar(repo, HOJE) == \
+            {"Tarefas": 2, "Financeiro": 1}
+        assert repo.ler("Tarefas")["Descricao"].tolist() == ["Cortes"]
+        assert repo.pendentes() == 2
+        repo.sincronizar()
+        assert repo.pendentes() == 0
+        assert conn.abas["Tarefas"]["Descricao"].tolist() == ["Cortes"]
+        assert conn.abas["Financeiro"]["ID_Lancamento"].tolist() == [2]
+    finally:
+        repo.fechar()
+
+
+def test_sqlite_tarefa_alterada_pela_posicao_antiga_acha_a_linha(tmp_path):
+    from repositorio import LoteEscrita, RepositorioSQLite
+
+    conn = _base_tarefas()
+    conn.abas["Tarefas"] = pd.concat([conn.abas["Tarefas"], pd.DataFrame([_tarefa(1, "Detalhes", "A Fazer")])],
+                                     ignore_index=True)
+    repo = RepositorioSQLite(str(tmp_path / "dados.db"), espelho=RepositorioSheets(conn), intervalo_sincronia=3600)
+    try:
+        lidas = repo.ler("Tarefas")
+        Arquivo(ParticoesParquet(str(tmp_path / "arquivo"))).arquivar(repo, HOJE)
+        # A tabela foi recriada sem as concluídas: "Detalhes" passou da posição 3 para a 1
+        assert repo.ler("Tarefas")["Descricao"].tolist() == ["Cortes", "Detalhes"]
+        lote = LoteEscrita(repo)
+        lote.atualizar("Tarefas", 3, {"Horas_Gastas": 4}, base=lidas.iloc[3].to_dict())
+        lote.atualizar("Tarefas", 1, {"Status": "Em Revisão"}, base=lidas.iloc[1].to_dict())
+        lote.salvar()
+        tarefas = repo.ler("Tarefas")
+        assert tarefas["Horas_Gastas"].astype(float).tolist() == [1, 4]
+        assert tarefas["Status"].tolist() == ["Em Revisão", "A Fazer"]
+        repo.sincronizar()
+        assert conn.abas["Tarefas"]["Descricao"].tolist() == ["Cortes", "Detalhes"]
+        assert conn.abas["Tarefas"]["Horas_Gastas"].astype(float).tolist() == [1, 4]
+    finally:
+        repo.fechar()
+
+
+def test_fila_envia_pendencias_antes_de_remover(tmp_path):
+    from fila import RepositorioComFila
+    from repositorio import LoteEscrita
+
+    conn = _base_tarefas()
+    repo = RepositorioComFila(RepositorioSheets(conn), caminho=str(tmp_path / "fila.db"), atraso_envio=3600)
+    try:
+        base = repo.ler("Tarefas").iloc[1].to_dict()
+        LoteEscrita(repo).atualizar("Tarefas", 1, {"Horas_Gastas": 3}, base=base).salvar()
+        assert Arquivo(ParticoesParquet(str(tmp_path / "arquivo"))).arquivar(repo, HOJE)["Tarefas"] == 2
+        assert repo.status_fila()["pendentes"] == 0
+        assert conn.abas["Tarefas"]["Descricao"].tolist() == ["Cortes"]
+        assert conn.abas["Tarefas"].loc[0, "Horas_Gastas"] == 3
+    finally:
+        repo.fechar()
@@ -0,0 +1,50 @@
+import pandas as pd
+
+from busca import IndiceTexto, cruzar, palavras
+
+
+def _indice():
+    projetos = pd.DataFrame({
+        "ID_Projeto": [1, 2, 3],
+        "Cliente": ["João Silva", "Construtora Alfa", "Joana Prado"],
+        "Servicos": ["Instalações elétricas", "Paisagismo e fachadas", "Reforma da cozinha"],
+    })
+    return IndiceTexto("Projetos", ["Cliente", "Servicos"], projetos, versao=1)
+
+
+def test_palavras_sem_acento_no_singular_e_sem_vazias():
+    assert palavras("Instalações da Cozinha") == ["instalacao", "cozinha"]
+    assert palavras("Fachadas e PAISAGISMO") == ["fachada", "paisagismo"]
+    assert palavras(None) == [] and palavras(float("nan")) == []
+
+
+def test_todas_as_palavras_e_a_ultima_como_prefixo():
+    indice = _indice()
+    assert indice.buscar("instalacao eletrica") == [0]
+    assert indice.buscar("jo") == [2, 0]
+    assert indice.buscar("joa") == [2, 0]
+    assert indice.buscar("joao") == [0]
+    # Prefixo sem o singular: "pais" não vira "pai"
+    assert indice.buscar("pais") == [1]
+    # Com espaço no fim a palavra terminou: nada de prefixo
+    assert indice.buscar("jo ") == []
+    assert indice.buscar("de da") == []
+
+
+def test_alteracao_e_inclusao_atualizam_o_indice():
+    indice = _indice()
+    # Chave é o ID_Projeto, não a posição
+    indice.alterar(3, {"Servicos": "Projeto de iluminação"})
+    assert indice.buscar("cozinha") == []
+    assert indice.buscar("iluminacao") == [2]
+    indice.incluir([{"ID_Projeto": 4, "Cliente": "Cozinhas Beta", "Servicos": "Iluminação"}])
+    assert indice.buscar("cozinha") == [3]
+    assert indice.buscar("ilum") == [3, 2]
+    # Campo fora das colunas indexadas não mexe no índice
+    indice.alterar(4, {"Cidade": "Recife"})
+    assert indice.buscar("recife") == []
+
+
+def test_cruzar_das_mais_novas_para_as_mais_antigas():
+    assert cruzar([{1, 2, 5}, {5, 2, 9}]) == [5, 2]
+    assert cruzar([]) == []
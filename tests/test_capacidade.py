@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from capacidade import ESFORCO_MINIMO, ESFORCO_PADRAO, SEM_RESPONSAVEL, carga_diaria, carga_semanal, esforco_restante, sobrecargas
+
+HOJE = pd.Timestamp("2025-03-03")  # segunda-feira
+
+
+def _tarefas(*linhas):
+    base = {"Fase": "Modelagem", "Responsavel": "GABRIEL", "Status": "A Fazer", "Horas_Gastas": 0.0,
+            "Data_Inicio": None, "Data_Deadline": None}
+    df = pd.DataFrame([{**base, **linha} for linha in linhas])
+    for col in ("Data_Inicio", "Data_Deadline"):
+        df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def test_esforco_pela_mediana_da_fase_ou_geral():
+    tarefas = _tarefas(
+        {"Status": "Concluído", "Horas_Gastas": 10.0}, {"Status": "Concluído", "Horas_Gastas": 6.0},
+        {"Fase": "Pranchas", "Status": "Concluído", "Horas_Gastas": 20.0},
+        {"Horas_Gastas": 2.0}, {"Fase": "Compatibilização"}, {"Horas_Gastas": 30.0},
+    )
+    assert esforco_restante(tarefas).tolist()[3:] == [6.0, 10.0, ESFORCO_MINIMO]
+    assert esforco_restante(_tarefas({})).tolist() == [ESFORCO_PADRAO]
+
+
+def test_restante_dividido_pelos_dias_uteis_e_atrasada_no_primeiro_dia():
+    tarefas = _tarefas(
+        # Quinta a terça: 4 dias úteis (o fim de semana não conta)
+        {"Data_Inicio": "2025-03-06", "Data_Deadline": "2025-03-11", "Responsavel": "GABRIEL"},
+        {"Data_Deadline": "2025-02-20", "Responsavel": "MILENNA"},
+        {"Status": "Concluído", "Data_Deadline": "2025-03-04", "Horas_Gastas": 8.0},
+    )
+    diaria = carga_diaria(tarefas, HOJE)
+    assert diaria.index[0] == HOJE and pd.Timestamp("2025-03-08") not in diaria.index
+    assert diaria["GABRIEL"].tolist() == [0, 0, 0, 2, 2, 2, 2]
+    assert diaria["MILENNA"].tolist() == [8, 0, 0, 0, 0, 0, 0]
+    assert sobrecargas(diaria).empty
+    semanal, capacidade = carga_semanal(diaria)
+    assert semanal["GABRIEL"].tolist() == [4, 4]
+    assert capacidade.tolist() == [40, 16]
+
+
+def test_varredura_igual_a_somar_dia_a_dia():
+    rng = np.random.default_rng(7)
+    linhas = []
+    for i in range(40):
+        inicio = HOJE + pd.Timedelta(days=int(rng.integers(-10, 20)))
+        linhas.append({"Responsavel": ["GABRIEL", "MILENNA", None][i % 3], "Horas_Gastas": float(rng.integers(0, 6)),
+                       "Data_Inicio": inicio, "Data_Deadline": inicio + pd.Timedelta(days=int(rng.integers(0, 15)))})
+    tarefas = _tarefas(*linhas)
+    diaria = carga_diaria(tarefas, HOJE)
+    esperado = pd.DataFrame(0.0, index=diaria.index, columns=diaria.columns)
+    restante = esforco_restante(tarefas)
+    for i, t in tarefas.iterrows():
+        dias = [d for d in diaria.index if max(t["Data_Inicio"], HOJE) <= d <= t["Data_Deadline"]] or [
+            next(d for d in diaria.index if d >= min(max(t["Data_Deadline"], HOJE), diaria.index[-1]))]
+        for d in dias:
+            esperado.loc[d, t["Responsavel"] if isinstance(t["Responsavel"], str) else SEM_RESPONSAVEL] += restante[i] / len(dias)
+    pd.testing.assert_frame_equal(diaria, esperado, check_exact=False, check_names=False)
+    excesso = sobrecargas(diaria)
+    assert (excesso["Horas"] > 8).all() and len(excesso) == int((diaria > 8 + 1e-6).sum().sum())
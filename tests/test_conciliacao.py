@@ -0,0 +1,142 @@
+import io
+
+import pandas as pd
+import pytest
+
+from concorrencia import ConflitoEscrita
+from conciliacao import baixas, conciliar, ler_extrato, linhas_lidas, pendentes
+from conftest import planilha
+from esquema import tipar
+from repositorio import LoteEscrita, RepositorioSheets
+
+PROJETOS = [{"ID_Projeto": 1, "Cliente": "Maria Souza", "Versao": 1},
+            {"ID_Projeto": 2, "Cliente": "Construtora Alfa", "Versao": 1}]
+FINANCEIRO = [
+    {"ID_Lancamento": 10, "ID_Projeto": 1, "Descricao": "Parcela 1", "Valor": 1500, "Vencimento": "2025-03-10",
+     "Status": "Pendente", "Versao": 1},
+    {"ID_Lancamento": 11, "ID_Projeto": 2, "Descricao": "Parcela 1", "Valor": 1500, "Vencimento": "2025-03-12",
+     "Status": "Pendente", "Versao": 1},
+    {"ID_Lancamento": 12, "ID_Projeto": 2, "Descricao": "Parcela 2", "Valor": 800, "Vencimento": "2025-01-01",
+     "Status": "Pago", "Data_Pagamento": "2025-01-02", "Versao": 1},
+]
+DESPESAS = [{"ID_Despesa": 5, "Descricao": "Aluguel sala", "Categoria": "Aluguel", "Valor": 2000,
+             "Vencimento": "2025-03-05", "Status": "Pendente", "Versao": 3}]
+
+CSV = """Banco Exemplo S.A.
+Agência: 0001 Conta: 12345-6
+Data;Histórico;Documento;Valor
+11/03/2025;PIX RECEBIDO CONSTRUTORA ALFA LTDA;A1;1.500,00
+12/03/2025;PIX RECEBIDO MARIA SOUZA;A2;1.500,00
+06/03/2025;PAGAMENTO BOLETO ALUGUEL;A3;2.000,00 D
+07/03/2025;TARIFA PACOTE;A4;-35,90
+"""
+
+OFX = """OFXHEADER:100
+CHARSET:1252
+<OFX><BANKTRANLIST>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250311120000<TRNAMT>1500.00<FITID>X1<MEMO>TED CONSTRUTORA ALFA
+</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250306<TRNAMT>-2000.00<FITID>X2<NAME>ALUGUEL
+</STMTTRN>
+</BANKTRANLIST></OFX>
+"""
+
+
+def _abertos(conn):
+    repo = RepositorioSheets(conn)
+    return pendentes(*(tipar(aba, repo.ler(aba)) for aba in ("Financeiro", "Despesas", "Projetos")))
+
+def _arquivo(texto, codificacao="utf-8"):
+    return io.BytesIO(texto.encode(codificacao))
+
+
+def test_csv_brasileiro_com_linhas_antes_do_cabecalho():
+    blocos = list(ler_extrato(_arquivo(CSV, "latin-1"), "extrato.csv", tamanho=2))
+    extrato = pd.concat(blocos, ignore_index=True)
+    assert len(blocos) == 2
+    assert extrato["Transacao"].tolist() == [0, 1, 2, 3]
+    assert extrato["Valor"].tolist() == [1500.0, 1500.0, -2000.0, -35.9]
+    assert extrato["Data"].dt.strftime("%Y-%m-%d").tolist()[:2] == ["2025-03-11", "2025-03-12"]
+    assert extrato["Documento"].tolist() == ["A1", "A2", "A3", "A4"]
+
+
+def test_ofx_sgml_sem_etiquetas_de_fechamento():
+    extrato = pd.concat(ler_extrato(_arquivo(OFX, "cp1252"), "extrato.ofx"), ignore_index=True)
+    assert extrato["Valor"].tolist() == [1500.0, -2000.0]
+    assert extrato["Descricao"].tolist() == ["TED CONSTRUTORA ALFA", "ALUGUEL"]
+    assert extrato["Data"].dt.strftime("%Y-%m-%d").tolist() == ["2025-03-11", "2025-03-06"]
+
+
+def test_cada_transacao_fica_com_o_pendente_mais_parecido():
+    conn = planilha(Projetos=PROJETOS, Financeiro=FINANCEIRO, Despesas=DESPESAS)
+    # Blocos de uma linha: a escolha um-para-um é feita sobre o extrato inteiro
+    propostas, lidas = conciliar(_arquivo(CSV), "extrato.csv", _abertos(conn), tamanho=1)
+    assert lidas == 4
+    pares = dict(zip(propostas["Descricao_Banco"], zip(propostas["Aba"], propostas["Chave"])))
+    assert pares == {
+        "PIX RECEBIDO CONSTRUTORA ALFA LTDA": ("Financeiro", 11),
+        "PIX RECEBIDO MARIA SOUZA": ("Financeiro", 10),
+        "PAGAMENTO BOLETO ALUGUEL": ("Despesas", 5),
+    }
+
+
+def test_fora_da_janela_ou_de_outro_valor_nao_casa():
+    conn = planilha(Projetos=PROJETOS, Financeiro=FINANCEIRO, Despesas=DESPESAS)
+    extrato = "Data;Histórico;Valor\n30/03/2025;MARIA SOUZA;1.500,00\n11/03/2025;MARIA SOUZA;1.499,99\n"
+    propostas, lidas = conciliar(_arquivo(extrato), "extrato.csv", _abertos(conn))
+    assert lidas == 2
+    assert propostas.empty
+
+
+def test_baixas_levam_o_imposto_so_no_financeiro():
+    conn = planilha(Projetos=PROJETOS, Financeiro=FINANCEIRO, Despesas=DESPESAS)
+    propostas, _ = conciliar(_arquivo(CSV), "extrato.csv", _abertos(conn))
+    registros = baixas(propostas)
+    assert registros["Financeiro"][10] == {"Status": "Pago", "Data_Pagamento": "2025-03-12",
+                                           "Valor_Imposto": pytest.approx(232.5)}
+    assert registros["Despesas"][5] == {"Status": "Pago", "Data_Pagamento": "2025-03-06"}
+    bases = linhas_lidas(propostas)
+    assert bases["Despesas"][5]["Versao"] == 3
+    assert bases["Financeiro"][11]["Status"] == "Pendente"
+    assert "Valor_Imposto" not in bases["Despesas"][5]
+
+
+def _gravar(repo, propostas):
+    lote = LoteEscrita(repo)
+    bases = linhas_lidas(propostas)
+    for aba, por_chave in baixas(propostas).items():
+        for chave, campos in por_chave.items():
+            lote.atualizar(aba, chave, campos, bases[aba][chave])
+    lote.salvar()
+
+
+def test_baixa_confere_o_pendente_como_a_conciliacao_o_leu():
+    conn = planilha(Projetos=PROJETOS, Financeiro=FINANCEIRO, Despesas=DESPESAS)
+    propostas, _ = conciliar(_arquivo(CSV), "extrato.csv", _abertos(conn))
+
+    # Outra pessoa baixa o mesmo lançamento, em outra data, depois da conciliação
+    outro = RepositorioSheets(conn)
+    linha = tipar("Financeiro", outro.ler("Financeiro")).set_index("ID_Lancamento", drop=False).loc[10]
+    LoteEscrita(outro).atualizar("Financeiro", 10, {"Status": "Pago", "Data_Pagamento": "2025-03-09"}, linha).salvar()
+
+    # Releitura na hora de gravar não pode apagar essa baixa
+    repo = RepositorioSheets(conn)
+    with pytest.raises(ConflitoEscrita) as erro:
+        _gravar(repo, propostas)
+    assert erro.value.chave == 10
+    financeiro = tipar("Financeiro", RepositorioSheets(conn).ler("Financeiro")).set_index("ID_Lancamento")
+    assert financeiro.loc[10, "Data_Pagamento"] == pd.Timestamp("2025-03-09")
+    assert financeiro.loc[11, "Status"] == "Pendente"
+
+
+def test_baixa_sem_concorrencia_grava_e_sobe_a_versao():
+    conn = planilha(Projetos=PROJETOS, Financeiro=FINANCEIRO, Despesas=DESPESAS)
+    propostas, _ = conciliar(_arquivo(CSV), "extrato.csv", _abertos(conn))
+    _gravar(RepositorioSheets(conn), propostas)
+    repo = RepositorioSheets(conn)
+    financeiro = tipar("Financeiro", repo.ler("Financeiro")).set_index("ID_Lancamento")
+    despesas = tipar("Despesas", repo.ler("Despesas")).set_index("ID_Despesa")
+    assert financeiro.loc[[10, 11], "Status"].tolist() == ["Pago", "Pago"]
+    assert financeiro.loc[[10, 11], "Versao"].tolist() == [2, 2]
+    assert despesas.loc[5, "Versao"] == 4
+    assert _abertos(conn).empty
@@ -0,0 +1,119 @@
+import pandas as pd
+import pytest
+
+from concorrencia import ConflitoEscrita, condicao, juntar, linhas_iguais, mesclar, mesmo
+from conftest import planilha
+from repositorio import LoteEscrita, RepositorioSheets
+
+LINHA = {"ID_Projeto": 1, "Descricao": "Planta", "Status": "A Fazer", "Horas_Gastas": 2, "Versao": 3}
+
+
+def test_mesma_versao_grava_tudo_e_sobe_a_versao():
+    base = condicao("Tarefas", LINHA, ["Status"])
+    assert mesclar("Tarefas", 0, LINHA, {"Status": "Concluído"}, base) == {"Status": "Concluído", "Versao": 4}
+
+
+def test_sem_condicao_grava_sobre_a_versao_atual():
+    assert mesclar("Tarefas", 0, LINHA, {"Horas_Gastas": 5}) == {"Versao": 4, "Horas_Gastas": 5}
+
+
+def test_aba_sem_versao_nao_mescla():
+    assert mesclar("Recorrencias", 1, {}, {"Valor": 10}, {"versao": 0, "campos": {}}) == {"Valor": 10}
+
+
+def test_campos_diferentes_se_juntam():
+    base = condicao("Tarefas", LINHA, ["Horas_Gastas"])
+    # Outra pessoa concluiu a tarefa depois da nossa leitura
+    atual = {**LINHA, "Status": "Concluído", "Versao": 4}
+    assert mesclar("Tarefas", 0, atual, {"Horas_Gastas": 6}, base) == {"Horas_Gastas": 6, "Versao": 5}
+
+
+def test_mesmo_campo_com_outro_valor_e_conflito():
+    base = condicao("Tarefas", LINHA, ["Status"])
+    atual = {**LINHA, "Status": "Revisão", "Versao": 4}
+    with pytest.raises(ConflitoEscrita) as erro:
+        mesclar("Tarefas", 0, atual, {"Status": "Concluído"}, base)
+    assert erro.value.campos == ["Status"]
+
+
+def test_mesmo_campo_com_o_mesmo_valor_nao_e_conflito():
+    base = condicao("Tarefas", LINHA, ["Status"])
+    atual = {**LINHA, "Status": "Concluído", "Versao": 4}
+    assert mesclar("Tarefas", 0, atual, {"Status": "Concluído"}, base) == {"Versao": 5}
+
+
+def test_campo_que_nao_mudamos_fica_com_o_valor_de_quem_gravou_antes():
+    # A tela reenviou Horas_Gastas com o valor lido; outra pessoa o mudou
+    base = condicao("Tarefas", LINHA, ["Horas_Gastas", "Status"])
+    atual = {**LINHA, "Horas_Gastas": 9, "Versao": 4}
+    assert mesclar("Tarefas", 0, atual, {"Horas_Gastas": 2, "Status": "Revisão"}, base) == \
+        {"Status": "Revisão", "Versao": 5}
+
+
+def test_tarefa_trocada_na_posicao_e_conflito():
+    base = condicao("Tarefas", LINHA, ["Status"])
+    outra = {**LINHA, "Descricao": "Cortes"}
+    with pytest.raises(ConflitoEscrita):
+        mesclar("Tarefas", 0, outra, {"Status": "Concluído"}, base)
+
+
+def test_valores_normalizados_pelo_tipo():
+    assert mesmo("Financeiro", "Valor", "1500", 1500.0)
+    assert mesmo("Financeiro", "Valor", "", 0)
+    assert mesmo("Financeiro", "Vencimento", "05/03/2025", "2025-03-05")
+    assert mesmo("Projetos", "ID_Projeto", "7", 7.0)
+    assert not mesmo("Tarefas", "Status", "A Fazer", "Concluído")
+
+
+def test_juntar_fica_com_a_leitura_mais_antiga():
+    primeira = {"versao": 3, "campos": {"Status": "A Fazer"}}
+    segunda = {"versao": 4, "campos": {"Status": "Revisão", "Horas_Gastas": 2}}
+    assert juntar(primeira, segunda) == {"versao": 3, "campos": {"Status": "A Fazer", "Horas_Gastas": 2}}
+    assert juntar(None, segunda) == segunda
+
+
+def test_linhas_iguais_ignora_as_alteradas():
+    df = pd.DataFrame([LINHA, {**LINHA, "Descricao": "Cortes"}, LINHA])
+    assert linhas_iguais("Tarefas", df, [LINHA, {**LINHA, "Descricao": "Cortes", "Versao": 2}]) == [0]
+    assert linhas_iguais("Tarefas", df, [LINHA, LINHA, LINHA]) == [0, 2]
+
+
+def _contar_conferencias(conn, monkeypatch):
+    chamadas = []
+    original = conn.values_batch_get
+
+    def contar(ranges, params=None):
+        chamadas.append(ranges)
+        return original(ranges, params)
+
+    monkeypatch.setattr(conn, "values_batch_get", contar)
+    return chamadas
+
+
+def test_so_confere_na_planilha_as_alteracoes_com_condicao(monkeypatch):
+    conn = planilha(Tarefas=[{**LINHA, "Descricao": f"T{i}"} for i in range(3)])
+    repo = RepositorioSheets(conn)
+    linhas = repo.ler("Tarefas")
+    chamadas = _contar_conferencias(conn, monkeypatch)
+
+    LoteEscrita(repo).atualizar("Tarefas", 0, {"Horas_Gastas": 4}).salvar()
+    assert chamadas == []
+    assert conn.abas["Tarefas"].loc[0, "Versao"] == 4
+
+    LoteEscrita(repo).atualizar("Tarefas", 1, {"Status": "Revisão"}, base=linhas.iloc[1]).salvar()
+    assert len(chamadas) == 1
+    assert conn.abas["Tarefas"].loc[1, "Status"] == "Revisão"
+
+
+def test_snapshot_velho_e_conferido_mesmo_sem_condicao(monkeypatch):
+    conn = planilha(Tarefas=[{**LINHA, "Descricao": f"T{i}"} for i in range(3)])
+    repo = RepositorioSheets(conn)
+    repo.ler("Tarefas")
+    # Escrita de fora: o fingerprint muda e o snapshot deixa de valer
+    conn.abas["Tarefas"].loc[0, "Versao"] = 7
+    conn.modificacao += 1
+    chamadas = _contar_conferencias(conn, monkeypatch)
+
+    LoteEscrita(repo).atualizar("Tarefas", 0, {"Horas_Gastas": 4}).salvar()
+    assert len(chamadas) == 1
+    assert conn.abas["Tarefas"].loc[0, "Versao"] == 8
@@ -0,0 +1,126 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from consolidado import Consolidado
+from esquema import ESQUEMAS, tipar
+
+VERSOES = {"Financeiro": (1, 0), "Despesas": (1, 0), "Projetos": (1, 0)}
+
+
+def _aba(aba, linhas):
+    return tipar(aba, pd.DataFrame(linhas, columns=list(ESQUEMAS[aba])).fillna(""))
+
+def _dados():
+    projetos = [{"ID_Projeto": 1, "Cliente": "A", "Origem": "Indicação", "Tipo": "Residencial"},
+                {"ID_Projeto": 2, "Cliente": "B", "Origem": "Site", "Tipo": "Comercial"}]
+    financeiro = [
+        {"ID_Lancamento": 1, "ID_Projeto": 1, "Valor": 1000, "Valor_Imposto": 155, "Vencimento": "2026-01-10",
+         "Status": "Pago", "Data_Pagamento": "2026-01-12"},
+        {"ID_Lancamento": 2, "ID_Projeto": 2, "Valor": 500, "Vencimento": "2026-02-10", "Status": "Pendente"},
+    ]
+    despesas = [
+        {"ID_Despesa": 1, "Categoria": "Aluguel", "Valor": 300, "Vencimento": "2026-01-05", "Status": "Pago",
+         "Data_Pagamento": "2026-01-05"},
+    ]
+    return {"Financeiro": financeiro, "Despesas": despesas, "Projetos": projetos}
+
+def _montado(dados, versoes=VERSOES):
+    cons = Consolidado()
+    cons.montar(*(_aba(aba, dados[aba]) for aba in ("Financeiro", "Despesas", "Projetos")), versoes)
+    return cons
+
+def _ordenada(tabela):
+    colunas = [c for c in tabela.columns if c not in ("Valor", "Valor_Imposto", "Lancamentos")]
+    return tabela.sort_values(colunas).reset_index(drop=True).astype({"Lancamentos": "float64"})
+
+def _depois(*abas):
+    return {aba: (v + 1, a) if aba in abas else (v, a) for aba, (v, a) in VERSOES.items()}
+
+def _igual_a_montar_de_novo(cons, dados):
+    novo = _montado(dados)
+    pd.testing.assert_frame_equal(_ordenada(cons.tabela), _ordenada(novo.tabela), check_dtype=False)
+    pd.testing.assert_frame_equal(_ordenada(cons.tabela_projetos), _ordenada(novo.tabela_projetos),
+                                  check_dtype=False)
+
+
+def test_inclusao_entra_como_delta():
+    dados = _dados()
+    cons = _montado(dados)
+    cons.resumo(2026)
+    registro = {"ID_Lancamento": 3, "ID_Projeto": 1, "Valor": 200, "Valor_Imposto": 31,
+                "Vencimento": "2026-03-01", "Status": "Pendente"}
+    assert cons.registrar("Financeiro", 3, registro, VERSOES, _depois("Financeiro"))
+    dados["Financeiro"].append(registro)
+    _igual_a_montar_de_novo(cons, dados)
+    # A consulta memorizada antes do delta é refeita
+    assert cons.resumo(2026)["a_receber"] == 700
+
+
+def test_baixa_move_o_registro_de_mes_e_status():
+    dados = _dados()
+    cons = _montado(dados)
+    campos = {"Status": "Pago", "Data_Pagamento": "2026-03-20"}
+    assert cons.registrar("Financeiro", 2, campos, VERSOES, _depois("Financeiro"))
+    dados["Financeiro"][1].update(campos)
+    _igual_a_montar_de_novo(cons, dados)
+    # Fevereiro/Pendente zerou e sai da tabela
+    tabela = cons.tabela
+    assert not ((tabela["Mes"] == pd.Timestamp(2026, 2, 1)) & (tabela["Status"] == "Pendente")).any()
+
+
+def test_alteracoes_seguidas_do_mesmo_registro():
+    dados = _dados()
+    cons = _montado(dados)
+    depois = _depois("Despesas")
+    assert cons.registrar("Despesas", 1, {"Valor": 450}, VERSOES, depois)
+    mais_uma = {aba: (v + 1, a) if aba == "Despesas" else (v, a) for aba, (v, a) in depois.items()}
+    assert cons.registrar("Despesas", 1, {"Categoria": "Software"}, depois, mais_uma)
+    dados["Despesas"][0].update(Valor=450, Categoria="Software")
+    _igual_a_montar_de_novo(cons, dados)
+
+
+def test_lote_com_as_duas_abas():
+    dados = _dados()
+    cons = _montado(dados)
+    registros = {"Financeiro": {2: {"Status": "Pago", "Data_Pagamento": "2026-02-11"}},
+                 "Despesas": {2: {"ID_Despesa": 2, "Categoria": "Software", "Valor": 80,
+                                  "Vencimento": "2026-02-01", "Status": "Pendente"}}}
+    assert cons.registrar_lote(registros, VERSOES, _depois("Financeiro", "Despesas"))
+    dados["Financeiro"][1].update(registros["Financeiro"][2])
+    dados["Despesas"].append(registros["Despesas"][2])
+    _igual_a_montar_de_novo(cons, dados)
+
+
+@pytest.mark.parametrize("antes, depois", [
+    # Outra escrita mudou a aba desde a montagem
+    ({**VERSOES, "Financeiro": (2, 0)}, {**VERSOES, "Financeiro": (3, 0)}),
+    # A escrita não foi a única mudança (Projetos também mudou)
+    (VERSOES, {**_depois("Financeiro"), "Projetos": (2, 0)}),
+    # Mais de uma versão de diferença na aba escrita
+    (VERSOES, {**VERSOES, "Financeiro": (3, 0)}),
+])
+def test_delta_recusado_quando_houve_outra_mudanca(antes, depois):
+    cons = _montado(_dados())
+    tabela = cons.tabela
+    assert not cons.registrar("Financeiro", 2, {"Valor": 999}, antes, depois)
+    assert cons.versoes == VERSOES
+    pd.testing.assert_frame_equal(cons.tabela, tabela)
+
+
+def test_resumo_e_ultimos_12_meses():
+    dados = _dados()
+    dados["Financeiro"].append({"ID_Lancamento": 3, "ID_Projeto": 1, "Valor": 400, "Vencimento": "2024-12-01",
+                                "Status": "Pago", "Data_Pagamento": "2024-12-02"})
+    cons = _montado(dados)
+    resumo = cons.resumo(2026)
+    assert resumo["receita_bruta"] == 1000
+    assert resumo["impostos_pagos"] == 155
+    assert resumo["custos_fixos_pagos"] == 300
+    assert resumo["lucro_liquido"] == 545
+    assert resumo["a_receber"] == 500
+    assert resumo["fluxo_mensal"]["Mes"].tolist() == ["2026-01", "2026-01", "2026-02"]
+    serie, totais = cons.ultimos_12_meses(date(2026, 2, 15))
+    assert len(serie) == 12 and serie["Mes"].iloc[-1] == "2026-02"
+    assert totais == {"entradas": 1000.0, "saidas": 300.0, "entradas_anterior": 400.0, "saidas_anterior": 0.0}
@@ -0,0 +1,59 @@
+import pandas as pd
+
+from cronograma import DURACAO_PADRAO, PALETA, figura_gantt, filtrar, mapa_cores, preparar_tarefas, resumir_por_projeto
+from esquema import EQUIPE
+from graficos import TEMPLATE
+
+
+def _tarefas():
+    pendentes = pd.DataFrame({
+        "ID_Projeto": [1, 1, 2, 3],
+        "Descricao": ["Planta", "Cortes", "Fachada", "Sem prazo"],
+        "Responsavel": [EQUIPE[0], EQUIPE[1], "Zé", EQUIPE[0]],
+        "Status": ["A Fazer", "Em Andamento", "A Fazer", "A Fazer"],
+        "Data_Inicio": pd.to_datetime(["2025-03-01", None, "2025-05-01", None]),
+        "Data_Deadline": pd.to_datetime(["2025-03-20", "2025-04-10", "2025-05-30", None]),
+    })
+    projetos = pd.DataFrame({"ID_Projeto": [1, 2, 3], "Cliente": ["Ana", "Beto", "Caio"]})
+    return preparar_tarefas(pendentes, projetos)
+
+
+def test_sem_inicio_usa_a_duracao_padrao_e_sem_prazo_sai():
+    tarefas = _tarefas()
+    assert tarefas["Descricao"].tolist() == ["Planta", "Cortes", "Fachada"]
+    cortes = tarefas[tarefas["Descricao"] == "Cortes"].iloc[0]
+    assert cortes["Data_Inicio"] == pd.Timestamp("2025-04-10") - DURACAO_PADRAO
+    assert tarefas["Cliente"].tolist() == ["Ana", "Ana", "Beto"]
+
+
+def test_filtro_pela_janela_e_pelos_responsaveis():
+    tarefas = _tarefas()
+    # Cruza a janela mesmo começando antes dela
+    assert filtrar(tarefas, "2025-03-15", "2025-04-01")["Descricao"].tolist() == ["Planta"]
+    assert filtrar(tarefas, "2025-01-01", "2025-12-31", clientes=["Beto"])["Descricao"].tolist() == ["Fachada"]
+    assert filtrar(tarefas, "2025-01-01", "2025-12-31", responsaveis=[EQUIPE[1]])["Descricao"].tolist() == ["Cortes"]
+
+
+def test_resumo_uma_barra_por_projeto():
+    resumo = resumir_por_projeto(_tarefas()).set_index("Cliente")
+    assert resumo.loc["Ana", "Data_Inicio"] == pd.Timestamp("2025-03-01")
+    assert resumo.loc["Ana", "Data_Deadline"] == pd.Timestamp("2025-04-10")
+    assert resumo.loc["Ana", "Tarefas"] == 2
+
+
+def test_cores_da_equipe_nao_mudam_com_os_demais():
+    assert mapa_cores([])[EQUIPE[0]] == PALETA[0]
+    cores = mapa_cores(["Zé", "Ana", EQUIPE[1]])
+    assert [cores[n] for n in EQUIPE] == PALETA[:len(EQUIPE)]
+    assert cores["Ana"] == PALETA[len(EQUIPE)] and cores["Zé"] == PALETA[len(EQUIPE) + 1]
+
+
+def test_figura_com_a_janela_e_o_template():
+    fig = figura_gantt(_tarefas(), "2025-03-01", "2025-06-30")
+    assert {t.name for t in fig.data} == {EQUIPE[0], EQUIPE[1], "Zé"}
+    assert [pd.Timestamp(x) for x in fig.layout.xaxis.range] == [pd.Timestamp("2025-03-01"), pd.Timestamp("2025-06-30")]
+    import plotly.io as pio
+    assert pio.templates.default == TEMPLATE
+    assert fig.layout.template.layout.separators == ",."
+    resumida = figura_gantt(_tarefas(), "2025-03-01", "2025-06-30", resumido=True)
+    assert len(resumida.data) == 1 and list(resumida.data[0].y) == ["Ana", "Beto"]
@@ -0,0 +1,43 @@
+import threading
+
+from compartilhado import SequenciasLocais, SnapshotsCompartilhados
+from conftest import planilha
+from entidades import RepositorioIndexado
+from repositorio import RepositorioSheets
+
+
+def _projetos(*ids):
+    return planilha(Projetos=[{"ID_Projeto": i, "Cliente": f"Cliente {i}", "Versao": 1} for i in ids])
+
+
+def test_dois_processos_nunca_recebem_o_mesmo_id(tmp_path):
+    # Dois alocadores com conexões próprias ao mesmo arquivo, como dois processos do servidor
+    caminho = str(tmp_path / "sequencias.db")
+    a = RepositorioIndexado(RepositorioSheets(_projetos(1, 2, 3)), SequenciasLocais(caminho))
+    b = RepositorioIndexado(RepositorioSheets(_projetos(1, 2, 3)), SequenciasLocais(caminho))
+    ids = []
+
+    def alocar(repo):
+        for _ in range(50):
+            ids.append(repo.proximo_id("Projetos"))
+
+    tarefas = [threading.Thread(target=alocar, args=(repo,)) for repo in (a, b, a, b)]
+    for t in tarefas:
+        t.start()
+    for t in tarefas:
+        t.join()
+    assert sorted(ids) == list(range(4, 204))
+
+
+def test_contador_compartilhado_e_piso_nos_dados(tmp_path):
+    caminho = str(tmp_path / "compartilhado.db")
+    a = RepositorioIndexado(RepositorioSheets(_projetos(1, 7)), SnapshotsCompartilhados(caminho))
+    b = RepositorioIndexado(RepositorioSheets(_projetos(1, 7)), SnapshotsCompartilhados(caminho))
+    assert [a.proximo_id("Projetos"), b.proximo_id("Projetos"), a.proximo_id("Projetos")] == [8, 9, 10]
+    # Outra aba tem contador próprio
+    assert b.proximo_id("Financeiro") == 1
+
+
+def test_contador_novo_continua_do_maior_id_da_planilha(tmp_path):
+    repo = RepositorioIndexado(RepositorioSheets(_projetos(3, 41, 12)), SequenciasLocais(str(tmp_path / "s.db")))
+    assert repo.proximo_id("Projetos") == 42
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from esquema import ESQUEMAS, STATUS_TAREFA, serializar, tipar
+
+
+def _tarefas(*linhas):
+    return pd.DataFrame(linhas, columns=[c for c in ESQUEMAS["Tarefas"] if c != "Versao"]).fillna("")
+
+
+def test_cada_coluna_no_seu_tipo():
+    df = tipar("Tarefas", _tarefas(
+        {"ID_Projeto": "3", "Descricao": "Planta", "Status": "A Fazer", "Horas_Gastas": "2.5",
+         "Data_Deadline": "2025-05-10", "Responsavel": "GABRIEL"},
+        {"ID_Projeto": "4", "Descricao": "Cortes", "Status": "", "Horas_Gastas": "", "Data_Deadline": ""},
+    ))
+    assert str(df["ID_Projeto"].dtype) == "Int64"
+    assert df["Horas_Gastas"].tolist() == [2.5, 0.0]
+    assert df["Data_Deadline"].dtype.kind == "M" and pd.isna(df["Data_Deadline"].iloc[1])
+    assert isinstance(df["Status"].dtype, pd.CategoricalDtype)
+    assert set(STATUS_TAREFA) <= set(df["Status"].cat.categories)
+    assert pd.isna(df["Status"].iloc[1])
+    # Versao é opcional: entra vazia, sem aviso
+    assert "Versao" in df.columns
+    assert df.attrs["avisos"] == []
+
+
+def test_ids_que_nao_sao_inteiros_ficam_como_vieram():
+    df = tipar("Tarefas", _tarefas({"ID_Projeto": "3"}, {"ID_Projeto": "A-12"}))
+    assert df["ID_Projeto"].tolist() == ["3", "A-12"]
+    df = tipar("Tarefas", _tarefas({"ID_Projeto": "3"}, {"ID_Projeto": "3.5"}))
+    assert df["ID_Projeto"].tolist() == ["3", "3.5"]
+
+
+def test_categoria_fora_do_dominio_e_mantida():
+    df = tipar("Tarefas", _tarefas({"Status": "Bloqueada"}))
+    assert df["Status"].tolist() == ["Bloqueada"]
+    assert "Bloqueada" in df["Status"].cat.categories
+
+
+def test_avisos_de_colunas_ausentes_e_valores_invalidos():
+    bruto = _tarefas({"ID_Projeto": "1", "Horas_Gastas": "duas", "Data_Deadline": "amanhã"}).drop(columns="Fase")
+    avisos = tipar("Tarefas", bruto).attrs["avisos"]
+    assert avisos == ["Tarefas: colunas ausentes Fase", "Tarefas.Data_Deadline: 1 valor(es) inválido(s)",
+                      "Tarefas.Horas_Gastas: 1 valor(es) inválido(s)"]
+
+
+def test_serializar_volta_ao_formato_da_planilha():
+    bruto = _tarefas({"ID_Projeto": "3", "Descricao": "Planta", "Status": "A Fazer", "Horas_Gastas": "2.5",
+                      "Data_Deadline": "2025-05-10"},
+                     {"ID_Projeto": "4", "Descricao": "Cortes", "Status": "", "Data_Deadline": ""})
+    gravado = serializar("Tarefas", tipar("Tarefas", bruto))
+    assert gravado["Data_Deadline"].tolist() == ["2025-05-10", ""]
+    assert gravado["Status"].tolist() == ["A Fazer", ""]
+    assert gravado["ID_Projeto"].tolist() == [3, 4]
+    assert gravado["Horas_Gastas"].tolist() == [2.5, 0.0]
@@ -0,0 +1,159 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import fila
+from conftest import planilha
+from fila import RepositorioComFila
+from repositorio import LoteEscrita, RepositorioSheets
+
+
+def _conn():
+    return planilha(
+        Projetos=[{"ID_Projeto": 1, "Cliente": "Ana", "Cidade": "Recife", "Status_Geral": "Ativo", "Versao": 1}],
+        Tarefas=[{"ID_Projeto": 1, "Descricao": "Planta", "Status": "A Fazer", "Horas_Gastas": 0, "Versao": 1}],
+    )
+
+
+@pytest.fixture
+def abrir(tmp_path):
+    filas = []
+
+    def abrir(repo, **kwargs):
+        f = RepositorioComFila(repo, caminho=str(tmp_path / "fila.db"), atraso_envio=3600, **kwargs)
+        filas.append(f)
+        return f
+
+    yield abrir
+    for f in filas:
+        f.fechar()
+
+
+class _Falha(RepositorioSheets):
+    def aplicar(self, anexos, alteracoes, condicoes=None):
+        raise ConnectionError("planilha fora do ar")
+
+
+def test_edicoes_seguidas_da_mesma_linha_viram_um_item(abrir):
+    conn = _conn()
+    repo = abrir(RepositorioSheets(conn))
+    base = repo.ler("Projetos").iloc[0].to_dict()
+    LoteEscrita(repo).atualizar("Projetos", 1, {"Cidade": "Olinda"}, base=base).salvar()
+    depois = repo.ler("Projetos").iloc[0].to_dict()
+    LoteEscrita(repo).atualizar("Projetos", 1, {"Status_Geral": "Suspenso"}, base=depois).salvar()
+
+    itens = repo._itens
+    assert len(itens) == 1
+    assert itens[0]["campos"] == {"Cidade": "Olinda", "Status_Geral": "Suspenso"}
+    # Vale a leitura mais antiga de cada campo
+    assert itens[0]["condicao"]["campos"]["Cidade"] == "Recife"
+    assert repo.ler("Projetos").loc[0, "Status_Geral"] == "Suspenso"
+
+    assert repo.enviar() == 1
+    assert conn.abas["Projetos"].loc[0, "Cidade"] == "Olinda"
+    assert conn.abas["Projetos"].loc[0, "Versao"] == 2
+
+
+def test_falha_espera_cada_vez_mais(abrir, monkeypatch):
+    repo = abrir(_Falha(_conn()))
+    LoteEscrita(repo).atualizar("Projetos", 1, {"Cidade": "Olinda"}).salvar()
+    item = repo._itens[0]
+
+    inicio = time.time()
+    assert repo.enviar() == 0
+    assert item["tentativas"] == 1
+    assert item["proxima"] - inicio == pytest.approx(fila.ESPERA_BASE, abs=0.5)
+    # Antes da hora o item não é reenviado
+    assert repo.enviar() == 0 and item["tentativas"] == 1
+
+    agora = item["proxima"] + 0.01
+    monkeypatch.setattr(fila.time, "time", lambda: agora)
+    repo.enviar()
+    assert item["tentativas"] == 2
+    assert item["proxima"] - agora == pytest.approx(2 * fila.ESPERA_BASE)
+    assert repo.status_fila()["tentando"] == 1
+    assert "planilha fora do ar" in repo.status_fila()["ultimo_erro"][1]
+
+
+def test_espera_tem_teto_e_item_para_apos_max_tentativas(abrir, monkeypatch):
+    repo = abrir(_Falha(_conn()))
+    LoteEscrita(repo).atualizar("Projetos", 1, {"Cidade": "Olinda"}).salvar()
+    item = repo._itens[0]
+    esperas = []
+    for _ in range(fila.MAX_TENTATIVAS):
+        agora = item["proxima"] + 0.01
+        monkeypatch.setattr(fila.time, "time", lambda agora=agora: agora)
+        repo.enviar()
+        esperas.append(round(item["proxima"] - agora, 2))
+    assert esperas[:3] == [fila.ESPERA_BASE, 2 * fila.ESPERA_BASE, 4 * fila.ESPERA_BASE]
+    assert max(esperas) == fila.ESPERA_MAXIMA
+    assert len(repo.status_fila()["falhas"]) == 1
+
+    repo.tentar_novamente()
+    assert repo.status_fila()["falhas"] == [] and item["tentativas"] == 0
+
+
+def test_conflito_sai_da_fila_sem_nova_tentativa(abrir):
+    conn = _conn()
+    repo = abrir(RepositorioSheets(conn))
+    base = repo.ler("Projetos").iloc[0].to_dict()
+    # Outra pessoa muda a mesma coluna antes do envio
+    LoteEscrita(repo.repo).atualizar("Projetos", 1, {"Cidade": "Caruaru"}, base=base).salvar()
+    LoteEscrita(repo).atualizar("Projetos", 1, {"Cidade": "Olinda"}, base=base).salvar()
+
+    assert repo.enviar() == 0
+    status = repo.status_fila()
+    assert status["pendentes"] == 0 and status["falhas"] == []
+    assert len(status["conflitos"]) == 1 and "Cidade" in status["conflitos"][0][2]
+    assert conn.abas["Projetos"].loc[0, "Cidade"] == "Caruaru"
+    assert repo.ler("Projetos").loc[0, "Cidade"] == "Caruaru"
+    repo.dispensar_conflitos()
+    assert repo.status_fila()["conflitos"] == []
+
+
+def test_processo_so_envia_os_proprios_itens(abrir):
+    conn = _conn()
+    vivo = f"{fila.socket.gethostname()}:{os.getppid()}"
+    outro = abrir(_Falha(conn), dono=vivo)
+    LoteEscrita(outro).atualizar("Projetos", 1, {"Cidade": "Olinda"}).salvar()
+
+    atual = abrir(RepositorioSheets(conn))
+    assert atual._itens == []
+    assert atual.enviar() == 0
+    assert conn.abas["Projetos"].loc[0, "Cidade"] == "Recife"
+
+
+def test_itens_de_processo_encerrado_sao_adotados(abrir):
+    conn = _conn()
+    encerrado = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                               capture_output=True, text=True).stdout.strip()
+    morto = abrir(_Falha(conn), dono=f"{fila.socket.gethostname()}:{encerrado}")
+    LoteEscrita(morto).atualizar("Projetos", 1, {"Cidade": "Olinda"}).salvar()
+
+    atual = abrir(RepositorioSheets(conn))
+    assert len(atual._itens) == 1
+    assert atual.enviar() == 1
+    assert conn.abas["Projetos"].loc[0, "Cidade"] == "Olinda"
+
+
+def test_inclusao_de_tarefa_ja_gravada_nao_se_repete_apos_reinicio(abrir):
+    conn = _conn()
+    repo = abrir(RepositorioSheets(conn))
+    nova = {"ID_Projeto": 1, "Descricao": "Cortes", "Status": "A Fazer", "Horas_Gastas": 0}
+    LoteEscrita(repo).anexar("Tarefas", nova).anexar("Tarefas", nova).salvar()
+    assert [i["chave"] for i in repo._itens] == [[1, "Cortes", 0], [1, "Cortes", 1]]
+
+    # Outra sessão inclui uma tarefa antes; depois só a primeira das nossas chega à planilha
+    LoteEscrita(repo.repo).anexar("Tarefas", {"ID_Projeto": 2, "Descricao": "Fachada"}).salvar()
+    LoteEscrita(repo.repo).anexar("Tarefas", nova).salvar()
+    assert len(repo.ler("Tarefas")) == 4
+
+    # Reinício: a fila é reaberta e envia só a que falta
+    dono = repo.dono
+    repo.fechar()
+    reaberta = abrir(RepositorioSheets(conn), dono=dono)
+    assert reaberta.enviar() == 1
+    assert conn.abas["Tarefas"]["Descricao"].tolist() == ["Planta", "Fachada", "Cortes", "Cortes"]
@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+
+from financas import _kpis, data_considerada, movimentos, resumo_vazio
+
+
+def test_data_hibrida_pagamento_se_pago_senao_vencimento():
+    df = pd.DataFrame({"Vencimento": ["2025-01-10", "2025-02-10", "2025-03-10"],
+                       "Data_Pagamento": ["2025-01-15", "2025-02-20", ""],
+                       "Status": ["Pago", "Pendente", "Pago"]})
+    assert data_considerada(df).dt.strftime("%Y-%m-%d").tolist() == ["2025-01-15", "2025-02-10", "2025-03-10"]
+
+
+def test_movimentos_juntam_entradas_e_saidas_por_mes():
+    fin = pd.DataFrame({"ID_Lancamento": [1, 2], "ID_Projeto": [7, 7], "Valor": ["1000", ""],
+                        "Valor_Imposto": [155, None], "Vencimento": ["2024-12-28", "sem data"],
+                        "Status": ["Pago", "Pendente"], "Data_Pagamento": ["2025-01-03", ""]})
+    desp = pd.DataFrame({"ID_Despesa": [5], "Categoria": ["Taxas"], "Valor": [80.0], "Vencimento": ["2025-01-20"],
+                         "Status": ["Pendente"], "Data_Pagamento": [""]})
+    mov = movimentos(fin, desp)
+    # Lançamento sem vencimento válido fica de fora
+    assert mov["Fluxo"].tolist() == ["Entrada", "Saída"]
+    assert mov["Registro"].tolist() == [1, 5]
+    assert mov["Valor"].tolist() == [1000.0, 80.0]
+    assert mov["Valor_Imposto"].tolist() == [155.0, 0.0]
+    # Pago em janeiro conta em janeiro, ainda que tenha vencido em dezembro
+    assert mov["Ano_Ref"].tolist() == [2025, 2025]
+    assert mov["Mes"].dt.strftime("%Y-%m").tolist() == ["2025-01", "2025-01"]
+
+
+def test_kpis_do_ano():
+    totais = pd.DataFrame({"Valor": [1000.0, 400.0, 300.0, 50.0], "Valor_Imposto": [155.0, 0.0, 0.0, 0.0]},
+                          index=pd.MultiIndex.from_tuples([("Entrada", "Pago"), ("Entrada", "Pendente"),
+                                                           ("Saída", "Pago"), ("Saída", "Pendente")]))
+    kpis = _kpis(totais)
+    assert kpis == {"receita_bruta": 1000.0, "impostos_pagos": 155.0, "custos_fixos_pagos": 300.0,
+                    "lucro_liquido": 545.0, "margem_lucro": pytest.approx(54.5), "a_receber": 400.0, "a_pagar": 50.0}
+
+
+def test_resumo_vazio_sem_divisao_por_zero():
+    resumo = resumo_vazio()
+    assert resumo["receita_bruta"] == 0 and resumo["margem_lucro"] == 0
+    assert list(resumo["fluxo_mensal"].columns) == ["Mes", "Tipo", "Valor"]
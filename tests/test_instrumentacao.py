@@ -0,0 +1,57 @@
+import json
+import time
+
+import pandas as pd
+import pytest
+
+import instrumentacao
+
+
+@pytest.fixture
+def ligado(monkeypatch, tmp_path):
+    monkeypatch.setattr(instrumentacao, "ATIVO", True)
+    monkeypatch.setattr(instrumentacao, "CAMINHO_LOG", str(tmp_path / "perfil.jsonl"))
+    rerun = instrumentacao.iniciar_rerun("sessao")
+    yield rerun
+    instrumentacao.finalizar_rerun()
+
+
+@pytest.mark.parametrize("token, parametros, esperado", [
+    ("", {"admin": "1"}, False),
+    ("", {}, False),
+    ("segredo", {"admin": "1"}, False),
+    ("segredo", {"admin": "segredo"}, True),
+])
+def test_painel_so_abre_com_token_configurado(monkeypatch, token, parametros, esperado):
+    monkeypatch.setattr(instrumentacao, "ATIVO", True)
+    monkeypatch.setattr(instrumentacao, "TOKEN_ADMIN", token)
+    assert instrumentacao.admin(parametros) is esperado
+
+
+def test_painel_desligado_sem_perfil(monkeypatch):
+    monkeypatch.setattr(instrumentacao, "ATIVO", False)
+    monkeypatch.setattr(instrumentacao, "TOKEN_ADMIN", "segredo")
+    assert instrumentacao.admin({"admin": "segredo"}) is False
+
+
+def test_bytes_sao_os_valores_em_json(ligado):
+    df = pd.DataFrame({"ID": [1, 2], "Descricao": ["Planta baixa", None], "Valor": [10.5, float("nan")]})
+    instrumentacao.registrar_io("leitura", "Tarefas", len(df), df, time.perf_counter())
+    corpo = [["ID", "Descricao", "Valor"], [1, "Planta baixa", 10.5], [2, "", ""]]
+    registro = ligado.io[-1]
+    assert registro["linhas"] == 2
+    assert registro["bytes"] == len(json.dumps(corpo, ensure_ascii=False).encode("utf-8"))
+
+    pedidos = {"valueInputOption": "USER_ENTERED", "data": [{"range": "'Tarefas'!B2", "values": [["Concluído"]]}]}
+    instrumentacao.registrar_io("celulas", "Tarefas", 1, pedidos, time.perf_counter())
+    assert ligado.io[-1]["bytes"] == len(json.dumps(pedidos, ensure_ascii=False).encode("utf-8"))
+
+
+def test_etapas_aninhadas_e_rerun_interrompido(ligado):
+    with instrumentacao.etapa("carga"):
+        with instrumentacao.etapa("tipagem"):
+            pass
+    assert [(e["etapa"], e["nivel"]) for e in ligado.etapas] == [("tipagem", 1), ("carga", 0)]
+    # Um st.rerun() no meio: o próximo rerun da sessão fecha este como interrompido
+    instrumentacao.iniciar_rerun("sessao")
+    assert instrumentacao.recentes()[-1]["interrompido"] is True
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+from paginacao import ITENS_POR_PAGINA, fatia, ordenar, pagina_valida, total_paginas
+
+
+def test_ordem_por_criterios_e_padrao_dos_mais_novos():
+    df = pd.DataFrame({"Cliente": ["Caio", "Ana", "Beto"], "Status": ["Pago", "Pendente", "Pago"]}, index=[10, 11, 12])
+    assert ordenar(df, (("Cliente", True),)).tolist() == [11, 12, 10]
+    # "Pendente" é derivada do Status; empate mantém a ordem da aba
+    assert ordenar(df, (("Pendente", False),)).tolist() == [11, 10, 12]
+    assert ordenar(df, ()).tolist() == [12, 11, 10]
+    assert ordenar(df.iloc[:0], (("Cliente", True),)).tolist() == []
+
+
+def test_ultima_pagina_incompleta():
+    rotulos = np.arange(2 * ITENS_POR_PAGINA + 5)
+    assert total_paginas(len(rotulos)) == 3
+    assert fatia(rotulos, 3).tolist() == list(range(2 * ITENS_POR_PAGINA, 2 * ITENS_POR_PAGINA + 5))
+    assert len(fatia(rotulos, 1)) == ITENS_POR_PAGINA
+
+
+def test_pagina_fora_do_intervalo_e_lista_vazia():
+    assert pagina_valida(7, ITENS_POR_PAGINA + 1) == 2
+    assert pagina_valida(0, 50) == 1
+    assert pagina_valida(None, 50) == 1
+    assert total_paginas(0) == 1
+    assert pagina_valida(3, 0) == 1
+    assert fatia(np.arange(0), 1).tolist() == []
+
+
+def _lista():
+    import streamlit as st
+
+    from paginacao import paginar
+
+    st.session_state["visiveis"] = list(paginar(list(range(st.session_state.get("total", 45))), "teste"))
+
+
+def test_paginar_volta_para_a_ultima_pagina_quando_a_lista_encolhe():
+    at = AppTest.from_function(_lista).run()
+    assert at.session_state["visiveis"] == list(range(ITENS_POR_PAGINA))
+    at.number_input(key="pagina_teste").set_value(3).run()
+    assert at.session_state["visiveis"] == list(range(40, 45))
+    # Um filtro deixa só uma página e meia: a página 3 não existe mais
+    at.session_state["total"] = 30
+    at.run()
+    assert at.session_state["pagina_teste"] == 2
+    assert at.session_state["visiveis"] == list(range(20, 30))
+
+
+def test_paginar_sem_seletor_com_uma_pagina_ou_nenhum_item():
+    at = AppTest.from_function(_lista)
+    at.session_state["total"] = 0
+    at.run()
+    assert at.session_state["visiveis"] == []
+    assert len(at.number_input) == 0
+    at.session_state["total"] = ITENS_POR_PAGINA
+    at.run()
+    assert len(at.session_state["visiveis"]) == ITENS_POR_PAGINA
+    assert len(at.number_input) == 0
+
+
+def _expanders():
+    import streamlit as st
+
+    from paginacao import expander_sob_demanda
+
+    st.session_state.setdefault("executados", [])
+    for chave, aberto in (("fechado", False), ("aberto", True)):
+        exp = expander_sob_demanda(chave, f"exp_{chave}", aberto)
+        if exp.open:
+            with exp:
+                st.session_state["executados"].append(chave)
+
+
+def test_expander_so_executa_o_conteudo_aberto():
+    at = AppTest.from_function(_expanders).run()
+    assert not at.exception
+    assert at.session_state["executados"] == ["aberto"]
@@ -0,0 +1,79 @@
+from conftest import planilha
+from planilhas import CachePlanilhas
+
+
+def _conn():
+    return planilha(Projetos=[{"ID_Projeto": 1, "Cliente": "Ana", "Versao": 1}],
+                    Despesas=[{"ID_Despesa": 1, "Descricao": "Aluguel", "Valor": 100, "Versao": 1}])
+
+
+def test_aba_baixada_uma_vez_e_copia_a_cada_leitura():
+    conn = _conn()
+    cache = CachePlanilhas(conn)
+    df = cache.ler("Projetos")
+    df.loc[0, "Cliente"] = "Alterado na tela"
+    assert cache.ler("Projetos").loc[0, "Cliente"] == "Ana"
+    assert conn.leituras == 1
+    assert cache.versao("Projetos") == 1
+
+
+def test_escrita_de_terceiros_troca_o_fingerprint_e_descarta_os_snapshots():
+    conn = _conn()
+    cache = CachePlanilhas(conn, intervalo_checagem=0)
+    cache.ler("Projetos")
+    cache.ler("Despesas")
+    assert conn.leituras == 2
+    # Sem mudança remota nada é baixado de novo
+    cache.ler("Projetos")
+    assert conn.leituras == 2
+    df = conn.abas["Projetos"].copy()
+    df.loc[0, "Cliente"] = "Ana Maria"
+    conn.update(worksheet="Projetos", data=df)
+    assert cache.ler("Projetos").loc[0, "Cliente"] == "Ana Maria"
+    assert cache.versao("Projetos") == 2
+    # O fingerprint é da planilha inteira: as outras abas também são relidas
+    cache.ler("Despesas")
+    assert conn.leituras == 4
+
+
+def test_checagem_respeita_o_intervalo():
+    conn = _conn()
+    cache = CachePlanilhas(conn, intervalo_checagem=3600)
+    cache.ler("Projetos")
+    df = conn.abas["Projetos"].copy()
+    df.loc[0, "Cliente"] = "Ana Maria"
+    conn.update(worksheet="Projetos", data=df)
+    assert cache.ler("Projetos").loc[0, "Cliente"] == "Ana"
+    assert conn.leituras == 1
+
+
+def test_invalidar_relê_so_a_aba_escrita():
+    conn = _conn()
+    cache = CachePlanilhas(conn, intervalo_checagem=0)
+    cache.ler("Projetos")
+    cache.ler("Despesas")
+    df = conn.abas["Despesas"].copy()
+    df.loc[0, "Valor"] = 150
+    # Nossa própria reescrita: o fingerprint novo é adotado sem descartar Projetos
+    conn.update(worksheet="Despesas", data=df)
+    cache.invalidar("Despesas")
+    assert cache.ler("Despesas").loc[0, "Valor"] == 150
+    cache.ler("Projetos")
+    assert conn.leituras == 3
+    assert cache.versao("Despesas") == 3 and cache.versao("Projetos") == 1
+
+
+def _sem_metadados(self):
+    # Planilha pública: o Drive não entrega o modifiedTime
+    raise PermissionError("sem acesso aos metadados")
+
+def test_sem_fingerprint_o_snapshot_expira_por_idade(monkeypatch):
+    conn = _conn()
+    monkeypatch.setattr(type(conn), "get_lastUpdateTime", _sem_metadados)
+    cache = CachePlanilhas(conn, intervalo_checagem=0, ttl_sem_fingerprint=3600)
+    cache.ler("Projetos")
+    cache.ler("Projetos")
+    assert conn.leituras == 1
+    cache.ttl_sem_fingerprint = 0
+    cache.ler("Projetos")
+    assert conn.leituras == 2
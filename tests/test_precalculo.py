@@ -0,0 +1,63 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import precalculo
+from benchmarks.conexao_local import ConexaoLocal
+from benchmarks.dados_sinteticos import gerar
+from consolidado import Consolidado
+from esquema import tipar
+
+HOJE = "2025-06-16"
+
+
+@pytest.fixture
+def ambiente(monkeypatch):
+    for variavel in ("ARMAZENAMENTO", "ARQUIVO", "CACHE_COMPARTILHADO"):
+        monkeypatch.delenv(variavel, raising=False)
+
+
+def test_gravado_so_vale_para_a_mesma_assinatura_e_dia(tmp_path):
+    pasta = str(tmp_path)
+    precalculo.gravar("carga", {"x": 1}, {"Tarefas": "abc"}, hoje=HOJE, pasta=pasta)
+    assert precalculo.ler("carga", {"Tarefas": "abc"}, HOJE, pasta=pasta) == {"x": 1}
+    assert precalculo.ler("carga", {"Tarefas": "outra"}, HOJE, pasta=pasta) is None
+    assert precalculo.ler("carga", {"Tarefas": "abc"}, "2025-06-17", pasta=pasta) is None
+    assert precalculo.ler("inexistente", {}, pasta=pasta) is None
+    # Arquivo truncado (lote interrompido) também não vale
+    with open(os.path.join(pasta, "carga.pkl"), "r+b") as f:
+        f.truncate(10)
+    assert precalculo.ler("carga", {"Tarefas": "abc"}, HOJE, pasta=pasta) is None
+
+
+def test_assinatura_muda_com_o_conteudo_e_com_o_arquivo():
+    df = pd.DataFrame({"ID": ["1", "2"], "Valor": ["10", "20"]})
+    assert precalculo.assinatura(df) == precalculo.assinatura(df.copy())
+    assert precalculo.assinatura(df) != precalculo.assinatura(df.assign(Valor=["10", "21"]))
+    assert precalculo.assinatura(df) != precalculo.assinatura(df, [2024])
+
+
+def test_lote_grava_o_que_o_app_usaria(tmp_path, ambiente, sem_arquivos):
+    dados = gerar(300)
+    conn = ConexaoLocal(dados)
+    pasta = str(tmp_path / "precalculado")
+    resumo = precalculo.executar(lambda: conn, pasta, HOJE, pdfs=False)
+    assert resumo["hoje"] == HOJE and resumo["pdfs"] == 0
+    with open(os.path.join(pasta, "kpis.json"), encoding="utf-8") as f:
+        assert json.load(f)["financeiro"] == resumo["financeiro"]
+
+    assinaturas = {aba: precalculo.assinatura(conn.read(worksheet=aba)) for aba in ("Financeiro", "Despesas", "Projetos")}
+    gravado = precalculo.ler("consolidado", assinaturas, pasta=pasta)
+    novo = Consolidado()
+    novo.montar(*(tipar(aba, conn.read(worksheet=aba)) for aba in ("Financeiro", "Despesas", "Projetos")), None)
+    pd.testing.assert_frame_equal(gravado.tabela, novo.tabela)
+    assert gravado.resumo(2025)["receita_bruta"] == pytest.approx(resumo["financeiro"]["receita_bruta"], abs=0.01)
+
+    # Uma escrita depois do lote muda a assinatura: o app volta a calcular
+    df = conn.abas["Financeiro"].copy()
+    df.loc[0, "Valor"] = df.loc[0, "Valor"] + 1
+    conn.update(worksheet="Financeiro", data=df)
+    assinaturas["Financeiro"] = precalculo.assinatura(conn.read(worksheet="Financeiro"))
+    assert precalculo.ler("consolidado", assinaturas, pasta=pasta) is None
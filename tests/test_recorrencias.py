@@ -0,0 +1,89 @@
+from datetime import date
+
+import pandas as pd
+
+from arquivo import Arquivo, ParticoesParquet
+from conftest import planilha
+from esquema import tipar
+from recorrencias import anos_com_pagas, chave, expandir, ocorrencias_pagas
+from repositorio import RepositorioSheets
+
+
+def _regras(*linhas):
+    base = {"Descricao": "Regra", "Categoria": "", "ID_Projeto": "", "Entrada_Pct": 0, "Ocorrencias": 0, "Fim": ""}
+    return tipar("Recorrencias", pd.DataFrame([{**base, **linha} for linha in linhas]))
+
+ALUGUEL = {"ID_Recorrencia": 1, "Tipo": "Despesa", "Categoria": "Aluguel", "Valor": 1500,
+           "Frequencia": "Mensal", "Inicio": "2024-01-31"}
+
+
+def test_so_a_janela_e_gerada_e_dia_31_cai_no_fim_do_mes():
+    ocorrencias = expandir(_regras(ALUGUEL), "2025-02-01", "2025-04-30")
+    assert ocorrencias["Recorrencia"].tolist() == ["1/13", "1/14", "1/15"]
+    assert ocorrencias["Vencimento"].dt.strftime("%Y-%m-%d").tolist() == ["2025-02-28", "2025-03-31", "2025-04-30"]
+
+
+def test_parcelamento_com_entrada_e_centavos_na_ultima():
+    regra = {"ID_Recorrencia": 2, "Tipo": "Parcelamento", "ID_Projeto": 7, "Valor": 1000, "Entrada_Pct": 10,
+             "Ocorrencias": 4, "Frequencia": "Mensal", "Inicio": "2025-01-10"}
+    ocorrencias = expandir(_regras(regra), "2025-01-01", "2025-12-31")
+    assert ocorrencias["Valor"].tolist() == [100.0, 300.0, 300.0, 300.0]
+    assert (ocorrencias["Fluxo"] == "Entrada").all()
+    regra["Valor"] = 100
+    ocorrencias = expandir(_regras(regra), "2025-01-01", "2025-12-31")
+    assert ocorrencias["Valor"].tolist() == [10.0, 30.0, 30.0, 30.0]
+    regra["Entrada_Pct"] = 0
+    regra["Ocorrencias"] = 3
+    assert expandir(_regras(regra), "2025-01-01", "2025-12-31")["Valor"].tolist() == [33.33, 33.33, 33.34]
+
+
+def test_pagas_e_regra_encerrada_nao_geram_ocorrencia():
+    regras = _regras(ALUGUEL, {**ALUGUEL, "ID_Recorrencia": 3, "Fim": "2025-03-15"})
+    ocorrencias = expandir(regras, "2025-02-01", "2025-03-31", pagas={chave(1, 13)})
+    assert ocorrencias["Recorrencia"].tolist() == ["3/13", "1/14"]
+
+
+def test_anos_com_pagas_inclui_o_ano_anterior_ao_da_janela():
+    assert anos_com_pagas([2021, 2022, 2023, 2024], "2024-02-01") == (2023, 2024)
+    assert anos_com_pagas([2021, 2022], date(2025, 1, 1)) == ()
+
+
+class _ParticoesContadas(ParticoesParquet):
+    def __init__(self, pasta):
+        super().__init__(pasta)
+        self.lidas = []
+
+    def ler(self, aba, ano):
+        self.lidas.append((aba, ano))
+        return super().ler(aba, ano)
+
+
+def test_pagas_da_janela_vem_so_das_particoes_que_a_cobrem(tmp_path):
+    def paga(id_despesa, n, vencimento, pagamento):
+        return {"ID_Despesa": id_despesa, "Descricao": "Aluguel", "Categoria": "Aluguel", "Valor": 1500,
+                "Vencimento": vencimento, "Status": "Pago", "Data_Pagamento": pagamento,
+                "Recorrencia": chave(1, n), "Versao": 1}
+
+    repo = RepositorioSheets(planilha(Despesas=[
+        paga(1, 0, "2024-01-31", "2024-01-30"),
+        # Paga adiantada: fica na partição de 2024, vence na janela de 2025
+        paga(2, 12, "2025-01-31", "2024-12-20"),
+        paga(3, 13, "2025-02-28", "2025-02-27"),
+    ]))
+    particoes = _ParticoesContadas(str(tmp_path / "arquivo"))
+    arquivo = Arquivo(particoes)
+    # Em 2026 as de 2024 e 2025 vão para o arquivo
+    assert arquivo.arquivar(repo, date(2026, 3, 1)) == {"Despesas": 3}
+    arquivo._cache.clear()
+    particoes.lidas.clear()
+
+    quente = repo.ler("Despesas")
+    pagas = ocorrencias_pagas(arquivo.com_historico("Despesas", quente, anos_com_pagas(arquivo.anos("Despesas"), "2026-01-01")))
+    assert particoes.lidas == [("Despesas", 2025)]
+    assert pagas == {chave(1, 13)}
+
+    particoes.lidas.clear()
+    pagas = ocorrencias_pagas(arquivo.com_historico("Despesas", quente, anos_com_pagas(arquivo.anos("Despesas"), "2025-01-01")))
+    assert particoes.lidas == [("Despesas", 2024)]
+    ocorrencias = expandir(_regras(ALUGUEL), "2025-01-01", "2025-03-31", pagas=pagas)
+    assert ocorrencias["Recorrencia"].tolist() == ["1/14"]
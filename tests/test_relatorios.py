@@ -0,0 +1,118 @@
+import re
+import sys
+import types
+from collections import OrderedDict
+
+import pandas as pd
+import pytest
+
+import relatorios
+from relatorios import MIN_PDFS_PARALELO, gerar_pdf_status, gerar_pdfs_lote
+
+
+def _projetos(n):
+    return pd.DataFrame([{"ID_Projeto": i, "Cliente": f"Cliente {i}", "Cidade": "Recife", "Tipo": "Residencial",
+                          "Status_Geral": "Ativo"} for i in range(1, n + 1)])
+
+TAREFAS = pd.DataFrame([{"ID_Projeto": 1, "Descricao": "Planta", "Fase": "Projeto", "Status": "Concluído"},
+                        {"ID_Projeto": 1, "Descricao": "Cortes", "Fase": "Projeto", "Status": "A Fazer"}])
+
+
+class _Pool:
+    """ProcessPoolExecutor no mesmo processo: conta as subidas e deixa o espião de renderização valer."""
+
+    criados = []
+
+    def __init__(self, max_workers, mp_context):
+        _Pool.criados.append(max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        return False
+
+    def map(self, funcao, itens, chunksize=1):
+        return map(funcao, itens)
+
+
+@pytest.fixture
+def renderizados(monkeypatch, tmp_path):
+    monkeypatch.setattr(relatorios, "_cache_pdfs", OrderedDict())
+    monkeypatch.setattr(relatorios, "PASTA_PDFS", str(tmp_path / "pdfs"))
+    monkeypatch.setattr(relatorios, "ProcessPoolExecutor", _Pool)
+    _Pool.criados = []
+    clientes = []
+    original = relatorios._renderizar
+
+    def espiao(projeto, tarefas):
+        clientes.append(projeto["Cliente"])
+        return original(projeto, tarefas)
+    monkeypatch.setattr(relatorios, "_renderizar", espiao)
+    return clientes
+
+
+def test_mesmo_projeto_renderiza_uma_vez(renderizados):
+    projeto = _projetos(1).iloc[0]
+    primeiro = gerar_pdf_status(projeto, TAREFAS)
+    assert primeiro.startswith(b"%PDF")
+    assert gerar_pdf_status(projeto, TAREFAS) == primeiro
+    assert gerar_pdfs_lote(_projetos(1), TAREFAS) == {"Status_Cliente 1.pdf": primeiro}
+    assert renderizados == ["Cliente 1"]
+    # Tarefa nova muda o hash: renderiza de novo
+    gerar_pdf_status(projeto, TAREFAS.assign(Status="Concluído"))
+    assert renderizados == ["Cliente 1", "Cliente 1"]
+
+
+def test_descarta_o_usado_ha_mais_tempo(renderizados, monkeypatch):
+    monkeypatch.setattr(relatorios, "CACHE_PDF_MAX", 2)
+    projetos = _projetos(3)
+    sem_tarefas = TAREFAS.iloc[0:0]
+    gerar_pdf_status(projetos.iloc[0], sem_tarefas)
+    gerar_pdf_status(projetos.iloc[1], sem_tarefas)
+    # O 1 é pedido de novo, então o 2 é o mais antigo quando o 3 entra
+    gerar_pdf_status(projetos.iloc[0], sem_tarefas)
+    gerar_pdf_status(projetos.iloc[2], sem_tarefas)
+    assert len(relatorios._cache_pdfs) == 2
+    gerar_pdf_status(projetos.iloc[0], sem_tarefas)
+    gerar_pdf_status(projetos.iloc[1], sem_tarefas)
+    assert renderizados == ["Cliente 1", "Cliente 2", "Cliente 3", "Cliente 2"]
+
+
+def test_pdf_gravado_pelo_lote_nao_e_renderizado(renderizados, tmp_path):
+    pasta = str(tmp_path / "pdfs")
+    arquivos = gerar_pdfs_lote(_projetos(2), TAREFAS, gravar_em=pasta)
+    assert len(renderizados) == 2
+    relatorios._cache_pdfs.clear()
+    assert gerar_pdfs_lote(_projetos(2), TAREFAS) == arquivos
+    assert len(renderizados) == 2
+
+
+def test_lote_pequeno_sem_processos_e_grande_no_pool(renderizados):
+    arquivos = gerar_pdfs_lote(_projetos(MIN_PDFS_PARALELO - 1), TAREFAS)
+    assert len(arquivos) == MIN_PDFS_PARALELO - 1
+    assert _Pool.criados == []
+
+    # Os já renderizados vêm do cache e não contam para o limite
+    arquivos = gerar_pdfs_lote(_projetos(2 * MIN_PDFS_PARALELO - 1), TAREFAS)
+    assert len(arquivos) == 2 * MIN_PDFS_PARALELO - 1
+    assert len(_Pool.criados) == 1
+    assert len(renderizados) == 2 * MIN_PDFS_PARALELO - 1
+
+
+def _sem_data(pdf):
+    # O FPDF grava a hora da geração no PDF
+    return re.sub(rb"/CreationDate \(D:\d+\)", b"", pdf)
+
+
+def test_pool_de_verdade_da_os_mesmos_bytes(monkeypatch):
+    # AppTest (outros testes) deixa o __main__ apontando para um script temporário,
+    # que os processos "spawn" tentariam executar
+    monkeypatch.setitem(sys.modules, "__main__", types.ModuleType("__main__"))
+    monkeypatch.setattr(relatorios, "_cache_pdfs", OrderedDict())
+    paralelo = gerar_pdfs_lote(_projetos(MIN_PDFS_PARALELO), TAREFAS, processos=2)
+    relatorios._cache_pdfs.clear()
+    monkeypatch.setattr(relatorios, "MIN_PDFS_PARALELO", MIN_PDFS_PARALELO + 1)
+    serial = gerar_pdfs_lote(_projetos(MIN_PDFS_PARALELO), TAREFAS)
+    assert {nome: _sem_data(pdf) for nome, pdf in serial.items()} == \
+        {nome: _sem_data(pdf) for nome, pdf in paralelo.items()}
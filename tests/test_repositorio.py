@@ -0,0 +1,115 @@
+from datetime import date
+
+import pandas as pd
+
+from concorrencia import versao_linha
+from conftest import planilha
+from esquema import tipar
+from repositorio import LoteEscrita, RepositorioSheets, alteracoes_por_linha
+
+COLUNAS = ["Responsavel", "Status", "Horas_Gastas", "Data_Deadline"]
+
+
+def _grade():
+    tarefas = tipar("Tarefas", pd.DataFrame([
+        {"ID_Projeto": 1, "Descricao": "Planta", "Responsavel": "Bruno", "Status": "Em Andamento",
+         "Horas_Gastas": "2,5", "Data_Deadline": "2025-05-10"},
+        {"ID_Projeto": 1, "Descricao": "Cortes", "Responsavel": "Bruno", "Status": "A Fazer",
+         "Horas_Gastas": "", "Data_Deadline": ""},
+    ]))
+    # Como a tela monta a grade: índice das linhas da aba, fora de ordem depois dos filtros
+    return tarefas[COLUNAS].set_axis([7, 3])
+
+def _como_o_editor_devolve(grade):
+    # DateColumn devolve datetime.date (None no vazio), não datetime64
+    editado = grade.copy().astype({"Data_Deadline": object})
+    editado["Data_Deadline"] = [d.date() if pd.notna(d) else None for d in grade["Data_Deadline"]]
+    return editado
+
+
+def test_grade_sem_edicao_nao_tem_alteracoes():
+    grade = _grade()
+    assert grade["Data_Deadline"].dtype.kind == "M"
+    assert alteracoes_por_linha(grade, _como_o_editor_devolve(grade), COLUNAS) == {}
+
+
+def test_so_os_campos_editados_voltam():
+    grade = _grade()
+    editado = _como_o_editor_devolve(grade)
+    editado.loc[7, "Data_Deadline"] = date(2025, 5, 20)
+    editado.loc[3, "Horas_Gastas"] = 1.5
+    editado.loc[3, "Data_Deadline"] = date(2025, 6, 1)
+    alteracoes = alteracoes_por_linha(grade, editado, COLUNAS)
+    assert alteracoes == {7: {"Data_Deadline": pd.Timestamp("2025-05-20")},
+                          3: {"Horas_Gastas": 1.5, "Data_Deadline": pd.Timestamp("2025-06-01")}}
+
+
+def test_prazo_editado_e_gravado_como_data_iso():
+    conn = planilha(Tarefas=[{"ID_Projeto": 1, "Descricao": "Planta", "Status": "A Fazer",
+                              "Data_Deadline": "2025-05-10", "Versao": 1}])
+    repo = RepositorioSheets(conn)
+    grade = tipar("Tarefas", repo.ler("Tarefas"))
+    editado = _como_o_editor_devolve(grade[COLUNAS])
+    editado.loc[0, "Data_Deadline"] = date(2025, 5, 20)
+    lote = LoteEscrita(repo)
+    for idx, campos in alteracoes_por_linha(grade[COLUNAS], editado, COLUNAS).items():
+        lote.atualizar("Tarefas", idx, campos, grade.loc[idx])
+    lote.salvar()
+    linha = RepositorioSheets(conn).ler("Tarefas").iloc[0]
+    assert linha["Data_Deadline"] == "2025-05-20"
+    assert versao_linha(linha["Versao"]) == 2
+
+
+def _chamadas(conn, monkeypatch):
+    chamadas = []
+    for metodo in ("update", "values_batch_update", "values_append", "batch_update"):
+        original = getattr(conn, metodo)
+
+        def espiao(*args, _metodo=metodo, _original=original, **kwargs):
+            chamadas.append(_metodo)
+            return _original(*args, **kwargs)
+        monkeypatch.setattr(conn, metodo, espiao)
+    return chamadas
+
+
+def test_lote_grava_celulas_numa_chamada_e_inclusoes_por_aba(monkeypatch):
+    conn = planilha(
+        Projetos=[{"ID_Projeto": 1, "Cliente": "Ana", "Status_Geral": "Ativo", "Versao": 1},
+                  {"ID_Projeto": 2, "Cliente": "Beto", "Status_Geral": "Ativo", "Versao": 1}],
+        Despesas=[{"ID_Despesa": 1, "Descricao": "Aluguel", "Valor": 100, "Status": "Pendente", "Versao": 1}],
+    )
+    repo = RepositorioSheets(conn)
+    repo.ler("Projetos")
+    chamadas = _chamadas(conn, monkeypatch)
+    lote = LoteEscrita(repo)
+    lote.atualizar("Projetos", 2, {"Status_Geral": "Suspenso"})
+    # Duas alterações da mesma linha viram uma só
+    lote.atualizar("Projetos", 2, {"Cidade": "Recife"})
+    lote.atualizar("Despesas", 1, {"Status": "Pago", "Data_Pagamento": "2025-03-01"})
+    lote.anexar("Despesas", {"ID_Despesa": 2, "Descricao": "Internet", "Valor": 90, "Status": "Pendente"})
+    lote.anexar("Projetos", {"ID_Projeto": 3, "Cliente": "Caio"})
+    assert len(lote) == 4
+    lote.salvar()
+    assert len(lote) == 0
+
+    # Nada de reescrever a aba inteira
+    assert sorted(chamadas) == ["values_append", "values_append", "values_batch_update"]
+    projetos = RepositorioSheets(conn).ler("Projetos")
+    assert projetos["Cliente"].tolist() == ["Ana", "Beto", "Caio"]
+    assert projetos.loc[1, "Status_Geral"] == "Suspenso" and projetos.loc[1, "Cidade"] == "Recife"
+    assert projetos.loc[0, "Status_Geral"] == "Ativo"
+    despesas = RepositorioSheets(conn).ler("Despesas")
+    assert despesas["Status"].tolist() == ["Pago", "Pendente"]
+    # Inclusão começa na versão 1; alteração sobe a versão da linha
+    assert [versao_linha(v) for v in despesas["Versao"]] == [2, 1]
+    # O snapshot local já reflete a escrita, sem baixar a aba de novo
+    leituras = conn.leituras
+    assert repo.ler("Projetos")["Cliente"].tolist() == ["Ana", "Beto", "Caio"]
+    assert conn.leituras == leituras
+
+
+def test_lote_vazio_nao_grava_nada(monkeypatch):
+    conn = planilha()
+    chamadas = _chamadas(conn, monkeypatch)
+    LoteEscrita(RepositorioSheets(conn)).salvar()
+    assert chamadas == []